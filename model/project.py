@@ -1,7 +1,7 @@
 # model/project.py
 import json
 import uuid
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from dataclasses import dataclass, field # <-- Убедитесь, что dataclass и field импортированы
 
 # --- Новые классы для модели данных (п. 2.3, 2.4, 2.2) ---
@@ -94,6 +94,15 @@ class PlayerShiftInfo:
     name: str    # Имя игрока
     shifts: List[PlayerShift] = field(default_factory=list) # Список смен игрока
 
+@dataclass
+class VideoSegment:
+    """
+    Один видеофайл матча, записанного несколькими файлами (по периодам, после перезапуска камеры).
+    offset — глобальное время (сек), с которого начинается файл на общей шкале матча.
+    """
+    path: str
+    offset: float = 0.0
+
 class Match:
     def __init__(
         self,
@@ -267,13 +276,27 @@ class Project:
     def __init__(self, version: str = "4.0"):
         self.version: str = version
         self.video_path: Optional[str] = None
+        # --- "Виртуальный" матч из нескольких файлов (упорядочены по offset) ---
+        # Пустой список — обычный проект с одним video_path. Для нескольких файлов
+        # video_path совпадает с путём первого сегмента.
+        self.video_segments: List[VideoSegment] = []
         self.match: Match = Match() # Добавляем поле match
 
+    def get_video_source(self) -> Union[str, List[VideoSegment], None]:
+        """
+        Источник видео для плеера и детекторов: путь к файлу или список сегментов,
+        если матч записан несколькими файлами (см. utils/virtual_video.py).
+        """
+        if len(self.video_segments) > 1:
+            return self.video_segments
+        return self.video_path
+
     def to_dict(self) -> Dict[str, Any]:
         """Преобразует объект в словарь для сериализации в JSON."""
         return {
             "version": self.version,
             "video_path": self.video_path,
+            "video_segments": [segment.__dict__ for segment in self.video_segments],
             "match": self.match.to_dict() # Сериализуем match
         }
 
@@ -283,6 +306,7 @@ class Project:
         version = data.get("version", "4.0")
         project = cls(version=version)
         project.video_path = data.get("video_path")
+        project.video_segments = [VideoSegment(**seg) for seg in data.get("video_segments") or []]
         # Десериализуем match, если он присутствует в данных
         if "match" in data:
             project.match = Match.from_dict(data["match"])
@@ -8,6 +8,7 @@ import os
 import sys
 import uuid
 import time
+import multiprocessing
 from typing import List, Tuple, Optional, Dict, Any
 from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton
 from PyQt5.QtCore import Qt
@@ -17,7 +18,12 @@ try:
     from utils.helpers import load_project_from_file, save_project_to_file
     # Импорты модулей анализа
     from modules.on_screen_graphics_detection import detect_osg_events
-    from modules.footage_detection import find_video_template
+    from modules.footage_detection import find_video_template, TemplateSource
+    from utils.virtual_video import VideoSource, is_multi_segment
+    from utils.keyframe_index import load_or_build_keyframe_index, sidecar_path_for_project
+    from utils.fingerprint_index import load_or_build_fingerprint_index
+    from utils.ocr_cache import get_shared_ocr_cache
+    from utils.batch_journal import ProjectJournal, params_signature
 except ImportError as e:
     print(f"[auto_draft_marker] Ошибка импорта: {e}")
     print("Убедитесь, что структура проекта позволяет импортировать model.project, utils.helpers, и модули анализа.")
@@ -142,7 +148,7 @@ def remove_existing_draft_labels(project: Project) -> int:
     return removed_count
 
 
-def run_osg_detection(video_path: str, search_ranges: List[Tuple[float, float]], roi: Dict[str, int], event_type_map: Dict[str, str], params: Dict[str, Any], progress_callback=None) -> List[Dict[str, Any]]:
+def run_osg_detection(video_path: VideoSource, search_ranges: List[Tuple[float, float]], roi: Dict[str, int], event_type_map: Dict[str, str], params: Dict[str, Any], progress_callback=None, ocr_cache=None) -> List[Dict[str, Any]]:
     """
     Вызывает on_screen_graphics_detection.detect_osg_events с параметрами из словаря params.
     """
@@ -151,6 +157,7 @@ def run_osg_detection(video_path: str, search_ranges: List[Tuple[float, float]],
     preprocess_method = params.get("osg_preprocess_method", 0)
     skip_every_n = params.get("osg_skip_every_n", 5)
     find_first_only = params.get("osg_find_first_only", False)
+    gate_threshold = params.get("osg_gate_threshold", 3.0)
 
     print(f"[auto_draft_marker] Параметры OSG: skip_every_n={skip_every_n}, debounce={debounce_seconds}, correlation_threshold={correlation_threshold}")
     start_time = time.time()
@@ -164,7 +171,11 @@ def run_osg_detection(video_path: str, search_ranges: List[Tuple[float, float]],
         preprocess_method=preprocess_method,
         skip_every_n=skip_every_n,
         find_first_only=find_first_only,
-        progress_callback=progress_callback
+        progress_callback=progress_callback,
+        gate_threshold=gate_threshold,
+        ocr_cache=ocr_cache,
+        use_ocr_cache=params.get("osg_use_ocr_cache", True),
+        decode_backend=params.get("decode_backend", "opencv")
     )
     elapsed = time.time() - start_time
     print(f"\n[auto_draft_marker] OSG-анализ занял {elapsed:.2f} сек.")
@@ -189,7 +200,7 @@ def convert_osg_results_to_labels(osg_results: List[Dict[str, Any]]) -> List[obj
     return labels
 
 
-def run_footage_detection(video_path: str, template_png_path: str, search_ranges: List[Tuple[float, float]], params: Dict[str, Any], progress_callback=None) -> List[float]:
+def run_footage_detection(video_path: VideoSource, template_png_path: TemplateSource, search_ranges: List[Tuple[float, float]], params: Dict[str, Any], progress_callback=None, fingerprint_index=None) -> List[Dict[str, Any]]:
     """
     Вызывает footage_detection.find_video_template с параметрами из словаря params.
     """
@@ -208,7 +219,9 @@ def run_footage_detection(video_path: str, template_png_path: str, search_ranges
         skip_every_n=skip_every_n,
         search_ranges=search_ranges,
         debounce_seconds=debounce_seconds, # <-- Передаём debounce_seconds внутрь
-        progress_callback=progress_callback
+        progress_callback=progress_callback,
+        fingerprint_index=fingerprint_index,
+        decode_backend=params.get("decode_backend", "opencv")
     )
     elapsed = time.time() - start_time
     print(f"\n[auto_draft_marker] Footage-анализ занял {elapsed:.2f} сек.")
@@ -216,34 +229,112 @@ def run_footage_detection(video_path: str, template_png_path: str, search_ranges
     return results
 
 
-def convert_footage_results_to_labels(footage_results: List[float]) -> List[object]:
+def convert_footage_results_to_labels(footage_results: List[Dict[str, Any]]) -> List[object]:
     """
     Преобразует результаты Footage в список GenericLabel.
+    В контекст метки записывается сработавший шаблон (имя PNG из банка) и его схожесть.
     """
     from model.project import GenericLabel
     labels = []
-    for time_val in footage_results:
+    for match in footage_results:
         label = GenericLabel(
             id=str(uuid.uuid4()),
             label_type="Черн.FOOTAGE",
-            global_time=time_val,
-            context={} # Можно добавить путь к шаблону, если нужно
+            global_time=match["global_time_sec"],
+            context={
+                "template": os.path.basename(match["template"]),
+                "similarity": round(match["similarity"], 4)
+            }
         )
         labels.append(label)
     return labels
 
 
+def detect_in_ranges(
+    project: Project,
+    hkt_file_path: str,
+    search_ranges: List[Tuple[float, float]],
+    template_png_path: TemplateSource,
+    osg_params: Dict[str, Any],
+    analysis_params: Dict[str, Any],
+    ocr_cache=None,
+    fingerprint_index=None,
+    stats: Optional[Dict[str, float]] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Запускает детекторы в диапазонах search_ranges: объединённый проход, при ошибке — OSG и Footage по очереди.
+    """
+    roi = osg_params.get("roi", {"x": 151, "y": 92, "width": 91, "height": 34})
+    event_type_map = osg_params.get("event_type_map", {"ГОЛ": "Goal"})
+    # Пробуем объединённый проход (одно чтение видео = быстрее)
+    try:
+        from modules.combined_detection import run_combined_detection
+        keyframe_index = None
+        if analysis_params.get("parallel_workers", 1) > 1 and not is_multi_segment(project.get_video_source()):
+            # Шарды режутся по ключевым кадрам; индекс общий с плеером (sidecar рядом с .hkt)
+            keyframe_index = load_or_build_keyframe_index(
+                project.video_path, sidecar_path_for_project(hkt_file_path)
+            )
+        return run_combined_detection(
+            video_path=project.get_video_source(),
+            search_ranges=search_ranges,
+            template_png_path=template_png_path,
+            roi=roi,
+            event_type_map=event_type_map,
+            analysis_params=analysis_params,
+            progress_callback=simple_progress_callback,
+            keyframe_index=keyframe_index,
+            fingerprint_index=fingerprint_index,
+            ocr_cache=ocr_cache,
+            stats=stats
+        )
+    except Exception as e:
+        print(f"[auto_draft_marker] Объединённый проход не удался ({e}), fallback на последовательный.")
+        # --- OSG ---
+        osg_results = run_osg_detection(
+            video_path=project.get_video_source(),
+            search_ranges=search_ranges,
+            roi=roi,
+            event_type_map=event_type_map,
+            params=analysis_params,
+            progress_callback=simple_progress_callback,
+            ocr_cache=ocr_cache
+        )
+        # --- Footage ---
+        footage_results = run_footage_detection(
+            video_path=project.get_video_source(),
+            template_png_path=template_png_path,
+            search_ranges=search_ranges,
+            params=analysis_params,
+            progress_callback=simple_progress_callback,
+            fingerprint_index=fingerprint_index
+        )
+        return osg_results, footage_results
+
+
 def process_project(
     hkt_file_path: str,
-    template_png_path: str,
+    template_png_path: TemplateSource,
     osg_params: Dict[str, Any], # {"roi": ..., "event_type_map": ..., ...}
-    analysis_params: Dict[str, Any] # {"osg_skip_every_n": ..., "footage_threshold": ..., ...}
+    analysis_params: Dict[str, Any], # {"osg_skip_every_n": ..., "footage_threshold": ..., ...}
+    ocr_cache=None, # Кэш OCR (utils.ocr_cache); None — общий кэш процесса
+    resume: bool = False, # Журнал рядом с .hkt: пропускать готовый файл и готовые Сегменты
+    stats: Optional[Dict[str, float]] = None # Сюда добавляются прочитанные кадры и вызовы OCR
 ) -> bool:
     """
     Основная функция обработки проекта.
+    При resume=True детекция идёт по Сегментам, и результат каждого записывается в журнал
+    (utils.batch_journal); повторный запуск с теми же параметрами продолжает с первого незавершённого.
     """
     start_time = time.time()
     print(f"[auto_draft_marker] Начинаю обработку проекта: {os.path.basename(hkt_file_path)}")
+    journal = None
+    if resume:
+        journal = ProjectJournal.load(hkt_file_path, params_signature(template_png_path, osg_params, analysis_params))
+        if journal.is_done(hkt_file_path):
+            print(f"[auto_draft_marker] Проект {os.path.basename(hkt_file_path)} уже обработан с этими параметрами — пропуск.")
+            return True
+
     # 1. Загрузка проекта
     project = load_project(hkt_file_path)
     if not project:
@@ -259,37 +350,29 @@ def process_project(
     remove_existing_draft_labels(project)
 
     # 4. Вызов анализа
-    # Пробуем объединённый проход (одно чтение видео = быстрее)
-    try:
-        from modules.combined_detection import run_combined_detection
-        osg_results, footage_results = run_combined_detection(
-            video_path=project.video_path,
-            search_ranges=search_ranges,
-            template_png_path=template_png_path,
-            roi=osg_params.get("roi", {"x": 151, "y": 92, "width": 91, "height": 34}),
-            event_type_map=osg_params.get("event_type_map", {"ГОЛ": "Goal"}),
-            analysis_params=analysis_params,
-            progress_callback=simple_progress_callback
-        )
-    except Exception as e:
-        print(f"[auto_draft_marker] Объединённый проход не удался ({e}), fallback на последовательный.")
-        # --- OSG ---
-        osg_results = run_osg_detection(
-            video_path=project.video_path,
-            search_ranges=search_ranges,
-            roi=osg_params.get("roi", {"x": 151, "y": 92, "width": 91, "height": 34}),
-            event_type_map=osg_params.get("event_type_map", {"ГОЛ": "Goal"}),
-            params=analysis_params,
-            progress_callback=simple_progress_callback
-        )
-        # --- Footage ---
-        footage_results = run_footage_detection(
-            video_path=project.video_path,
-            template_png_path=template_png_path,
-            search_ranges=search_ranges,
-            params=analysis_params,
-            progress_callback=simple_progress_callback
+    fingerprint_index = None
+    if analysis_params.get("use_fingerprint_index", False):
+        # Индекс отпечатков строится один раз на видео; повторные прогоны с новым порогом/шаблоном не декодируют видео
+        fingerprint_index = load_or_build_fingerprint_index(project.get_video_source(), simple_progress_callback)
+
+    if journal is None:
+        osg_results, footage_results = detect_in_ranges(
+            project, hkt_file_path, search_ranges, template_png_path, osg_params, analysis_params,
+            ocr_cache, fingerprint_index, stats
         )
+    else:
+        for search_range in search_ranges:
+            if journal.has_range(search_range):
+                print(f"[auto_draft_marker] Сегмент {search_range[0]:.2f} - {search_range[1]:.2f} уже в журнале — пропуск.")
+            else:
+                range_osg, range_footage = detect_in_ranges(
+                    project, hkt_file_path, [search_range], template_png_path, osg_params, analysis_params,
+                    ocr_cache, fingerprint_index, stats
+                )
+                journal.record_range(search_range, range_osg, range_footage)
+            if analysis_params.get("osg_find_first_only", False) and journal.results_for(search_ranges)[0]:
+                break
+        osg_results, footage_results = journal.results_for(search_ranges)
 
     converted_osg_labels = convert_osg_results_to_labels(osg_results)
     converted_footage_labels = convert_footage_results_to_labels(footage_results)
@@ -303,6 +386,8 @@ def process_project(
     success = save_project(project, hkt_file_path)
     elapsed = time.time() - start_time
     if success:
+        if journal is not None:
+            journal.mark_done(hkt_file_path)
         print(f"[auto_draft_marker] Обработка проекта {os.path.basename(hkt_file_path)} завершена успешно. Время: {elapsed:.2f} сек.")
     else:
         print(f"[auto_draft_marker] Обработка проекта {os.path.basename(hkt_file_path)} завершена с ошибкой сохранения. Время: {elapsed:.2f} сек.")
@@ -342,6 +427,14 @@ class ParamsDialog(QDialog):
         layout.addWidget(QLabel("find_first_only (OSG) (True/False):"))
         layout.addWidget(self.osg_find_first_edit)
 
+        self.osg_gate_threshold_edit = QLineEdit("3.0")
+        layout.addWidget(QLabel("gate_threshold (OSG) (0 = OCR на каждом кадре):"))
+        layout.addWidget(self.osg_gate_threshold_edit)
+
+        self.osg_use_ocr_cache_edit = QLineEdit("True")
+        layout.addWidget(QLabel("use_ocr_cache (OSG) (True/False):"))
+        layout.addWidget(self.osg_use_ocr_cache_edit)
+
         # --- Параметры Footage ---
         layout.addWidget(QLabel("Параметры Footage (поиск футажей):"))
         self.footage_skip_every_n_edit = QLineEdit("20")
@@ -361,6 +454,38 @@ class ParamsDialog(QDialog):
         layout.addWidget(QLabel("debounce_seconds (Footage):"))
         layout.addWidget(self.footage_debounce_edit)
 
+        self.use_fingerprint_index_edit = QLineEdit("False")
+        layout.addWidget(QLabel("use_fingerprint_index (Footage) (True/False):"))
+        layout.addWidget(self.use_fingerprint_index_edit)
+
+        # --- Параллельный режим ---
+        layout.addWidget(QLabel("Параллельная обработка:"))
+        self.parallel_workers_edit = QLineEdit(str(max(1, (os.cpu_count() or 2) - 1)))
+        layout.addWidget(QLabel("parallel_workers (1 = без параллелизма):"))
+        layout.addWidget(self.parallel_workers_edit)
+
+        self.batch_workers_edit = QLineEdit("1")
+        layout.addWidget(QLabel("batch_workers (папка: файлов одновременно; при > 1 parallel_workers = 1):"))
+        layout.addWidget(self.batch_workers_edit)
+
+        # --- Поиск "грубо -> точно" ---
+        layout.addWidget(QLabel("Двухэтапный поиск (грубый шаг, затем каждый кадр около кандидатов):"))
+        self.coarse_to_fine_edit = QLineEdit("False")
+        layout.addWidget(QLabel("coarse_to_fine (True/False; skip_every_n при этом не используются):"))
+        layout.addWidget(self.coarse_to_fine_edit)
+
+        self.coarse_step_seconds_edit = QLineEdit("1.0")
+        layout.addWidget(QLabel("coarse_step_seconds (шаг грубого прохода, сек):"))
+        layout.addWidget(self.coarse_step_seconds_edit)
+
+        self.coarse_relax_edit = QLineEdit("0.1")
+        layout.addWidget(QLabel("coarse_relax (снижение порогов в грубом проходе, 0.1 = 10%):"))
+        layout.addWidget(self.coarse_relax_edit)
+
+        self.decode_backend_edit = QLineEdit("opencv")
+        layout.addWidget(QLabel("decode_backend (opencv / ffmpeg_roi — декодировать только ROI и миниатюру):"))
+        layout.addWidget(self.decode_backend_edit)
+
         # --- Кнопки ---
         button_layout = QHBoxLayout()
         ok_button = QPushButton("OK")
@@ -385,6 +510,8 @@ class ParamsDialog(QDialog):
             params["osg_preprocess_method"] = int(self.osg_preprocess_edit.text())
             find_first_text = self.osg_find_first_edit.text().strip().lower()
             params["osg_find_first_only"] = find_first_text in ("true", "1", "yes")
+            params["osg_gate_threshold"] = float(self.osg_gate_threshold_edit.text())
+            params["osg_use_ocr_cache"] = self.osg_use_ocr_cache_edit.text().strip().lower() in ("true", "1", "yes")
         except ValueError:
             QMessageBox.warning(self, "Ошибка", "Некорректное значение для параметра OSG. Используются значения по умолчанию.")
             # Возвращаем значения по умолчанию в случае ошибки
@@ -393,7 +520,9 @@ class ParamsDialog(QDialog):
                 "osg_debounce_seconds": 5.0,
                 "osg_correlation_threshold": 0.8,
                 "osg_preprocess_method": 0,
-                "osg_find_first_only": False
+                "osg_find_first_only": False,
+                "osg_gate_threshold": 3.0,
+                "osg_use_ocr_cache": True
             })
 
         try:
@@ -406,26 +535,108 @@ class ParamsDialog(QDialog):
             x_str, y_str = resize_clean.split(",")
             params["footage_resize"] = (int(x_str.strip()), int(y_str.strip()))
             params["footage_debounce_seconds"] = float(self.footage_debounce_edit.text()) # <-- Новый параметр
+            use_index_text = self.use_fingerprint_index_edit.text().strip().lower()
+            params["use_fingerprint_index"] = use_index_text in ("true", "1", "yes")
         except (ValueError, IndexError):
             QMessageBox.warning(self, "Ошибка", "Некорректное значение для параметра Footage. Используются значения по умолчанию.")
             params.update({
                 "footage_skip_every_n": 10,
                 "footage_threshold": 0.9,
                 "footage_resize": (16, 16),
-                "footage_debounce_seconds": 5.0 # <-- Новый параметр по умолчанию
+                "footage_debounce_seconds": 5.0, # <-- Новый параметр по умолчанию
+                "use_fingerprint_index": False
             })
 
+        try:
+            params["parallel_workers"] = max(1, int(self.parallel_workers_edit.text()))
+        except ValueError:
+            QMessageBox.warning(self, "Ошибка", "Некорректное значение parallel_workers. Используется 1.")
+            params["parallel_workers"] = 1
+
+        try:
+            params["batch_workers"] = max(1, int(self.batch_workers_edit.text()))
+        except ValueError:
+            QMessageBox.warning(self, "Ошибка", "Некорректное значение batch_workers. Используется 1.")
+            params["batch_workers"] = 1
+
+        try:
+            params["coarse_to_fine"] = self.coarse_to_fine_edit.text().strip().lower() in ("true", "1", "yes")
+            params["coarse_step_seconds"] = max(0.04, float(self.coarse_step_seconds_edit.text()))
+            params["coarse_relax"] = min(0.9, max(0.0, float(self.coarse_relax_edit.text())))
+        except ValueError:
+            QMessageBox.warning(self, "Ошибка", "Некорректное значение параметров двухэтапного поиска. Он отключён.")
+            params.update({
+                "coarse_to_fine": False,
+                "coarse_step_seconds": 1.0,
+                "coarse_relax": 0.1
+            })
+
+        decode_backend = self.decode_backend_edit.text().strip().lower()
+        if decode_backend not in ("opencv", "ffmpeg_roi"):
+            QMessageBox.warning(self, "Ошибка", "Некорректное значение decode_backend. Используется opencv.")
+            decode_backend = "opencv"
+        params["decode_backend"] = decode_backend
+
         return params
 
 
+def _batch_job(job: Tuple[str, TemplateSource, Dict[str, Any], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Задание очереди пакетной обработки: один .hkt (в процессе пула или в основном процессе).
+    Возвращает итог файла, счётчики для сводки и новые записи кэша OCR (их сохраняет основной процесс).
+    """
+    hkt_path, template_png_path, osg_params, analysis_params = job
+    ocr_cache = get_shared_ocr_cache() if analysis_params.get("osg_use_ocr_cache", True) else None
+    stats = {"frames": 0, "ocr_calls": 0}
+    start = time.time()
+    try:
+        success = process_project(hkt_path, template_png_path, osg_params, analysis_params, ocr_cache,
+                                  resume=True, stats=stats)
+    except Exception as e:
+        print(f"[auto_draft_marker] Ошибка обработки {os.path.basename(hkt_path)}: {e}")
+        success = False
+    return {
+        "hkt_path": hkt_path,
+        "success": success,
+        "frames": stats["frames"],
+        "ocr_calls": stats["ocr_calls"],
+        "elapsed": time.time() - start,
+        "worker": os.getpid(),
+        "ocr_entries": ocr_cache.take_new_entries() if ocr_cache is not None else {}
+    }
+
+
+def _print_batch_throughput(job_results: List[Dict[str, Any]], overall_elapsed: float) -> None:
+    """Сводка производительности по процессам пакета: кадр/с и вызовов OCR/с за время работы процесса."""
+    per_worker: Dict[int, Dict[str, float]] = {}
+    for result in job_results:
+        worker = per_worker.setdefault(result["worker"], {"files": 0, "frames": 0, "ocr_calls": 0, "elapsed": 0.0})
+        worker["files"] += 1
+        worker["frames"] += result["frames"]
+        worker["ocr_calls"] += result["ocr_calls"]
+        worker["elapsed"] += result["elapsed"]
+    for pid, worker in sorted(per_worker.items()):
+        busy = worker["elapsed"] or 1e-9
+        print(f"[auto_draft_marker] Процесс {pid}: файлов {worker['files']}, кадров {worker['frames']} "
+              f"({worker['frames'] / busy:.1f} кадр/с), вызовов OCR {worker['ocr_calls']} ({worker['ocr_calls'] / busy:.2f} в с)")
+    total_frames = sum(result["frames"] for result in job_results)
+    total_ocr = sum(result["ocr_calls"] for result in job_results)
+    wall = overall_elapsed or 1e-9
+    print(f"[auto_draft_marker] Итого: {total_frames} кадров ({total_frames / wall:.1f} кадр/с), "
+          f"{total_ocr} вызовов OCR ({total_ocr / wall:.2f} в с)")
+
+
 def batch_process(
     folder_path: str,
-    template_png_path: str,
+    template_png_path: TemplateSource,
     osg_params: Dict[str, Any],
     analysis_params: Dict[str, Any]
 ) -> None:
     """
     Пакетная обработка всех .hkt файлов в указанной папке.
+    Файлы — очередь заданий; при analysis_params["batch_workers"] > 1 их разбирает пул процессов.
+    Каждый файл ведёт журнал (utils.batch_journal), поэтому повторный запуск после сбоя пропускает
+    готовые файлы и готовые Сегменты недообработанных.
     """
     hkt_files = sorted([
         os.path.join(folder_path, f)
@@ -439,26 +650,43 @@ def batch_process(
         return
 
     total_files = len(hkt_files)
-    print(f"[auto_draft_marker] Найдено {total_files} .hkt файлов для обработки.")
+    batch_workers = min(total_files, max(1, int(analysis_params.get("batch_workers", 1) or 1)))
+    print(f"[auto_draft_marker] Найдено {total_files} .hkt файлов для обработки. Процессов: {batch_workers}.")
     print("=" * 60)
 
     overall_start = time.time()
-    success_count = 0
-    fail_count = 0
-
-    for idx, hkt_path in enumerate(hkt_files, start=1):
-        print(f"\n[auto_draft_marker] === Файл {idx}/{total_files}: {os.path.basename(hkt_path)} ===")
-        success = process_project(hkt_path, template_png_path, osg_params, analysis_params)
-        if success:
-            success_count += 1
-        else:
-            fail_count += 1
+    # Один кэш OCR на всю папку: графика из первых матчей не распознаётся заново в следующих
+    ocr_cache = get_shared_ocr_cache() if analysis_params.get("osg_use_ocr_cache", True) else None
+    job_results: List[Dict[str, Any]] = []
+
+    if batch_workers > 1:
+        # Процессы пула не могут запускать свой пул шардов — параллелизм здесь по файлам
+        job_params = dict(analysis_params, parallel_workers=1)
+        jobs = [(hkt_path, template_png_path, osg_params, job_params) for hkt_path in hkt_files]
+        mp_context = multiprocessing.get_context("spawn")
+        with mp_context.Pool(processes=batch_workers) as pool:
+            for idx, result in enumerate(pool.imap_unordered(_batch_job, jobs), start=1):
+                job_results.append(result)
+                if ocr_cache is not None:
+                    ocr_cache.merge(result["ocr_entries"])
+                status = "успешно" if result["success"] else "ошибка"
+                print(f"\n[auto_draft_marker] === Готово {idx}/{total_files}: {os.path.basename(result['hkt_path'])} ({status}) ===")
+    else:
+        for idx, hkt_path in enumerate(hkt_files, start=1):
+            print(f"\n[auto_draft_marker] === Файл {idx}/{total_files}: {os.path.basename(hkt_path)} ===")
+            job_results.append(_batch_job((hkt_path, template_png_path, osg_params, analysis_params)))
 
+    success_count = sum(1 for result in job_results if result["success"])
+    fail_count = total_files - success_count
     overall_elapsed = time.time() - overall_start
     print("\n" + "=" * 60)
     print(f"[auto_draft_marker] Пакетная обработка завершена.")
     print(f"[auto_draft_marker] Всего файлов: {total_files} | Успешно: {success_count} | Ошибок: {fail_count}")
     print(f"[auto_draft_marker] Общее время: {overall_elapsed:.2f} сек ({overall_elapsed/60:.2f} мин)")
+    _print_batch_throughput(job_results, overall_elapsed)
+    if ocr_cache is not None:
+        ocr_cache.save()
+        print(f"[auto_draft_marker] {ocr_cache.summary()}")
     print("=" * 60)
 
     QMessageBox.information(
@@ -471,6 +699,18 @@ def batch_process(
     )
 
 
+def select_template_bank() -> Optional[TemplateSource]:
+    """
+    Выбор одного или нескольких PNG-шаблонов футажа (банк шаблонов: разные футажи лиг/повторов).
+    Возвращает путь (один файл), список путей или None при отмене.
+    """
+    png_paths, _ = QFileDialog.getOpenFileNames(None, "Выберите PNG-шаблоны футажа (можно несколько)", "", "PNG файлы (*.png)")
+    if not png_paths:
+        return None
+    print(f"Выбраны шаблоны футажа: {', '.join(os.path.basename(p) for p in png_paths)}")
+    return png_paths[0] if len(png_paths) == 1 else sorted(png_paths)
+
+
 def main_interactive():
     """
     Интерактивная точка входа для ручного тестирования.
@@ -521,17 +761,15 @@ def main_interactive():
             png_path = default_template_path
             print(f"Используется шаблон по умолчанию: {os.path.basename(png_path)}")
         else:
-            png_path, _ = QFileDialog.getOpenFileName(None, "Выберите PNG-шаблон футажа", "", "PNG файлы (*.png)")
+            png_path = select_template_bank()
             if not png_path:
                 print("Не выбран PNG-шаблон футажа. Завершение.")
                 return
-            print(f"Выбран шаблон футажа: {os.path.basename(png_path)}")
     else:
-        png_path, _ = QFileDialog.getOpenFileName(None, "Выберите PNG-шаблон футажа", "", "PNG файлы (*.png)")
+        png_path = select_template_bank()
         if not png_path:
             print("Не выбран PNG-шаблон футажа. Завершение.")
             return
-        print(f"Выбран шаблон футажа: {os.path.basename(png_path)}")
 
     # 3. Параметры OSG
     osg_params = {
@@ -1,282 +1,534 @@
 # modules/combined_detection.py
 """
 Модуль для объединённого прохода OSD + Footage по видео.
-Читает видео один раз, параллельно выполняя OCR (OSG) и поиск футажей.
+Читает видео один раз: этапы OsgStage и FootageStage подключены к общему конвейеру
+modules.frame_pipeline и получают кадры от одного декодирования.
+В параллельном режиме (analysis_params["parallel_workers"] > 1) диапазоны делятся на шарды
+по ключевым кадрам и обрабатываются пулом процессов; результат совпадает с однопроцессным
+(гейт изменений ROI в рабочих процессах отключён — см. _run_parallel_detection;
+проверка на коротком фрагменте — check_parallel_matches_serial).
 """
 
-import cv2
-import numpy as np
-from PIL import Image
+import multiprocessing
+import time
+from bisect import bisect_left
 from typing import List, Dict, Tuple, Optional, Callable, Any
 
-from modules.on_screen_graphics_detection import _preprocess_image
-
-
-def _extract_template_array(png_path: str, resize: Tuple[int, int]) -> np.ndarray:
-    """Загружает PNG-шаблон и возвращает его как numpy-массив int16 для быстрого сравнения."""
-    image = cv2.imread(png_path, cv2.IMREAD_GRAYSCALE)
-    if image is None:
-        raise ValueError(f"Не удалось загрузить PNG-шаблон: {png_path}")
-    small = cv2.resize(image, resize, interpolation=cv2.INTER_AREA)
-    return small.astype(np.int16)
-
-
-def _calc_similarity(frame_gray: np.ndarray, template: np.ndarray, resize: Tuple[int, int]) -> float:
-    """Вычисляет схожесть кадра с шаблоном."""
-    small = cv2.resize(frame_gray, resize, interpolation=cv2.INTER_AREA)
-    mean_abs_diff = np.mean(np.abs(small.astype(np.int16) - template))
-    return 1.0 - (mean_abs_diff / 255.0)
+from modules.on_screen_graphics_detection import OcrEngine, OsgStage, DEFAULT_GATE_THRESHOLD, debounce_events
+from modules.footage_detection import (
+    TemplateSource, FootageStage, load_template_bank, debounce_matches, debounce_footage
+)
+from modules.frame_pipeline import (
+    DetectorStage, FrameSource, open_frame_source, frame_ranges_from_seconds, resolve_strategy, scan_ranges,
+    run_stages, count_sampled, print_throughput, SKIP_STRATEGY_SEEK, DECODE_BACKEND_OPENCV
+)
+from utils.keyframe_index import KeyframeIndex, build_keyframe_index
+from utils.fingerprint_index import FingerprintIndex
+from utils.ocr_cache import OcrMemoCache, get_shared_ocr_cache
+from utils.virtual_video import is_multi_segment, VideoSource
+
+# --- Параллельный режим ---
+SHARDS_PER_WORKER = 4        # Шардов на процесс: выравнивает нагрузку при неравных диапазонах
+MIN_SHARD_SECONDS = 60.0     # Более мелкие шарды не окупают открытие видео и инициализацию OCR
+
+# --- Поиск "грубо -> точно" (analysis_params["coarse_to_fine"]) ---
+DEFAULT_COARSE_STEP_SECONDS = 1.0  # Шаг грубого прохода
+DEFAULT_COARSE_RELAX = 0.1         # Во сколько раз снижаются пороги в грубом проходе (0.1 = на 10%)
+
+
+def _build_stages(
+    analysis_params: Dict[str, Any],
+    template_png_path: TemplateSource,
+    roi: Dict[str, int],
+    event_type_map: Dict[str, str],
+    base_resolution: Tuple[int, int] = (1920, 1080),
+    ocr_cache: Optional[OcrMemoCache] = None,
+    verbose: bool = True
+) -> Tuple[OsgStage, Optional[FootageStage]]:
+    """
+    Этапы конвейера по analysis_params. Создаются один раз на процесс (основной или рабочий).
+    Футаж проверяется раньше OSD на том же кадре (важно при osg_find_first_only).
+    FootageStage не создаётся, если футажи ищутся по индексу отпечатков (footage_via_index).
+    """
+    engine = OcrEngine(analysis_params.get("osg_gate_threshold", DEFAULT_GATE_THRESHOLD), ocr_cache,
+                       log_prefix="[COMBINED]", verbose=verbose)
+    osg_stage = OsgStage(
+        roi, event_type_map, engine,
+        preprocess_method=analysis_params.get("osg_preprocess_method", 0),
+        correlation_threshold=analysis_params.get("osg_correlation_threshold", 0.8),
+        debounce_seconds=analysis_params.get("osg_debounce_seconds", 5.0),
+        stride=analysis_params.get("osg_skip_every_n", 5),
+        find_first_only=analysis_params.get("osg_find_first_only", False),
+        base_resolution=base_resolution,
+        verbose=verbose
+    )
+    footage_stage = None
+    if not analysis_params.get("footage_via_index", False):
+        footage_stage = FootageStage(
+            template_png_path,
+            analysis_params.get("footage_resize", (16, 16)),
+            analysis_params.get("footage_threshold", 0.9),
+            analysis_params.get("footage_debounce_seconds", 5.0),
+            stride=analysis_params.get("footage_skip_every_n", 10)
+        )
+    return osg_stage, footage_stage
+
+
+def _stage_list(osg_stage: OsgStage, footage_stage: Optional[FootageStage]) -> List[DetectorStage]:
+    return [footage_stage, osg_stage] if footage_stage is not None else [osg_stage]
 
 
 def run_combined_detection(
-    video_path: str,
+    video_path: VideoSource,
     search_ranges: List[Tuple[float, float]],
-    template_png_path: str,
+    template_png_path: TemplateSource,
     roi: Dict[str, int],
     event_type_map: Dict[str, str],
     analysis_params: Dict[str, Any],
     progress_callback: Optional[Callable[[int, int], None]] = None,
-    base_resolution: Tuple[int, int] = (1920, 1080)
-) -> Tuple[List[Dict[str, Any]], List[float]]:
+    base_resolution: Tuple[int, int] = (1920, 1080),
+    keyframe_index: Optional[KeyframeIndex] = None,
+    fingerprint_index: Optional[FingerprintIndex] = None,
+    ocr_cache: Optional[OcrMemoCache] = None,
+    stats: Optional[Dict[str, float]] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     """
     Объединённый проход OSD + Footage по видео.
+    video_path — путь к файлу или список сегментов многофайлового матча (время глобальное).
+
+    analysis_params["parallel_workers"] > 1 включает параллельный режим: диапазоны делятся на шарды
+    по ключевым кадрам (keyframe_index; если не передан — строится через ffprobe), каждый шард
+    обрабатывается в отдельном процессе со своим VideoCapture, tesserocr и своими этапами.
+
+    Если передан fingerprint_index, футажи ищутся векторно по отпечаткам (шаг индекса вместо
+    footage_skip_every_n), а проход по видео читает только кадры для OSD.
+
+    ocr_cache — постоянный кэш OCR по хешу ROI; по умолчанию общий кэш процесса
+    (analysis_params["osg_use_ocr_cache"] = False отключает). Сохраняется на диск в конце прохода.
+
+    analysis_params["decode_backend"] = "ffmpeg_roi" — декодировать через ffmpeg только ROI табло
+    и миниатюру для футажей вместо полных кадров (modules.frame_pipeline).
+
+    analysis_params["coarse_to_fine"] = True — двухэтапный поиск (см. _run_coarse_to_fine) вместо
+    фиксированных osg_skip_every_n / footage_skip_every_n.
+
+    stats — если передан, к stats["frames"] и stats["ocr_calls"] добавляются число прочитанных кадров
+    и вызовов Tesseract (без гейта и кэша) за этот вызов — для сводок пакетной обработки.
 
     Returns:
-        (osg_results, footage_results) в тех же форматах, что и отдельные модули.
+        (osg_results, footage_results) в тех же форматах, что и отдельные модули;
+        футажи — {"global_time_sec", "template", "similarity"}, template_png_path может быть банком PNG.
     """
-    # === Параметры OSG ===
-    osg_skip = analysis_params.get("osg_skip_every_n", 5)
-    osg_debounce = analysis_params.get("osg_debounce_seconds", 5.0)
-    osg_corr_thresh = analysis_params.get("osg_correlation_threshold", 0.8)
-    osg_preprocess = analysis_params.get("osg_preprocess_method", 0)
-    osg_find_first_only = analysis_params.get("osg_find_first_only", False)
-
-    # === Параметры Footage ===
-    footage_skip = analysis_params.get("footage_skip_every_n", 10)
-    footage_threshold = analysis_params.get("footage_threshold", 0.9)
-    footage_resize = analysis_params.get("footage_resize", (16, 16))
-    footage_debounce = analysis_params.get("footage_debounce_seconds", 5.0)
-
-    if osg_skip < 1:
-        osg_skip = 1
-    if footage_skip < 1:
-        footage_skip = 1
-
-    # === Инициализация tesserocr ===
-    tesserocr_api = None
-    use_tesserocr = False
+    if analysis_params.get("coarse_to_fine", False):
+        return _run_coarse_to_fine(video_path, search_ranges, template_png_path, roi, event_type_map,
+                                   analysis_params, progress_callback, base_resolution, keyframe_index,
+                                   fingerprint_index, ocr_cache, stats)
+
+    # === Открытие видео ===
+    source = FrameSource(video_path, analysis_params.get("decode_backend", DECODE_BACKEND_OPENCV), "[COMBINED]")
+    fps = source.fps
+    frame_ranges = frame_ranges_from_seconds(search_ranges, fps, source.total_frames)
+    print(f"[COMBINED] FPS: {fps:.2f}")
+
+    if fingerprint_index is not None:
+        analysis_params = dict(analysis_params, footage_via_index=True)
+
+    if not analysis_params.get("osg_use_ocr_cache", True):
+        ocr_cache = None
+    elif ocr_cache is None:
+        ocr_cache = get_shared_ocr_cache()
+
+    osg_stage, footage_stage = _build_stages(analysis_params, template_png_path, roi, event_type_map,
+                                             base_resolution, ocr_cache)
+    stages = _stage_list(osg_stage, footage_stage)
+    counters_before = osg_stage.engine.counters()
     try:
-        from tesserocr import PyTessBaseAPI
-        tesserocr_api = PyTessBaseAPI(lang='rus', psm=6, oem=3)
-        use_tesserocr = True
-        print("[COMBINED] Используется tesserocr для ускорения OCR.")
-    except Exception as e:
-        print(f"[COMBINED] tesserocr недоступен ({e}), используется pytesseract.")
+        for stage in stages:
+            stage.prepare(source.frame_width, source.frame_height, fps)
+
+        # === Стратегия пропуска кадров ===
+        strategy = resolve_strategy(source, frame_ranges, stages, analysis_params.get("skip_strategy", "auto"),
+                                    keyframe_index, "[COMBINED]")
+        # Выбранная стратегия передаётся и в рабочие процессы параллельного режима
+        analysis_params = dict(analysis_params, skip_strategy=strategy)
+
+        workers = int(analysis_params.get("parallel_workers", 1) or 1)
+        if workers > 1 and not _ranges_are_ordered(frame_ranges):
+            print("[COMBINED] Диапазоны перекрываются или не упорядочены — параллельный режим отключён.")
+            workers = 1
+        if workers > 1:
+            segment_starts = getattr(source.cap, "segment_start_frames", None)
+            source.release()
+            osg_results, footage_results, processed = _run_parallel_detection(
+                video_path, frame_ranges, fps, stages, template_png_path, roi, event_type_map,
+                analysis_params, workers, progress_callback, base_resolution, keyframe_index,
+                segment_starts, ocr_cache
+            )
+        else:
+            processed = scan_ranges(source, stages, frame_ranges, strategy, progress_callback, "[COMBINED]")
+            osg_results = osg_stage.results()
+            footage_results = footage_stage.results() if footage_stage is not None else []
+    finally:
+        source.release()
+        osg_stage.close()
+
+    osg_stage.engine.report()
+    if stats is not None:
+        _add_stats(stats, processed, counters_before, osg_stage.engine.counters())
+    if fingerprint_index is not None:
+        footage_results = _footage_from_index(fingerprint_index, template_png_path, frame_ranges,
+                                              analysis_params, osg_results)
+    print(f"[COMBINED] Найдено OSD событий: {len(osg_results)}, футажей: {len(footage_results)}")
+    return osg_results, footage_results
 
-    # === Загрузка шаблона футажа ===
-    template_arr = _extract_template_array(template_png_path, footage_resize)
 
-    # === Открытие видео ===
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise ValueError(f"Не удалось открыть видео: {video_path}")
-
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    if fps <= 0:
-        fps = 25.0
-
-    # === Масштабирование ROI ===
-    base_width, base_height = base_resolution
-    scale_x = frame_width / base_width
-    scale_y = frame_height / base_height
-    x = int(roi["x"] * scale_x)
-    y = int(roi["y"] * scale_y)
-    w = int(roi["width"] * scale_x)
-    h = int(roi["height"] * scale_y)
-
-    print(f"[COMBINED] Разрешение: {frame_width}x{frame_height}, FPS: {fps:.2f}")
-    print(f"[COMBINED] ROI: x={x}, y={y}, w={w}, h={h}")
-
-    # === Диапазоны поиска в кадрах ===
-    frame_ranges = []
-    for start_sec, end_sec in search_ranges:
-        start_frame = max(0, int(start_sec * fps))
-        end_frame = min(total_frames, int(end_sec * fps))
-        if start_frame < end_frame:
-            frame_ranges.append((start_frame, end_frame))
-
-    total_to_process = sum(end_f - start_f for start_f, end_f in frame_ranges)
-    processed_count = 0
+def _add_stats(stats: Dict[str, float], processed: int, counters_before: Tuple[int, ...],
+               counters_after: Tuple[int, ...]) -> None:
+    # Вызовы Tesseract = прошло гейт - попадания кэша (счётчики: кадров, прошло гейт, пропущено, попаданий, промахов)
+    ocr_calls = (counters_after[1] - counters_before[1]) - (counters_after[3] - counters_before[3])
+    stats["frames"] = stats.get("frames", 0) + processed
+    stats["ocr_calls"] = stats.get("ocr_calls", 0) + ocr_calls
+
+
+def _footage_from_index(
+    fingerprint_index: FingerprintIndex,
+    template_png_path: TemplateSource,
+    frame_ranges: List[Tuple[int, int]],
+    analysis_params: Dict[str, Any],
+    osg_results: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Векторный поиск футажей по индексу отпечатков вместо проверки кадров во время прохода."""
+    resize = analysis_params.get("footage_resize", (16, 16))
+    frame_indices, similarity = fingerprint_index.match_bank(
+        load_template_bank(template_png_path, resize), resize, frame_ranges
+    )
+    footage_results = debounce_matches(
+        frame_indices, similarity, template_png_path, analysis_params.get("footage_threshold", 0.9),
+        fingerprint_index.fps, analysis_params.get("footage_debounce_seconds", 5.0)
+    )
+    if analysis_params.get("osg_find_first_only", False) and osg_results:
+        # Как и при проходе по видео: футажи после первого события OSD не ищутся
+        first_time = osg_results[0]["global_time_sec"]
+        footage_results = [m for m in footage_results if m["global_time_sec"] <= first_time]
+    return footage_results
+
+
+# === Поиск "грубо -> точно" ===
+
+def _run_coarse_to_fine(
+    video_path: VideoSource,
+    search_ranges: List[Tuple[float, float]],
+    template_png_path: TemplateSource,
+    roi: Dict[str, int],
+    event_type_map: Dict[str, str],
+    analysis_params: Dict[str, Any],
+    progress_callback: Optional[Callable[[int, int], None]],
+    base_resolution: Tuple[int, int],
+    keyframe_index: Optional[KeyframeIndex],
+    fingerprint_index: Optional[FingerprintIndex],
+    ocr_cache: Optional[OcrMemoCache],
+    stats: Optional[Dict[str, float]] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Двухэтапный поиск:
+    1. Грубый проход с шагом coarse_step_seconds и порогами, сниженными на coarse_relax, без дебаунса —
+       находит кандидатов (графика и футаж держатся на экране дольше шага).
+    2. Точный проход каждого кадра (шаг 1) с обычными порогами и дебаунсом только в окнах
+       +-шаг вокруг кандидатов — время события с точностью до кадра, как при skip_every_n=1.
+    Событие, не давшее ни одного кандидата в грубом проходе, не найдётся; снижение порогов это компенсирует.
+    """
+    cap, fps, total_frames, _, _ = open_frame_source(video_path)
+    cap.release()
+    coarse_step = max(1, int(round(analysis_params.get("coarse_step_seconds", DEFAULT_COARSE_STEP_SECONDS) * fps)))
+    relax = analysis_params.get("coarse_relax", DEFAULT_COARSE_RELAX)
+
+    coarse_params = dict(
+        analysis_params,
+        coarse_to_fine=False,
+        osg_skip_every_n=coarse_step,
+        footage_skip_every_n=coarse_step,
+        osg_correlation_threshold=analysis_params.get("osg_correlation_threshold", 0.8) * (1.0 - relax),
+        footage_threshold=analysis_params.get("footage_threshold", 0.9) * (1.0 - relax),
+        osg_debounce_seconds=0.0,
+        footage_debounce_seconds=0.0,
+        osg_find_first_only=False,
+        footage_via_index=fingerprint_index is not None
+    )
+    print(f"[COMBINED] Грубый проход: шаг {coarse_step} кадров, пороги снижены на {relax * 100:.0f}%.")
+    coarse_osg, coarse_footage = run_combined_detection(
+        video_path, search_ranges, template_png_path, roi, event_type_map, coarse_params, progress_callback,
+        base_resolution, keyframe_index, ocr_cache=ocr_cache, stats=stats
+    )
+
+    frame_ranges = frame_ranges_from_seconds(search_ranges, fps, total_frames)
+    candidates = [event["global_time_sec"] for event in coarse_osg]
+    if fingerprint_index is None:
+        candidates += [match["global_time_sec"] for match in coarse_footage]
+    windows = _refine_windows(candidates, fps, coarse_step, frame_ranges)
+    refined_frames = sum(end - start for start, end in windows)
+    print(f"[COMBINED] Точный проход: {len(windows)} окон, {refined_frames} кадров "
+          f"(из {sum(end - start for start, end in frame_ranges)}).")
 
-    # === Результаты ===
     osg_results: List[Dict[str, Any]] = []
-    footage_results: List[float] = []
-    next_allowed_osg_time = -float('inf')
-    next_allowed_footage_time = -float('inf')
-
-    # === Цикл по диапазонам ===
-    # Если skip > 1, используем прыжки cap.set для чтения только нужных кадров
-    use_jumps = (footage_skip > 1 or osg_skip > 1)
-
-    for start_frame, end_frame in frame_ranges:
-        if use_jumps:
-            # Собираем только те кадры, которые нужны для Footage или OSD
-            frames_to_process = []
-            for frame_index in range(start_frame, end_frame):
-                rel = frame_index - start_frame
-                if rel % footage_skip == 0 or rel % osg_skip == 0:
-                    frames_to_process.append(frame_index)
-            total_to_process = len(frames_to_process)
-            processed_count = 0
-
-            for frame_index in frames_to_process:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-                ret, frame = cap.read()
-                if not ret:
-                    continue
-                current_time_sec = frame_index / fps
-                processed_count += 1
-
-                if progress_callback and (processed_count % 50 == 0 or processed_count == total_to_process):
-                    progress_callback(processed_count, total_to_process)
-
-                # --- Footage ---
-                if (frame_index - start_frame) % footage_skip == 0 and current_time_sec >= next_allowed_footage_time:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    similarity = _calc_similarity(gray, template_arr, footage_resize)
-                    if similarity >= footage_threshold:
-                        footage_results.append(current_time_sec)
-                        next_allowed_footage_time = current_time_sec + footage_debounce
-
-                # --- OSD ---
-                if (frame_index - start_frame) % osg_skip == 0 and current_time_sec >= next_allowed_osg_time:
-                    roi_img = frame[y:y+h, x:x+w]
-                    if roi_img.size == 0:
-                        continue
-                    processed_img = _preprocess_image(roi_img, osg_preprocess)
-                    pil_img_roi = Image.fromarray(processed_img)
-                    try:
-                        if use_tesserocr and tesserocr_api is not None:
-                            tesserocr_api.SetImage(pil_img_roi)
-                            text = tesserocr_api.GetUTF8Text().strip()
-                            confidences = tesserocr_api.AllWordConfidences()
-                            avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
-                        else:
-                            import pytesseract
-                            config = '--psm 6 --oem 3 -l rus'
-                            data = pytesseract.image_to_data(
-                                pil_img_roi, output_type=pytesseract.Output.DICT, config=config
-                            )
-                            words = [word.strip() for word in data['text'] if word.strip()]
-                            text = ' '.join(words)
-                            confidences = [conf for conf, word in zip(data['conf'], data['text']) if word.strip()]
-                            avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
-                    except Exception as e:
-                        print(f"[COMBINED] Ошибка OCR на кадре {frame_index}: {e}")
-                        continue
-
-                    if text:
-                        found_keyword = None
-                        for kw in event_type_map:
-                            if kw.upper() in text.upper():
-                                found_keyword = kw
-                                break
-
-                        if found_keyword is not None:
-                            event_type = event_type_map[found_keyword]
-                            if avg_conf >= osg_corr_thresh:
-                                osg_results.append({
-                                    "global_time_sec": current_time_sec,
-                                    "detected_text": text,
-                                    "event_type": event_type,
-                                    "confidence": avg_conf
-                                })
-                                next_allowed_osg_time = current_time_sec + osg_debounce
-                                if osg_find_first_only:
-                                    break
-
-            if osg_find_first_only and osg_results:
+    footage_results: List[Dict[str, Any]] = []
+    if windows:
+        fine_params = dict(analysis_params, coarse_to_fine=False, osg_skip_every_n=1, footage_skip_every_n=1)
+        # Окна в секундах с запасом в полкадра: int(sec * fps) в frame_ranges_from_seconds даёт ровно те же кадры
+        fine_ranges = [((start + 0.5) / fps, (end + 0.5) / fps) for start, end in windows]
+        osg_results, footage_results = run_combined_detection(
+            video_path, fine_ranges, template_png_path, roi, event_type_map,
+            dict(fine_params, footage_via_index=fingerprint_index is not None), progress_callback,
+            base_resolution, keyframe_index, ocr_cache=ocr_cache, stats=stats
+        )
+    if fingerprint_index is not None:
+        # Индекс отпечатков и так не декодирует видео — футажи ищутся по всем диапазонам
+        footage_results = _footage_from_index(fingerprint_index, template_png_path, frame_ranges,
+                                              analysis_params, osg_results)
+    return osg_results, footage_results
+
+
+def _refine_windows(
+    candidate_times: List[float],
+    fps: float,
+    radius_frames: int,
+    frame_ranges: List[Tuple[int, int]]
+) -> List[Tuple[int, int]]:
+    """Окна [кадр - radius, кадр + radius] вокруг кандидатов, обрезанные по диапазонам поиска и слитые."""
+    windows = []
+    for t in sorted(candidate_times):
+        frame_index = int(round(t * fps))
+        for start, end in frame_ranges:
+            if start <= frame_index < end:
+                windows.append((max(start, frame_index - radius_frames), min(end, frame_index + radius_frames + 1)))
                 break
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
         else:
-            # Последовательное чтение всех кадров (fallback если skip=1)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-            frame_index = start_frame
-
-            while frame_index < end_frame:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frame_index += 1
-                current_time_sec = frame_index / fps
-                processed_count += 1
-
-                if progress_callback and (processed_count % 100 == 0 or processed_count == total_to_process):
-                    progress_callback(processed_count, total_to_process)
-
-                # --- Footage ---
-                if (frame_index - start_frame) % footage_skip == 0 and current_time_sec >= next_allowed_footage_time:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    similarity = _calc_similarity(gray, template_arr, footage_resize)
-                    if similarity >= footage_threshold:
-                        footage_results.append(current_time_sec)
-                        next_allowed_footage_time = current_time_sec + footage_debounce
-
-                # --- OSD ---
-                if (frame_index - start_frame) % osg_skip == 0 and current_time_sec >= next_allowed_osg_time:
-                    roi_img = frame[y:y+h, x:x+w]
-                    if roi_img.size == 0:
-                        continue
-                    processed_img = _preprocess_image(roi_img, osg_preprocess)
-                    pil_img_roi = Image.fromarray(processed_img)
-                    try:
-                        if use_tesserocr and tesserocr_api is not None:
-                            tesserocr_api.SetImage(pil_img_roi)
-                            text = tesserocr_api.GetUTF8Text().strip()
-                            confidences = tesserocr_api.AllWordConfidences()
-                            avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
-                        else:
-                            import pytesseract
-                            config = '--psm 6 --oem 3 -l rus'
-                            data = pytesseract.image_to_data(
-                                pil_img_roi, output_type=pytesseract.Output.DICT, config=config
-                            )
-                            words = [word.strip() for word in data['text'] if word.strip()]
-                            text = ' '.join(words)
-                            confidences = [conf for conf, word in zip(data['conf'], data['text']) if word.strip()]
-                            avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
-                    except Exception as e:
-                        print(f"[COMBINED] Ошибка OCR на кадре {frame_index}: {e}")
-                        continue
-
-                    if text:
-                        found_keyword = None
-                        for kw in event_type_map:
-                            if kw.upper() in text.upper():
-                                found_keyword = kw
-                                break
-
-                        if found_keyword is not None:
-                            event_type = event_type_map[found_keyword]
-                            if avg_conf >= osg_corr_thresh:
-                                osg_results.append({
-                                    "global_time_sec": current_time_sec,
-                                    "detected_text": text,
-                                    "event_type": event_type,
-                                    "confidence": avg_conf
-                                })
-                                next_allowed_osg_time = current_time_sec + osg_debounce
-                                if osg_find_first_only:
-                                    break
-
-            if osg_find_first_only and osg_results:
+            merged.append((start, end))
+    return merged
+
+
+# === Параллельный режим ===
+
+def _ranges_are_ordered(frame_ranges: List[Tuple[int, int]]) -> bool:
+    """Шарды сливаются в порядке времени, поэтому диапазоны должны идти по возрастанию без перекрытий."""
+    return all(prev_end <= start for (_, prev_end), (start, _) in zip(frame_ranges, frame_ranges[1:]))
+
+
+def _plan_shards(frame_ranges: List[Tuple[int, int]], cut_points: List[int], shard_count: int,
+                 min_shard_frames: int) -> List[Tuple[int, int, int]]:
+    """
+    Делит диапазоны на шарды (range_start, start_frame, end_frame) примерно равной длины.
+    Внутри диапазона шард начинается только с кадра из cut_points (ключевые кадры), чтобы
+    декодирование после seek давало те же кадры, что и последовательное чтение.
+    """
+    total = sum(end - start for start, end in frame_ranges)
+    target = max(min_shard_frames, total // max(1, shard_count))
+    shards = []
+    for range_start, range_end in frame_ranges:
+        cut = range_start
+        while range_end - cut > target:
+            pos = bisect_left(cut_points, cut + target)
+            if pos >= len(cut_points) or cut_points[pos] >= range_end:
                 break
+            shards.append((range_start, cut, cut_points[pos]))
+            cut = cut_points[pos]
+        shards.append((range_start, cut, range_end))
+    return shards
+
+
+def _merge_shard_results(
+    shard_results: List[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]],
+    osg_debounce: float,
+    footage_debounce: float,
+    osg_find_first_only: bool
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Сливает кандидатов шардов (в порядке шардов = порядке времени) и повторно применяет дебаунс
+    через границы шардов так же, как однопроцессный проход.
+    """
+    osg_candidates = [event for osg, _ in shard_results for event in osg]
+    footage_candidates = [match for _, footage in shard_results for match in footage]
 
-    cap.release()
-    if tesserocr_api is not None:
-        tesserocr_api.End()
+    if osg_find_first_only and osg_candidates:
+        # Однопроцессный проход останавливается на первом событии OSD (футаж на этом кадре уже проверен)
+        first = osg_candidates[0]
+        footage_candidates = [m for m in footage_candidates if m["global_time_sec"] <= first["global_time_sec"]]
+        osg_candidates = [first]
 
-    print(f"[COMBINED] Найдено OSD событий: {len(osg_results)}, футажей: {len(footage_results)}")
-    return osg_results, footage_results
+    return debounce_events(osg_candidates, osg_debounce), debounce_footage(footage_candidates, footage_debounce)
+
+
+# Ресурсы рабочего процесса (создаются в _init_shard_worker, один раз на процесс)
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_shard_worker(video_path, template_png_path, roi, event_type_map, analysis_params, base_resolution,
+                       ocr_cache_path=None):
+    """
+    Инициализатор процесса пула: своё открытое видео (FrameSource), свои этапы (tesserocr) и своя копия кэша OCR на процесс.
+    Новые записи кэша возвращаются с результатами шардов; на диск кэш сохраняет основной процесс.
+    """
+    source = FrameSource(video_path, analysis_params.get("decode_backend", DECODE_BACKEND_OPENCV), "[COMBINED]")
+    ocr_cache = OcrMemoCache(ocr_cache_path) if ocr_cache_path else None
+    osg_stage, footage_stage = _build_stages(analysis_params, template_png_path, roi, event_type_map,
+                                             base_resolution, ocr_cache, verbose=False)
+    stages = _stage_list(osg_stage, footage_stage)
+    for stage in stages:
+        stage.prepare(source.frame_width, source.frame_height, source.fps)
+    _WORKER["source"] = source
+    _WORKER["osg"] = osg_stage
+    _WORKER["footage"] = footage_stage
+    _WORKER["stages"] = stages
+    _WORKER["strategy"] = analysis_params.get("skip_strategy", SKIP_STRATEGY_SEEK)
+
+
+def _scan_shard(task: Tuple[int, Tuple[int, int, int]]):
+    """
+    Обрабатывает один шард в рабочем процессе.
+    Возвращает (номер шарда, osg, footage, обработано кадров, счётчики OCR за шард, новые записи кэша OCR).
+    Футажи возвращаются кандидатами без дебаунса: он применяется при слиянии шардов.
+    """
+    shard_idx, (range_start, start_frame, end_frame) = task
+    source = _WORKER["source"]
+    fps = source.fps
+    osg_stage, footage_stage = _WORKER["osg"], _WORKER["footage"]
+    # Нижняя граница времени кадров шарда: все кадры предыдущих шардов строго раньше
+    osg_stage.reset(floor_time=start_frame / fps)
+    if footage_stage is not None:
+        footage_stage.reset()
+    processed = 0
+    before = osg_stage.engine.counters()
+
+    def on_frame():
+        nonlocal processed
+        processed += 1
+
+    try:
+        run_stages(source, _WORKER["stages"], range_start, start_frame, end_frame, _WORKER["strategy"], on_frame)
+    finally:
+        for stage in _WORKER["stages"]:
+            stage.finish()
+    ocr_counts = tuple(after - prev for after, prev in zip(osg_stage.engine.counters(), before))
+    ocr_cache = osg_stage.engine.ocr_cache
+    new_cache_entries = ocr_cache.take_new_entries() if ocr_cache is not None else {}
+    footage = footage_stage.candidates if footage_stage is not None else []
+    return shard_idx, osg_stage.results(), footage, processed, ocr_counts, new_cache_entries
+
+
+def _run_parallel_detection(
+    video_path: VideoSource,
+    frame_ranges: List[Tuple[int, int]],
+    fps: float,
+    stages: List[DetectorStage],
+    template_png_path: TemplateSource,
+    roi: Dict[str, int],
+    event_type_map: Dict[str, str],
+    analysis_params: Dict[str, Any],
+    workers: int,
+    progress_callback: Optional[Callable[[int, int], None]],
+    base_resolution: Tuple[int, int],
+    keyframe_index: Optional[KeyframeIndex],
+    segment_starts: Optional[List[int]],
+    ocr_cache: Optional[OcrMemoCache] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """
+    stages — этапы основного процесса: по ним считается прогресс и в их OcrEngine
+    собираются счётчики OCR рабочих процессов.
+
+    Returns:
+        (osg_results, footage_results, прочитано кадров).
+    """
+    # Точки разреза: ключевые кадры; для многофайлового матча — начала файлов
+    if is_multi_segment(video_path):
+        cut_points = sorted(segment_starts or [])
+    else:
+        if keyframe_index is None:
+            keyframe_index = build_keyframe_index(video_path, fps)
+        cut_points = keyframe_index.keyframes if keyframe_index else []
+
+    osg_stage = next(stage for stage in stages if isinstance(stage, OsgStage))
+    # Гейт ROI (RoiChangeGate) возвращает прошлый результат OCR, и он зависит от кадров до шарда,
+    # которых рабочий процесс не видел, — с ним шарды не совпали бы с однопроцессным проходом.
+    if analysis_params.get("osg_gate_threshold", DEFAULT_GATE_THRESHOLD) > 0:
+        print("[COMBINED] Гейт изменений ROI в параллельном режиме отключён (OCR через кэш).")
+        analysis_params = dict(analysis_params, osg_gate_threshold=0.0)
+    shards = _plan_shards(frame_ranges, cut_points, workers * SHARDS_PER_WORKER, int(MIN_SHARD_SECONDS * fps))
+    processes = min(workers, len(shards))
+    print(f"[COMBINED] Параллельный режим: {len(shards)} шардов, процессов: {processes}.")
+    total_to_process = sum(count_sampled(stages, *shard) for shard in shards)
+
+    shard_results: List[Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]] = [None] * len(shards)
+    processed_count = 0
+    scan_start = time.perf_counter()
+    # spawn: одинаковое поведение на Windows и Linux, без наследования состояния Qt/потоков
+    mp_context = multiprocessing.get_context("spawn")
+    with mp_context.Pool(
+        processes=processes,
+        initializer=_init_shard_worker,
+        initargs=(video_path, template_png_path, roi, event_type_map, analysis_params, base_resolution,
+                  ocr_cache.path if ocr_cache is not None else None)
+    ) as pool:
+        for shard_idx, osg, footage, processed, ocr_counts, new_cache_entries in pool.imap_unordered(
+                _scan_shard, list(enumerate(shards))):
+            shard_results[shard_idx] = (osg, footage)
+            processed_count += processed
+            osg_stage.engine.add_counters(ocr_counts)
+            if ocr_cache is not None:
+                ocr_cache.merge(new_cache_entries)
+            if progress_callback:
+                progress_callback(processed_count, total_to_process)
+
+    print_throughput("[COMBINED]", f"{analysis_params['skip_strategy']} x{processes}", processed_count,
+                     time.perf_counter() - scan_start)
+    osg_results, footage_results = _merge_shard_results(
+        shard_results, osg_stage.debounce_seconds,
+        analysis_params.get("footage_debounce_seconds", 5.0), osg_stage.find_first_only
+    )
+    return osg_results, footage_results, processed_count
+
+
+def check_parallel_matches_serial(
+    video_path: VideoSource,
+    search_ranges: List[Tuple[float, float]],
+    template_png_path: TemplateSource,
+    roi: Dict[str, int],
+    event_type_map: Dict[str, str],
+    analysis_params: Dict[str, Any],
+    workers: int = 2,
+    base_resolution: Tuple[int, int] = (1920, 1080)
+) -> bool:
+    """
+    Проверка параллельного режима на коротком фрагменте: однопроцессный и параллельный проходы
+    с одинаковыми параметрами должны дать одинаковые события OSD и футажи.
+
+    Оба прохода идут без гейта ROI (в параллельном он и так отключён) и без кэша OCR: записи кэша
+    по перцептивному хешу зависят от порядка кадров, а сравнивается сам проход.
+    Фрагмент должен быть длиннее MIN_SHARD_SECONDS * 2, иначе шард будет один.
+
+    Returns:
+        True, если результаты совпали; расхождения печатаются.
+    """
+    params = dict(analysis_params, osg_gate_threshold=0.0, osg_use_ocr_cache=False, coarse_to_fine=False)
+    serial = run_combined_detection(video_path, search_ranges, template_png_path, roi, event_type_map,
+                                    dict(params, parallel_workers=1), base_resolution=base_resolution)
+    parallel = run_combined_detection(video_path, search_ranges, template_png_path, roi, event_type_map,
+                                      dict(params, parallel_workers=workers), base_resolution=base_resolution)
+
+    matched = True
+    for name, keys, serial_items, parallel_items in (
+        ("OSD", ("global_time_sec", "event_type", "detected_text"), serial[0], parallel[0]),
+        ("футажи", ("global_time_sec", "template"), serial[1], parallel[1]),
+    ):
+        serial_keys = [tuple(item.get(k) for k in keys) for item in serial_items]
+        parallel_keys = [tuple(item.get(k) for k in keys) for item in parallel_items]
+        if serial_keys != parallel_keys:
+            matched = False
+            print(f"[COMBINED] Расхождение ({name}): только в однопроцессном "
+                  f"{sorted(set(serial_keys) - set(parallel_keys))}, только в параллельном "
+                  f"{sorted(set(parallel_keys) - set(serial_keys))}")
+    print(f"[COMBINED] Параллельный (x{workers}) и однопроцессный проходы "
+          f"{'совпадают' if matched else 'РАСХОДЯТСЯ'}.")
+    return matched
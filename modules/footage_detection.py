@@ -2,12 +2,26 @@
 """
 Модуль для автоматического обнаружения видеовставок (футажей) в хоккейных трансляциях.
 Ищет повторяющийся короткий футаж (например, логотип лиги) по его ключевому кадру (PNG).
-Возвращает только времена обнаружения (в секундах), а не интервалы.
+Можно передать банк шаблонов (несколько PNG): кадры сравниваются со всеми шаблонами сразу,
+блоками кадров (кадры × шаблоны), и у каждого обнаружения записывается сработавший шаблон.
+Поиск выполнен этапом FootageStage общего конвейера modules.frame_pipeline (тот же этап
+подключается к объединённому проходу). Возвращает только моменты обнаружения, а не интервалы.
 """
 
 import cv2
 import numpy as np
-from typing import List, Tuple, Optional, Callable
+from typing import List, Tuple, Optional, Callable, Union, Dict, Any
+
+from utils.virtual_video import VideoSource
+from utils.fingerprint_index import FingerprintIndex
+from modules.frame_pipeline import (
+    DetectorStage, run_pipeline, open_frame_source, frame_ranges_from_seconds, DECODE_BACKEND_OPENCV
+)
+
+# Один PNG или список PNG (банк шаблонов)
+TemplateSource = Union[str, List[str]]
+# Сколько кадров сравнивать с банком шаблонов за одну векторную операцию
+MATCH_BLOCK_FRAMES = 64
 
 
 def _calculate_hash_similarity(hash1: bytes, hash2: bytes, resize: Tuple[int, int] = (32, 32)) -> float:
@@ -31,22 +45,155 @@ def extract_frame_hash_from_png(png_path: str, resize: Tuple[int, int] = (32, 32
     return small.tobytes()
 
 
+def template_paths(templates: TemplateSource) -> List[str]:
+    """Список PNG банка шаблонов (один путь — банк из одного шаблона)."""
+    return [templates] if isinstance(templates, str) else list(templates)
+
+
+def load_template_bank(templates: TemplateSource, resize: Tuple[int, int] = (32, 32)) -> np.ndarray:
+    """
+    Загружает все PNG банка и складывает их в один массив (шаблоны, высота, ширина) uint8.
+    """
+    paths = template_paths(templates)
+    if not paths:
+        raise ValueError("Банк шаблонов футажей пуст.")
+    bank = [np.frombuffer(extract_frame_hash_from_png(path, resize), dtype=np.uint8) for path in paths]
+    return np.stack(bank).reshape((len(paths), resize[1], resize[0]))
+
+
+def bank_similarity(frames: np.ndarray, bank: np.ndarray) -> np.ndarray:
+    """
+    Схожесть блока кадров (кадры, h, w) со всеми шаблонами банка (шаблоны, h, w) одной операцией.
+    Мера та же, что у _calculate_hash_similarity: 1 - mean|кадр - шаблон| / 255.
+
+    Returns:
+        Массив (кадры, шаблоны) float32.
+    """
+    diff = np.abs(frames[:, None].astype(np.int16) - bank[None].astype(np.int16))
+    return (1.0 - diff.mean(axis=(2, 3)) / 255.0).astype(np.float32)
+
+
+def footage_match(global_time_sec: float, templates: TemplateSource, template_idx: int, similarity: float) -> Dict[str, Any]:
+    """Результат обнаружения футажа: время и сработавший шаблон банка."""
+    return {
+        "global_time_sec": float(global_time_sec),
+        "template": template_paths(templates)[template_idx],
+        "similarity": float(similarity)
+    }
+
+
+def threshold_matches(
+    times: np.ndarray,
+    similarity: np.ndarray,
+    templates: TemplateSource,
+    threshold: float
+) -> List[Dict[str, Any]]:
+    """Кадры (times, в секундах), где лучший шаблон банка превысил порог; similarity — (кадры, шаблоны)."""
+    if len(times) == 0:
+        return []
+    best = similarity.argmax(axis=1)
+    best_similarity = similarity[np.arange(len(best)), best]
+    return [
+        footage_match(times[pos], templates, int(best[pos]), best_similarity[pos])
+        for pos in np.nonzero(best_similarity >= threshold)[0]
+    ]
+
+
+def debounce_footage(matches: List[Dict[str, Any]], debounce_seconds: float) -> List[Dict[str, Any]]:
+    """Дебаунс по времени (общий для всех шаблонов — как у одиночного шаблона); matches — в порядке времени."""
+    results = []
+    next_allowed_time_sec = -float('inf')
+    for match in matches:
+        if match["global_time_sec"] >= next_allowed_time_sec:
+            results.append(match)
+            next_allowed_time_sec = match["global_time_sec"] + debounce_seconds
+    return results
+
+
+def debounce_matches(
+    frame_indices: np.ndarray,
+    similarity: np.ndarray,
+    templates: TemplateSource,
+    threshold: float,
+    fps: float,
+    debounce_seconds: float
+) -> List[Dict[str, Any]]:
+    """
+    Отбирает кадры, где лучший шаблон банка превысил порог, и применяет дебаунс по времени.
+    similarity — (кадры, шаблоны).
+    """
+    matches = threshold_matches(np.asarray(frame_indices) / fps, similarity, templates, threshold)
+    return debounce_footage(matches, debounce_seconds)
+
+
+class FootageStage(DetectorStage):
+    """
+    Этап конвейера: сравнение кадров с банком шаблонов.
+    Уменьшенные кадры копятся блоками по MATCH_BLOCK_FRAMES и сравниваются с банком одной операцией;
+    кандидаты (выше порога) копятся в candidates, дебаунс применяется в results(). Результат тот же,
+    что и при покадровой проверке с дебаунсом: дебаунс только пропускает кадры.
+    """
+    name = "footage"
+
+    def __init__(self, templates: TemplateSource, resize: Tuple[int, int], threshold: float,
+                 debounce_seconds: float, stride: int = 1):
+        super().__init__(stride)
+        self.templates = templates
+        self.resize = resize
+        self.threshold = threshold
+        self.debounce_seconds = debounce_seconds
+        self.bank = load_template_bank(templates, resize)
+        self.thumb_size = tuple(resize)
+        self.candidates: List[Dict[str, Any]] = []
+        self._block = np.empty((MATCH_BLOCK_FRAMES, resize[1], resize[0]), dtype=np.uint8)
+        self._block_times: List[float] = []
+
+    def process(self, image: np.ndarray, frame_index: int, current_time_sec: float) -> bool:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self._block[len(self._block_times)] = cv2.resize(gray, self.resize, interpolation=cv2.INTER_AREA)
+        self._block_times.append(current_time_sec)
+        if len(self._block_times) == MATCH_BLOCK_FRAMES:
+            self._flush_block()
+        return False
+
+    def _flush_block(self) -> None:
+        if not self._block_times:
+            return
+        count = len(self._block_times)
+        similarity = bank_similarity(self._block[:count], self.bank)
+        self.candidates.extend(threshold_matches(np.array(self._block_times), similarity, self.templates, self.threshold))
+        self._block_times.clear()
+
+    def finish(self) -> None:
+        self._flush_block()
+
+    def reset(self) -> None:
+        """Начать новый независимый проход (например, шард в параллельном режиме)."""
+        self.candidates = []
+        self._block_times.clear()
+
+    def results(self) -> List[Dict[str, Any]]:
+        return debounce_footage(self.candidates, self.debounce_seconds)
+
+
 def find_video_template(
-    main_video_path: str,
-    template_png_path: str,
+    main_video_path: VideoSource,
+    template_png_path: TemplateSource,
     threshold: float = 0.95,
     resize: Tuple[int, int] = (32, 32),
     skip_every_n: int = 1,
     search_ranges: Optional[List[Tuple[float, float]]] = None,
     debounce_seconds: float = 0.0, # <-- Новый параметр
-    progress_callback: Optional[Callable[[int, int], None]] = None
-) -> List[float]:
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    fingerprint_index: Optional[FingerprintIndex] = None,
+    decode_backend: str = DECODE_BACKEND_OPENCV
+) -> List[Dict[str, Any]]:
     """
-    Ищет все вхождения футажа (по ключевому кадру из PNG) в основном видео.
+    Ищет все вхождения футажа (по ключевому кадру из PNG или банку PNG) в основном видео.
 
     Args:
-        main_video_path: Путь к видео матча.
-        template_png_path: Путь к PNG-файлу с ключевым кадром футажа.
+        main_video_path: Путь к видео матча или список сегментов (VideoSegment), если матч записан несколькими файлами.
+        template_png_path: Путь к PNG-файлу с ключевым кадром футажа или список путей (банк шаблонов).
         threshold: Порог схожести [0.0, 1.0]. Рекомендуется 0.92–0.95.
         resize: Размер кадра для сравнения (ширина, высота).
         skip_every_n: Обрабатывать каждый n-й кадр (1 = каждый кадр).
@@ -54,9 +201,14 @@ def find_video_template(
         debounce_seconds: Минимальная пауза (в секундах) между обнаружениями.
                          После нахождения футажа, не искать в течение debounce_seconds.
         progress_callback: Опциональный callback для отслеживания прогресса.
+        fingerprint_index: Индекс отпечатков этого видео (utils.fingerprint_index). Если передан,
+                           видео не декодируется: поиск идёт векторно по отпечаткам с шагом индекса
+                           (skip_every_n при этом не используется).
+        decode_backend: "opencv" или "ffmpeg_roi" — ffmpeg отдаёт только миниатюру resize вместо полного кадра.
 
     Returns:
-        List[float]: Список времён (в секундах) обнаружения ключевого кадра.
+        List[Dict]: Обнаружения {"global_time_sec", "template", "similarity"} в порядке времени;
+                    "template" — путь PNG сработавшего шаблона банка.
 
     Raises:
         ValueError: При ошибках работы с видео или шаблоном.
@@ -64,82 +216,19 @@ def find_video_template(
     if skip_every_n < 1:
         skip_every_n = 1
 
-    # === Загружаем FPS и общую длительность основного видео ===
-    cap = cv2.VideoCapture(main_video_path)
-    if not cap.isOpened():
-        raise ValueError(f"Не удалось открыть основное видео: {main_video_path}")
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    cap.release()
-    if fps <= 0:
-        fps = 25.0
-
-    # === Загружаем ключевой кадр шаблона (из PNG) ===
-    key_hash = extract_frame_hash_from_png(template_png_path, resize)
-
-    # === Определяем диапазоны поиска ===
-    if search_ranges is None:
-        # Поиск по всему видео
-        frame_ranges = [(0, total_frames)]
-    else:
-        # Преобразуем временные диапазоны в кадровые
-        frame_ranges = []
-        for start_sec, end_sec in search_ranges:
-            start_frame = max(0, int(start_sec * fps))
-            end_frame = min(total_frames, int(end_sec * fps))
-            if start_frame < end_frame:
-                frame_ranges.append((start_frame, end_frame))
-
-    # === Потоковая обработка по диапазонам ===
-    cap = cv2.VideoCapture(main_video_path)
-    if not cap.isOpened():
-        raise ValueError(f"Не удалось открыть основное видео (второй раз): {main_video_path}")
-
-    results = []
-    total_to_process = 0
-    processed_count = 0
-
-    # Подсчёт общего числа кадров для обработки (для прогресса)
-    for start_f, end_f in frame_ranges:
-        total_to_process += (end_f - start_f + skip_every_n - 1) // skip_every_n
-
-    # === НОВОЕ: Переменная для отслеживания времени, после которого можно искать снова ===
-    next_allowed_time_sec = -float('inf')
-
-    # Обработка каждого диапазона
-    for start_frame, end_frame in frame_ranges:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-        frame_index = start_frame
-
-        while frame_index < end_frame:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            current_time_sec = frame_index / fps
-
-            # Пропускаем кадры, если skip_every_n > 1
-            if (frame_index - start_frame) % skip_every_n != 0:
-                frame_index += 1
-                continue
-
-            # === Проверка дебаунсинга ===
-            if current_time_sec < next_allowed_time_sec:
-                frame_index += 1
-                continue
-
-            # Обрабатываем кадр
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            small = cv2.resize(gray, resize, interpolation=cv2.INTER_AREA)
-            frame_hash = small.tobytes()
-
-            similarity = _calculate_hash_similarity(frame_hash, key_hash, resize)
-            if similarity >= threshold:
-                results.append(current_time_sec)
-                # === НОВОЕ: Устанавливаем время, после которого можно искать снова ===
-                next_allowed_time_sec = current_time_sec + debounce_seconds
-
-            frame_index += 1
-
-    cap.release()
-    return results
\ No newline at end of file
+    stage = FootageStage(template_png_path, resize, threshold, debounce_seconds, skip_every_n)
+
+    # === Поиск по индексу отпечатков (без декодирования) ===
+    if fingerprint_index is not None:
+        cap, fps, total_frames, _, _ = open_frame_source(main_video_path)
+        cap.release()
+        frame_indices, similarity = fingerprint_index.match_bank(
+            stage.bank, resize, frame_ranges_from_seconds(search_ranges, fps, total_frames)
+        )
+        return debounce_matches(frame_indices, similarity, template_png_path, threshold,
+                                fingerprint_index.fps, debounce_seconds)
+
+    # === Один проход конвейера с единственным этапом ===
+    run_pipeline(main_video_path, [stage], search_ranges, progress_callback=progress_callback, log_prefix="[FOOTAGE]",
+                 decode_backend=decode_backend)
+    return stage.results()
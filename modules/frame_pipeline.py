@@ -0,0 +1,435 @@
+# modules/frame_pipeline.py
+"""
+Конвейер "декодировать один раз" для детекторов.
+Источник кадров читает видео по диапазонам поиска один раз и раздаёт кадры подключаемым этапам
+(DetectorStage). Каждый этап объявляет свой шаг (stride) и ROI; кадр читается, только если он нужен
+хотя бы одному этапу, а прореживание выполняется через seek или grab() (что быстрее на этом видео).
+Поиск футажей, OCR графики и будущие детекторы работают от одного декодирования вместо отдельных циклов.
+Бэкенд декодирования "ffmpeg_roi" (utils.roi_decoder) вместо полных кадров OpenCV передаёт из ffmpeg
+только области, объявленные этапами: ROI (roi_rect) и уменьшенный кадр (thumb_size).
+"""
+
+import time
+from typing import List, Tuple, Optional, Callable, Iterator, Any
+
+import cv2
+import numpy as np
+
+from utils.keyframe_index import KeyframeIndex
+from utils.virtual_video import open_video_capture, is_multi_segment, VideoSource
+from utils.roi_decoder import RoiStreamReader, Region, clamp_region, ffmpeg_available
+
+# --- Стратегия пропуска кадров при stride > 1 ---
+SKIP_STRATEGY_SEEK = "seek"  # cap.set + read на каждый нужный кадр
+SKIP_STRATEGY_GRAB = "grab"  # Последовательно: grab() без retrieve() для ненужных, read() для нужных
+SKIP_STRATEGY_SEQUENTIAL = "sequential"  # Все этапы смотрят каждый кадр
+PROBE_SEEKS = 5              # Сколько seek замерять при оценке
+PROBE_GRABS = 60             # Сколько grab() замерять при оценке
+
+# --- Бэкенд декодирования ---
+DECODE_BACKEND_OPENCV = "opencv"          # Полные кадры через cv2.VideoCapture
+DECODE_BACKEND_FFMPEG_ROI = "ffmpeg_roi"  # Только области этапов через ffmpeg (crop/scale в pipe)
+
+
+class DetectorStage:
+    """
+    Этап конвейера. Объявляет шаг выборки (stride, от начала диапазона) и ROI; получает кадры
+    (или вырезанный ROI) в порядке времени.
+
+    Жизненный цикл: prepare() после открытия видео -> begin_range() в начале каждого диапазона (шарда) ->
+    process() на нужных кадрах -> finish().
+    """
+    name = "stage"
+
+    def __init__(self, stride: int = 1):
+        self.stride: int = max(1, int(stride))
+        # ROI в пикселях кадра (x, y, w, h); None — этапу нужен весь кадр. Заполняется в prepare().
+        self.roi_rect: Optional[Tuple[int, int, int, int]] = None
+        # Если этапу достаточно всего кадра, уменьшенного до (w, h), — бэкенд ffmpeg_roi отдаёт только миниатюру.
+        # Через OpenCV этап по-прежнему получает полный кадр и уменьшает его сам.
+        self.thumb_size: Optional[Tuple[int, int]] = None
+
+    def prepare(self, frame_width: int, frame_height: int, fps: float) -> None:
+        """Вызывается после открытия видео (масштабирование ROI и т.п.)."""
+
+    def begin_range(self, start_frame: int) -> None:
+        """Вызывается перед первым кадром диапазона или шарда (сброс состояния, зависящего от соседних кадров)."""
+
+    def samples(self, rel: int) -> bool:
+        """Нужен ли этапу кадр с номером rel от начала диапазона (только по шагу, без состояния)."""
+        return rel % self.stride == 0
+
+    def due(self, current_time_sec: float) -> bool:
+        """Нужно ли обрабатывать кадр сейчас (например, дебаунс после найденного события)."""
+        return True
+
+    def process(self, image: np.ndarray, frame_index: int, current_time_sec: float) -> bool:
+        """Обрабатывает кадр/ROI. Возвращает True, если весь проход нужно остановить."""
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """Вызывается после прохода (досчитать накопленные блоки и т.п.)."""
+
+    def close(self) -> None:
+        """Освобождает ресурсы этапа."""
+
+
+def stage_region(stage: DetectorStage) -> Optional[Region]:
+    """Область кадра, которую этапу достаточно декодировать; None — нужен полный кадр."""
+    if stage.roi_rect is not None:
+        x, y, w, h = stage.roi_rect
+        return ("crop", x, y, w, h)
+    if stage.thumb_size is not None:
+        return ("scale", 0, 0, stage.thumb_size[0], stage.thumb_size[1])
+    return None
+
+
+def frame_ranges_from_seconds(
+    search_ranges: Optional[List[Tuple[float, float]]],
+    fps: float,
+    total_frames: int
+) -> List[Tuple[int, int]]:
+    """Диапазоны поиска (секунды) -> кадры [start, end); None — всё видео."""
+    if search_ranges is None:
+        return [(0, total_frames)]
+    frame_ranges = []
+    for start_sec, end_sec in search_ranges:
+        start_frame = max(0, int(start_sec * fps))
+        end_frame = min(total_frames, int(end_sec * fps))
+        if start_frame < end_frame:
+            frame_ranges.append((start_frame, end_frame))
+    return frame_ranges
+
+
+def open_frame_source(video_path: VideoSource) -> Tuple[Any, float, int, int, int]:
+    """
+    Открывает видео (один файл или сегменты).
+
+    Returns:
+        (cap, fps, total_frames, frame_width, frame_height)
+
+    Raises:
+        ValueError: если видео не открывается.
+    """
+    cap = open_video_capture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Не удалось открыть видео: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps <= 0:
+        fps = 25.0
+    return (cap, fps, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+
+class FrameSource:
+    """
+    Открытое видео для конвейера. backend "opencv" читает полные кадры через cap (seek/grab),
+    "ffmpeg_roi" — только области этапов через ffmpeg. ffmpeg_roi работает для одного файла,
+    когда все этапы объявили области, и ffmpeg найден; иначе используется OpenCV.
+    """
+    def __init__(self, video_path: VideoSource, backend: str = DECODE_BACKEND_OPENCV, log_prefix: str = "[PIPELINE]"):
+        self.video_path = video_path
+        self.log_prefix = log_prefix
+        self.cap, self.fps, self.total_frames, self.frame_width, self.frame_height = open_frame_source(video_path)
+        if backend == DECODE_BACKEND_FFMPEG_ROI and is_multi_segment(video_path):
+            print(f"{log_prefix} ffmpeg_roi не поддерживает матч из нескольких файлов — используется OpenCV.")
+            backend = DECODE_BACKEND_OPENCV
+        elif backend == DECODE_BACKEND_FFMPEG_ROI and not ffmpeg_available():
+            print(f"{log_prefix} ffmpeg не найден — используется OpenCV.")
+            backend = DECODE_BACKEND_OPENCV
+        self.backend = backend
+
+    def uses_ffmpeg(self, stages: List[DetectorStage]) -> bool:
+        return self.backend == DECODE_BACKEND_FFMPEG_ROI and all(stage_region(stage) for stage in stages)
+
+    def views(
+        self,
+        stages: List[DetectorStage],
+        range_start: int,
+        start_frame: int,
+        end_frame: int,
+        strategy: str
+    ) -> Iterator[Tuple[int, int, List[Optional[np.ndarray]]]]:
+        """(frame_index, rel, изображение для каждого этапа) для кадров, нужных хотя бы одному этапу."""
+        if not self.uses_ffmpeg(stages):
+            for frame_index, rel, frame in iter_frames(self.cap, stages, range_start, start_frame, end_frame, strategy):
+                yield frame_index, rel, [_crop_roi(stage, frame) for stage in stages]
+            return
+
+        regions = [clamp_region(stage_region(stage), self.frame_width, self.frame_height) for stage in stages]
+        decoded = [region for region in regions if region is not None]
+        if not decoded:
+            return
+        sampled = [f for f in range(start_frame, end_frame) if is_sampled(stages, f - range_start)]
+        reader = RoiStreamReader(self.video_path, decoded, self.fps, start_frame, len(sampled),
+                                 [stage.stride for stage in stages], start_frame - range_start)
+        with reader:
+            for frame_index, region_views in zip(sampled, reader):
+                images = iter(region_views)
+                yield frame_index, frame_index - range_start, [
+                    next(images) if region is not None else None for region in regions
+                ]
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+def _crop_roi(stage: DetectorStage, frame: np.ndarray) -> Optional[np.ndarray]:
+    if stage.roi_rect is None:
+        return frame
+    x, y, w, h = stage.roi_rect
+    image = frame[y:y+h, x:x+w]
+    return image if image.size else None
+
+
+def is_sampled(stages: List[DetectorStage], rel: int) -> bool:
+    """Нужен ли кадр хотя бы одному этапу."""
+    return any(stage.samples(rel) for stage in stages)
+
+
+def needs_every_frame(stages: List[DetectorStage]) -> bool:
+    return any(stage.stride == 1 for stage in stages)
+
+
+def count_sampled(stages: List[DetectorStage], range_start: int, start_frame: int, end_frame: int) -> int:
+    """Сколько кадров [start_frame, end_frame) диапазона range_start будет прочитано."""
+    if needs_every_frame(stages):
+        return end_frame - start_frame
+    return sum(1 for frame_index in range(start_frame, end_frame) if is_sampled(stages, frame_index - range_start))
+
+
+def choose_skip_strategy(
+    cap,
+    frame_ranges: List[Tuple[int, int]],
+    stages: List[DetectorStage],
+    keyframe_index: Optional[KeyframeIndex] = None,
+    log_prefix: str = "[PIPELINE]"
+) -> str:
+    """
+    Выбирает более быструю стратегию чтения прореженных кадров.
+    Замеряет на этом видео стоимость seek+read (зависит от размера GOP: декодер идёт от ключевого кадра)
+    и стоимость grab()/read() при последовательном чтении, затем сравнивает цену одного нужного кадра:
+    seek — seek+read, grab — (средний шаг - 1) * grab + read.
+    """
+    if needs_every_frame(stages):
+        return SKIP_STRATEGY_SEQUENTIAL
+    total = sum(end - start for start, end in frame_ranges)
+    if total == 0:
+        return SKIP_STRATEGY_SEEK
+    sampled = sum(count_sampled(stages, start, start, end) for start, end in frame_ranges)
+    stride = total / max(1, sampled)
+
+    # Точки замера равномерно по диапазонам поиска
+    probe_points = []
+    for k in range(PROBE_SEEKS):
+        offset = int(total * (k + 0.5) / PROBE_SEEKS)
+        for start, end in frame_ranges:
+            if offset < end - start:
+                probe_points.append(start + offset)
+                break
+            offset -= end - start
+
+    seek_times = []
+    for frame_index in probe_points:
+        t0 = time.perf_counter()
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        ret, _ = cap.read()
+        if ret:
+            seek_times.append(time.perf_counter() - t0)
+
+    # Последовательное чтение после последней точки (seek уже выполнен)
+    grab_times, read_times = [], []
+    for _ in range(PROBE_GRABS):
+        t0 = time.perf_counter()
+        if not cap.grab():
+            break
+        grab_times.append(time.perf_counter() - t0)
+    for _ in range(PROBE_SEEKS):
+        t0 = time.perf_counter()
+        ret, _ = cap.read()
+        if not ret:
+            break
+        read_times.append(time.perf_counter() - t0)
+
+    if not seek_times or not grab_times or not read_times:
+        return SKIP_STRATEGY_SEEK
+
+    seek_cost = sum(seek_times) / len(seek_times)
+    grab_cost = (stride - 1) * sum(grab_times) / len(grab_times) + sum(read_times) / len(read_times)
+    strategy = SKIP_STRATEGY_GRAB if grab_cost < seek_cost else SKIP_STRATEGY_SEEK
+
+    gop_info = ""
+    if keyframe_index is not None and len(keyframe_index.keyframes) > 1:
+        keyframes = keyframe_index.keyframes
+        gop_info = f", GOP ~{(keyframes[-1] - keyframes[0]) / (len(keyframes) - 1):.0f} кадров"
+    print(f"{log_prefix} Стратегия пропуска: {strategy} (шаг ~{stride:.1f}{gop_info}; "
+          f"seek {seek_cost * 1000:.1f} мс/кадр, grab {grab_cost * 1000:.1f} мс/кадр)")
+    return strategy
+
+
+def iter_frames(
+    cap,
+    stages: List[DetectorStage],
+    range_start: int,
+    start_frame: int,
+    end_frame: int,
+    strategy: str
+) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """
+    Источник кадров: (frame_index, rel, frame) для кадров [start_frame, end_frame), нужных хотя бы
+    одному этапу; rel — номер кадра от начала диапазона range_start.
+    """
+    if strategy == SKIP_STRATEGY_SEQUENTIAL or needs_every_frame(stages):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        for frame_index in range(start_frame, end_frame):
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame_index, frame_index - range_start, frame
+    elif strategy == SKIP_STRATEGY_GRAB:
+        # Последовательно: ненужные кадры только декодируются, без копирования в numpy
+        frame_index = start_frame
+        while frame_index < end_frame and not is_sampled(stages, frame_index - range_start):
+            frame_index += 1
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        while frame_index < end_frame:
+            rel = frame_index - range_start
+            if is_sampled(stages, rel):
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                yield frame_index, rel, frame
+            elif not cap.grab():
+                return
+            frame_index += 1
+    else:
+        # Seek на каждый нужный кадр
+        for frame_index in range(start_frame, end_frame):
+            rel = frame_index - range_start
+            if not is_sampled(stages, rel):
+                continue
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            yield frame_index, rel, frame
+
+
+def run_stages(
+    source: FrameSource,
+    stages: List[DetectorStage],
+    range_start: int,
+    start_frame: int,
+    end_frame: int,
+    strategy: str,
+    on_frame: Optional[Callable[[], None]] = None
+) -> bool:
+    """
+    Раздаёт кадры [start_frame, end_frame) этапам; время кадра — frame_index / fps.
+
+    Returns:
+        True, если один из этапов остановил проход.
+    """
+    for stage in stages:
+        stage.begin_range(start_frame)
+    for frame_index, rel, images in source.views(stages, range_start, start_frame, end_frame, strategy):
+        if on_frame:
+            on_frame()
+        current_time_sec = frame_index / source.fps
+        for stage, image in zip(stages, images):
+            if image is None or not stage.samples(rel) or not stage.due(current_time_sec):
+                continue
+            if stage.process(image, frame_index, current_time_sec):
+                return True
+    return False
+
+
+def print_throughput(log_prefix: str, strategy: str, processed: int, elapsed: float) -> None:
+    fps_measured = processed / elapsed if elapsed > 0 else 0.0
+    print(f"{log_prefix} Стратегия чтения: {strategy}, обработано {processed} кадров за {elapsed:.1f} с "
+          f"({fps_measured:.1f} кадр/с)")
+
+
+def resolve_strategy(
+    source: FrameSource,
+    frame_ranges: List[Tuple[int, int]],
+    stages: List[DetectorStage],
+    strategy: str = "auto",
+    keyframe_index: Optional[KeyframeIndex] = None,
+    log_prefix: str = "[PIPELINE]"
+) -> str:
+    """
+    "auto" -> замер seek против grab; если какому-то этапу нужен каждый кадр — последовательное чтение.
+    ffmpeg_roi сам читает видео последовательно, стратегия пропуска к нему не относится.
+    """
+    if source.uses_ffmpeg(stages):
+        return DECODE_BACKEND_FFMPEG_ROI
+    if needs_every_frame(stages):
+        return SKIP_STRATEGY_SEQUENTIAL
+    if strategy == "auto":
+        return choose_skip_strategy(source.cap, frame_ranges, stages, keyframe_index, log_prefix)
+    return strategy
+
+
+def scan_ranges(
+    source: FrameSource,
+    stages: List[DetectorStage],
+    frame_ranges: List[Tuple[int, int]],
+    strategy: str,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    log_prefix: str = "[PIPELINE]"
+) -> int:
+    """
+    Проход по диапазонам уже открытого видео (этапы подготовлены через prepare()).
+    Видео не закрывается; finish() этапов вызывается в конце.
+
+    Returns:
+        Число прочитанных кадров.
+    """
+    total_to_process = sum(count_sampled(stages, s, s, e) for s, e in frame_ranges)
+    processed_count = 0
+
+    def on_frame():
+        nonlocal processed_count
+        processed_count += 1
+        if progress_callback and (processed_count % 100 == 0 or processed_count == total_to_process):
+            progress_callback(processed_count, total_to_process)
+
+    scan_start = time.perf_counter()
+    try:
+        for start_frame, end_frame in frame_ranges:
+            if run_stages(source, stages, start_frame, start_frame, end_frame, strategy, on_frame):
+                break
+    finally:
+        for stage in stages:
+            stage.finish()
+    print_throughput(log_prefix, strategy, processed_count, time.perf_counter() - scan_start)
+    return processed_count
+
+
+def run_pipeline(
+    video_path: VideoSource,
+    stages: List[DetectorStage],
+    search_ranges: Optional[List[Tuple[float, float]]] = None,
+    strategy: str = "auto",
+    keyframe_index: Optional[KeyframeIndex] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    log_prefix: str = "[PIPELINE]",
+    decode_backend: str = DECODE_BACKEND_OPENCV
+) -> None:
+    """
+    Один проход по видео для всех этапов. Результаты остаются в самих этапах.
+
+    Args:
+        strategy: "auto" (замер seek против grab), "seek" или "grab".
+        decode_backend: "opencv" (полные кадры) или "ffmpeg_roi" (только области этапов).
+    """
+    source = FrameSource(video_path, decode_backend, log_prefix)
+    try:
+        for stage in stages:
+            stage.prepare(source.frame_width, source.frame_height, source.fps)
+        frame_ranges = frame_ranges_from_seconds(search_ranges, source.fps, source.total_frames)
+        strategy = resolve_strategy(source, frame_ranges, stages, strategy, keyframe_index, log_prefix)
+        scan_ranges(source, stages, frame_ranges, strategy, progress_callback, log_prefix)
+    finally:
+        source.release()
@@ -2,6 +2,7 @@
 """
 Модуль для автоматического обнаружения событий (например, "ГОЛ", "2 МИН") на on-screen graphics (OSG)
 в видеофайле по их появлению в заданной области кадра (ROI) с помощью OCR (pytesseract).
+Распознавание выполняет этап OsgStage общего конвейера modules.frame_pipeline.
 """
 
 import cv2
@@ -10,6 +11,15 @@ import pytesseract
 from PIL import Image
 from typing import List, Dict, Tuple, Optional, Callable, Any
 
+from utils.virtual_video import VideoSource
+from modules.frame_pipeline import DetectorStage, run_pipeline, DECODE_BACKEND_OPENCV
+from utils.ocr_cache import OcrMemoCache, get_shared_ocr_cache
+
+# --- Гейт изменений ROI перед OCR ---
+GATE_SIZE = (32, 12)             # Размер миниатюры ROI для сравнения (ширина, высота)
+DEFAULT_GATE_THRESHOLD = 3.0     # Средняя разница миниатюр (0-255), выше которой ROI считается изменившимся
+DEFAULT_GATE_LOCAL_THRESHOLD = 40  # Разница в одной точке миниатюры: появилась графика в части ROI
+
 
 def _preprocess_image(img: np.ndarray, method: int) -> np.ndarray:
     """
@@ -70,8 +80,254 @@ def _preprocess_image(img: np.ndarray, method: int) -> np.ndarray:
         return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
 
+class RoiChangeGate:
+    """
+    Пропуск OCR для неизменившегося ROI. Табло статично большую часть матча, поэтому
+    предобработанный ROI сравнивается (миниатюра GATE_SIZE) с ROI последнего вызова OCR:
+    если средняя разница меньше threshold и нигде не превышает local_threshold (детектор
+    "появилась графика" в части ROI), возвращается прошлый результат OCR вместо нового вызова.
+    Сравнение идёт с последним распознанным ROI, а не с предыдущим кадром, чтобы медленный дрейф
+    не накапливался. threshold <= 0 отключает гейт.
+
+    Опорный ROI сбрасывается (reset) в начале каждого диапазона и при каждом событии OsgStage: кадры окна
+    дебаунса гейт не видит, и первый кадр после окна распознаётся заново, а не сравнивается с кадром до него.
+    """
+    def __init__(self, threshold: float = DEFAULT_GATE_THRESHOLD, local_threshold: float = DEFAULT_GATE_LOCAL_THRESHOLD):
+        self.threshold = threshold
+        self.local_threshold = local_threshold
+        self.frames_seen = 0    # Кадров, дошедших до OCR
+        self.ocr_calls = 0      # Кадров, прошедших гейт (распознаны OCR или взяты из кэша OCR)
+        self.ocr_avoided = 0    # Кадров, для которых использован прошлый результат
+        self._last_thumb: Optional[np.ndarray] = None
+        self._last_result: Optional[Tuple[str, float]] = None
+        self._pending_thumb: Optional[np.ndarray] = None
+
+    def recall(self, processed_img: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Прошлый результат OCR (текст, уверенность), если ROI не изменился; None — нужен OCR."""
+        self.frames_seen += 1
+        thumb = cv2.resize(processed_img, GATE_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+        self._pending_thumb = thumb
+        if self.threshold <= 0 or self._last_result is None:
+            return None
+        diff = np.abs(thumb - self._last_thumb)
+        if diff.mean() >= self.threshold or diff.max() >= self.local_threshold:
+            return None
+        self.ocr_avoided += 1
+        return self._last_result
+
+    def reset(self) -> None:
+        """Забыть опорный ROI (счётчики сохраняются): следующий кадр пойдёт в OCR."""
+        self._last_thumb = None
+        self._last_result = None
+        self._pending_thumb = None
+
+    def remember(self, result: Tuple[str, float]) -> None:
+        """Запоминает результат OCR для ROI, переданного в последний recall()."""
+        self.ocr_calls += 1
+        self._last_thumb = self._pending_thumb
+        self._last_result = result
+
+    def summary(self) -> str:
+        return f"кадров для OCR: {self.frames_seen}, прошло гейт: {self.ocr_calls}, пропущено гейтом: {self.ocr_avoided}"
+
+
+class OcrEngine:
+    """
+    OCR предобработанного ROI: tesserocr (если установлен, быстрее) или pytesseract.
+    Перед вызовом Tesseract проверяются гейт изменений ROI (RoiChangeGate) и постоянный кэш OCR.
+    """
+    def __init__(self, gate_threshold: float = DEFAULT_GATE_THRESHOLD, ocr_cache: Optional[OcrMemoCache] = None,
+                 log_prefix: str = "[OSG]", verbose: bool = True):
+        self.gate = RoiChangeGate(gate_threshold)
+        self.ocr_cache = ocr_cache
+        self.log_prefix = log_prefix
+        self.tesserocr_api = None
+        try:
+            from tesserocr import PyTessBaseAPI
+            self.tesserocr_api = PyTessBaseAPI(lang='rus', psm=6, oem=3)
+            if verbose:
+                print(f"{log_prefix} Используется tesserocr для ускорения OCR.")
+        except Exception as e:
+            if verbose:
+                print(f"{log_prefix} tesserocr недоступен ({e}), используется pytesseract (медленнее).")
+        self.engine_name = "tesserocr" if self.tesserocr_api is not None else "pytesseract"
+
+    def recognize(self, processed_img: np.ndarray) -> Tuple[str, float]:
+        """(текст, средняя уверенность по словам). Исключения Tesseract пробрасываются."""
+        cached = self.gate.recall(processed_img)
+        if cached is not None:
+            return cached
+        cache_key = None
+        if self.ocr_cache is not None:
+            cache_key = OcrMemoCache.make_key(self.engine_name, processed_img)
+            cached = self.ocr_cache.get(cache_key)
+            if cached is not None:
+                self.gate.remember(cached)
+                return cached
+
+        pil_img_roi = Image.fromarray(processed_img)
+        if self.tesserocr_api is not None:
+            self.tesserocr_api.SetImage(pil_img_roi)
+            text = self.tesserocr_api.GetUTF8Text().strip()
+            confidences = self.tesserocr_api.AllWordConfidences()
+        else:
+            config = '--psm 6 --oem 3 -l rus'
+            data = pytesseract.image_to_data(pil_img_roi, output_type=pytesseract.Output.DICT, config=config)
+            words = [word.strip() for word in data['text'] if word.strip()]
+            text = ' '.join(words)
+            confidences = [conf for conf, word in zip(data['conf'], data['text']) if word.strip()]
+        avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
+
+        self.gate.remember((text, avg_conf))
+        if cache_key is not None:
+            self.ocr_cache.put(cache_key, (text, avg_conf))
+        return text, avg_conf
+
+    def counters(self) -> Tuple[int, int, int, int, int]:
+        """(кадров для OCR, прошло гейт, пропущено гейтом, попаданий кэша, промахов кэша)."""
+        gate, cache = self.gate, self.ocr_cache
+        return (gate.frames_seen, gate.ocr_calls, gate.ocr_avoided,
+                cache.hits if cache else 0, cache.misses if cache else 0)
+
+    def add_counters(self, counts: Tuple[int, int, int, int, int]) -> None:
+        """Добавляет счётчики другого экземпляра (из рабочего процесса)."""
+        self.gate.frames_seen += counts[0]
+        self.gate.ocr_calls += counts[1]
+        self.gate.ocr_avoided += counts[2]
+        if self.ocr_cache is not None:
+            self.ocr_cache.hits += counts[3]
+            self.ocr_cache.misses += counts[4]
+
+    def report(self) -> None:
+        """Печатает счётчики гейта и кэша OCR и сохраняет кэш на диск."""
+        print(f"{self.log_prefix} OCR: {self.gate.summary()}")
+        if self.ocr_cache is not None:
+            print(f"{self.log_prefix} {self.ocr_cache.summary()}")
+            self.ocr_cache.save()
+
+    def close(self) -> None:
+        if self.tesserocr_api is not None:
+            self.tesserocr_api.End()
+            self.tesserocr_api = None
+
+
+class OsgStage(DetectorStage):
+    """
+    Этап конвейера: OCR графики в ROI и поиск ключевых слов event_type_map.
+    После события OCR не вызывается debounce_seconds секунд.
+
+    Для шарда параллельного прохода (reset(floor_time)) состояние дебаунса на его начале неизвестно:
+    события предыдущих шардов могли подавить кандидатов в первые debounce секунд. Поэтому шард сначала
+    записывает всех кандидатов без пропуска кадров ("сырой" режим) и переходит к обычному дебаунсу только
+    после кандидата, который гарантированно принят при любом внешнем состоянии: он не ближе debounce
+    к началу шарда и к предыдущему кандидату. Окончательный дебаунс применяется при слиянии шардов.
+    """
+    name = "osg"
+
+    def __init__(self, roi: Dict[str, int], event_type_map: Dict[str, str], engine: OcrEngine,
+                 preprocess_method: int = 0, correlation_threshold: float = 0.95, debounce_seconds: float = 5.0,
+                 stride: int = 1, find_first_only: bool = False,
+                 base_resolution: Tuple[int, int] = (1920, 1080), verbose: bool = True):
+        super().__init__(stride)
+        self.roi = roi
+        self.event_type_map = event_type_map
+        self.engine = engine
+        self.preprocess_method = preprocess_method
+        self.correlation_threshold = correlation_threshold
+        self.debounce_seconds = debounce_seconds
+        self.find_first_only = find_first_only
+        self.base_resolution = base_resolution
+        self.verbose = verbose
+        self.reset()
+
+    def reset(self, floor_time: Optional[float] = None) -> None:
+        """Начать новый проход; floor_time — нижняя граница времени кадров шарда (включает "сырой" режим)."""
+        self.events: List[Dict[str, Any]] = []
+        self.next_allowed_time = -float('inf')
+        self.floor_time = floor_time
+        self.raw = floor_time is not None
+        self._last_candidate: Optional[float] = None
+        self.engine.gate.reset()
+
+    def prepare(self, frame_width: int, frame_height: int, fps: float) -> None:
+        # === Масштабирование ROI под разрешение видео ===
+        base_width, base_height = self.base_resolution
+        scale_x = frame_width / base_width
+        scale_y = frame_height / base_height
+        self.roi_rect = (int(self.roi["x"] * scale_x), int(self.roi["y"] * scale_y),
+                         int(self.roi["width"] * scale_x), int(self.roi["height"] * scale_y))
+        if self.verbose:
+            x, y, w, h = self.roi_rect
+            print(f"{self.engine.log_prefix} Разрешение видео: {frame_width}x{frame_height}, базовое: {base_width}x{base_height}")
+            print(f"{self.engine.log_prefix} ROI после масштабирования: x={x}, y={y}, w={w}, h={h}")
+
+    def begin_range(self, start_frame: int) -> None:
+        # Гейт не сравнивает ROI через границу диапазона или шарда
+        self.engine.gate.reset()
+
+    def due(self, current_time_sec: float) -> bool:
+        return self.raw or current_time_sec >= self.next_allowed_time
+
+    def process(self, image: np.ndarray, frame_index: int, current_time_sec: float) -> bool:
+        processed_img = _preprocess_image(image, self.preprocess_method)
+        try:
+            text, avg_conf = self.engine.recognize(processed_img)
+        except Exception as e:
+            print(f"{self.engine.log_prefix} Ошибка OCR на кадре {frame_index}: {e}")
+            return False
+        if not text:
+            return False
+
+        found_keyword = None
+        for kw in self.event_type_map:
+            if kw.upper() in text.upper():
+                found_keyword = kw
+                break
+        if found_keyword is None or avg_conf < self.correlation_threshold:
+            return False
+
+        self._add_event({
+            "global_time_sec": current_time_sec,
+            "detected_text": text,
+            "event_type": self.event_type_map[found_keyword],
+            "confidence": avg_conf
+        })
+        return self.find_first_only
+
+    def _add_event(self, event: Dict[str, Any]) -> None:
+        t = event["global_time_sec"]
+        self.events.append(event)
+        if self.raw:
+            sure = (t - self.floor_time >= self.debounce_seconds and
+                    (self._last_candidate is None or t - self._last_candidate >= self.debounce_seconds))
+            self._last_candidate = t
+            if not sure:
+                return
+            self.raw = False
+        self.next_allowed_time = t + self.debounce_seconds
+        # Окно дебаунса: гейт "заморожен" до его конца и начинает заново с первого кадра после окна
+        self.engine.gate.reset()
+
+    def results(self) -> List[Dict[str, Any]]:
+        return self.events
+
+    def close(self) -> None:
+        self.engine.close()
+
+
+def debounce_events(events: List[Dict[str, Any]], debounce_seconds: float) -> List[Dict[str, Any]]:
+    """Дебаунс событий OSD (в порядке времени) — как при одном проходе."""
+    results = []
+    next_allowed = -float('inf')
+    for event in events:
+        if event["global_time_sec"] >= next_allowed:
+            results.append(event)
+            next_allowed = event["global_time_sec"] + debounce_seconds
+    return results
+
+
 def detect_osg_events(
-    video_path: str,
+    video_path: VideoSource,
     roi: Dict[str, int],  # {"x": 151, "y": 92, "width": 91, "height": 34}
     event_type_map: Dict[str, str],  # {"ГОЛ": "Goal", "2 МИН": "Penalty", ...}
     search_ranges: Optional[List[Tuple[float, float]]] = None,
@@ -81,13 +337,17 @@ def detect_osg_events(
     skip_every_n: int = 1,  # Пропускать N-1 кадров между обрабатываемыми (1 = обрабатывать все)
     find_first_only: bool = False,  # <-- Новый параметр: искать только первое вхождение
     progress_callback: Optional[Callable[[int, int], None]] = None,  # Для отображения прогресса
-    base_resolution: Tuple[int, int] = (1920, 1080)  # Базовое разрешение для которого задан ROI (FHD)
+    base_resolution: Tuple[int, int] = (1920, 1080),  # Базовое разрешение для которого задан ROI (FHD)
+    gate_threshold: float = DEFAULT_GATE_THRESHOLD,  # Порог гейта изменений ROI (0 = OCR на каждом кадре)
+    ocr_cache: Optional[OcrMemoCache] = None,  # Кэш OCR по хешу ROI (None — общий кэш процесса)
+    use_ocr_cache: bool = True,
+    decode_backend: str = DECODE_BACKEND_OPENCV  # "ffmpeg_roi" — декодировать только ROI через ffmpeg
 ) -> List[Dict[str, Any]]:
     """
     Выполняет OCR на заданной области кадра в видео и ищет ключевые слова из event_type_map.
 
     Args:
-        video_path: Путь к видеофайлу.
+        video_path: Путь к видеофайлу или список сегментов (VideoSegment), если матч записан несколькими файлами.
         roi: Словарь с координатами ROI: {"x": ..., "y": ..., "width": ..., "height": ...}.
         event_type_map: Словарь {"ключевое_слово": "event_type"}.
         search_ranges: Список (start_sec, end_sec). Если None — искать по всему видео.
@@ -98,6 +358,12 @@ def detect_osg_events(
         skip_every_n: Пропускать N-1 кадров между обрабатываемыми (1 = обрабатывать все).
         find_first_only: Если True, останавливается после первого найденного события.
         progress_callback: Функция callback(current, total) для отслеживания прогресса.
+        gate_threshold: Порог RoiChangeGate: OCR вызывается только если ROI изменился
+                        с последнего распознавания (0 — вызывать OCR на каждом кадре).
+        ocr_cache: Постоянный кэш OCR по перцептивному хешу ROI (utils.ocr_cache). По умолчанию —
+                   общий кэш процесса, сохраняется на диск в конце поиска.
+        use_ocr_cache: False — не использовать кэш OCR.
+        decode_backend: "opencv" (полные кадры) или "ffmpeg_roi" (ffmpeg вырезает ROI, в Python приходит только он).
 
     Returns:
         List[Dict[str, Any]]: [
@@ -112,169 +378,18 @@ def detect_osg_events(
     """
     if skip_every_n < 1:
         skip_every_n = 1
-
-    # === Открываем видео ===
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise ValueError(f"Не удалось открыть видео: {video_path}")
-
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    
-    if fps <= 0:
-        fps = 25.0  # fallback
-
-    # === Масштабирование ROI под разрешение видео ===
-    base_width, base_height = base_resolution
-    scale_x = frame_width / base_width
-    scale_y = frame_height / base_height
-    
-    x = int(roi["x"] * scale_x)
-    y = int(roi["y"] * scale_y)
-    w = int(roi["width"] * scale_x)
-    h = int(roi["height"] * scale_y)
-    
-    print(f"[OSG] Разрешение видео: {frame_width}x{frame_height}, базовое: {base_width}x{base_height}")
-    print(f"[OSG] Масштаб: x={scale_x:.3f}, y={scale_y:.3f}")
-    print(f"[OSG] ROI после масштабирования: x={x}, y={y}, w={w}, h={h}")
-
-    # === Пытаемся инициализировать tesserocr (ускоренный OCR) ===
-    tesserocr_api = None
-    use_tesserocr = False
+    if not use_ocr_cache:
+        ocr_cache = None
+    elif ocr_cache is None:
+        ocr_cache = get_shared_ocr_cache()
+
+    engine = OcrEngine(gate_threshold, ocr_cache, log_prefix="[OSG]")
+    stage = OsgStage(roi, event_type_map, engine, preprocess_method, correlation_threshold, debounce_seconds,
+                     skip_every_n, find_first_only, base_resolution)
     try:
-        from tesserocr import PyTessBaseAPI
-        tesserocr_api = PyTessBaseAPI(lang='rus', psm=6, oem=3)
-        use_tesserocr = True
-        print("[OSG] Используется tesserocr для ускорения OCR.")
-    except Exception as e:
-        print(f"[OSG] tesserocr недоступен ({e}), используется pytesseract (медленнее).")
-
-    # === Определяем диапазоны поиска в кадрах ===
-    if search_ranges is None:
-        frame_ranges = [(0, total_frames)]
-    else:
-        frame_ranges = []
-        for start_sec, end_sec in search_ranges:
-            start_frame = max(0, int(start_sec * fps))
-            end_frame = min(total_frames, int(end_sec * fps))
-            if start_frame < end_frame:
-                frame_ranges.append((start_frame, end_frame))
-
-    # === Подсчёт общего числа кадров для прогресса ===
-    total_to_process = 0
-    for start_f, end_f in frame_ranges:
-        total_to_process += (end_f - start_f + skip_every_n - 1) // skip_every_n
-
-    # === Переменные для дебаунсинга и результатов ===
-    next_allowed_time = {}  # {event_type: float (время в секундах)}
-    results = []
-    processed_count = 0
-
-    # === Цикл по диапазонам ===
-    for start_frame, end_frame in frame_ranges:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-        frame_index = start_frame
-
-        while frame_index < end_frame:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Пропускаем кадры, если skip_every_n > 1
-            if (frame_index - start_frame) % skip_every_n != 0:
-                frame_index += 1
-                continue  # Не увеличиваем processed_count, т.к. кадр не обрабатывается
-
-            current_time_sec = frame_index / fps
-
-            # === Оптимизация: пропуск кадров по дебаунсу ===
-            skip_ocr = False
-            for event_type, allowed_time in next_allowed_time.items():
-                if current_time_sec < allowed_time:
-                    # Пропускаем OCR для этого типа, но всё равно инкрементим счётчик
-                    skip_ocr = True
-                    break
-
-            # === Увеличиваем processed_count, потому что кадр "обрабатывается" (даже если OCR пропущен) ===
-            processed_count += 1
-            if progress_callback:
-                progress_callback(processed_count, total_to_process)
-
-            if skip_ocr:
-                frame_index += 1
-                continue
-
-            # === Вырезаем ROI ===
-            roi_img = frame[y:y+h, x:x+w]
-            if roi_img.size == 0:
-                frame_index += 1
-                continue
-
-            # === Применяем предобработку ===
-            processed_img = _preprocess_image(roi_img, preprocess_method)
-
-            # === OCR ===
-            pil_img_roi = Image.fromarray(processed_img)
-            try:
-                if use_tesserocr and tesserocr_api is not None:
-                    tesserocr_api.SetImage(pil_img_roi)
-                    text = tesserocr_api.GetUTF8Text().strip()
-                    confidences = tesserocr_api.AllWordConfidences()
-                    avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
-                else:
-                    config = '--psm 6 --oem 3 -l rus'
-                    data = pytesseract.image_to_data(pil_img_roi, output_type=pytesseract.Output.DICT, config=config)
-                    words = [word.strip() for word in data['text'] if word.strip()]
-                    text = ' '.join(words)
-                    confidences = [conf for conf, word in zip(data['conf'], data['text']) if word.strip()]
-                    avg_conf = sum(confidences) / len(confidences) if confidences else 0.0
-            except Exception as e:
-                print(f"Ошибка при выполнении OCR на кадре {frame_index}: {e}")
-                frame_index += 1
-                continue
-
-            # === Проверяем наличие ключевых слов ===
-            if text:
-                found_keyword = None
-                for kw in event_type_map:
-                    if kw.upper() in text.upper():
-                        found_keyword = kw
-                        break
-
-                if found_keyword is not None:
-                    event_type = event_type_map[found_keyword]
-
-                    # === Проверка порога уверенности ===
-                    if avg_conf < correlation_threshold:
-                        frame_index += 1
-                        continue
-
-                    # === Фиксируем событие ===
-                    event = {
-                        "global_time_sec": current_time_sec,
-                        "detected_text": text,
-                        "event_type": event_type,
-                        "confidence": avg_conf
-                    }
-                    results.append(event)
-
-                    # === Устанавливаем время, после которого можно снова искать этот тип ===
-                    next_allowed_time[event_type] = current_time_sec + debounce_seconds
-
-                    # === Проверка find_first_only ===
-                    if find_first_only:
-                        cap.release()
-                        if tesserocr_api is not None:
-                            tesserocr_api.End()
-                        if progress_callback:
-                            progress_callback(processed_count, total_to_process)  # Завершаем прогресс
-                        return results
-
-            frame_index += 1
-
-    cap.release()
-    if tesserocr_api is not None:
-        tesserocr_api.End()
-    return results
\ No newline at end of file
+        run_pipeline(video_path, [stage], search_ranges, progress_callback=progress_callback, log_prefix="[OSG]",
+                     decode_backend=decode_backend)
+    finally:
+        stage.close()
+    engine.report()
+    return stage.results()
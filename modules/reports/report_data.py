@@ -3,7 +3,7 @@
 """
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
-from utils.helpers import convert_global_to_official_time # Импортируем функцию для перевода времени
+from utils.helpers import get_official_time_map # Карта официального времени (строится один раз, поиск bisect)
 
 # Константа для имени нашей команды
 OUR_TEAM_NAME = "Созвездие 2014"
@@ -398,6 +398,7 @@ class ReportData:
 
         # 4. Извлечение calculated_ranges для "Сегментов" (периодов)
         calculated_ranges = getattr(match_obj, 'calculated_ranges', [])
+        time_map = get_official_time_map(calculated_ranges)
         segment_ranges_raw = [cr for cr in calculated_ranges if getattr(cr, 'label_type', '') == 'Сегмент']
         if not segment_ranges_raw:
             print("Предупреждение: Не найдены calculated_ranges с label_type 'Сегмент'.")
@@ -413,8 +414,8 @@ class ReportData:
             for cr in segment_ranges_raw:
                 seg_name = cr.name # Используем имя сегмента
                 # Преобразуем start_time и end_time сегмента в официальное время
-                official_start = convert_global_to_official_time(cr.start_time, calculated_ranges)
-                official_end = convert_global_to_official_time(cr.end_time, calculated_ranges)
+                official_start = time_map.to_official(cr.start_time)
+                official_end = time_map.to_official(cr.end_time)
                 if official_start is not None and official_end is not None:
                     self.segments_info.append(SegmentInfo(seg_name, official_start, official_end))
                 else:
@@ -438,7 +439,7 @@ class ReportData:
                 # Преобразуем global_time в official_time
                 # Используем готовую функцию из utils.helpers
                 try:
-                    official_time = convert_global_to_official_time(global_time, calculated_ranges)
+                    official_time = time_map.to_official(global_time)
                 except Exception as e:
                     print(f"Предупреждение: Не удалось преобразовать global_time {global_time} гола в official_time: {e}")
                     continue # Пропускаем событие, если не удалось преобразовать
@@ -446,7 +447,7 @@ class ReportData:
                 if official_time is not None: # Убедимся, что перевод прошёл успешно
                     goals_processed.append(GoalInfo(official_time, context))
                 else:
-                    # convert_global_to_official_time мог вернуть None
+                    # to_official мог вернуть None
                     print(f"Предупреждение: global_time {global_time} гола не попало в ЧИИ, событие пропущено.")
 
         # Сортировка голов по времени
@@ -474,8 +475,8 @@ class ReportData:
 
                     # Преобразуем start_time и end_time интервала game_mode (удаления) в официальное время
                     try:
-                        official_start = convert_global_to_official_time(cr.start_time, calculated_ranges)
-                        official_end = convert_global_to_official_time(cr.end_time, calculated_ranges)
+                        official_start = time_map.to_official(cr.start_time)
+                        official_end = time_map.to_official(cr.end_time)
                     except Exception as e:
                         print(f"Предупреждение: Не удалось преобразовать время удаления игрока {player_name} ({player_id_fhm}) в official_time: {e}")
                         continue
@@ -531,8 +532,8 @@ class ReportData:
         faceoffs_processed = []
         for i, cr in enumerate(chii_ranges):
             try:
-                official_start = convert_global_to_official_time(cr.start_time, calculated_ranges)
-                official_end = convert_global_to_official_time(cr.end_time, calculated_ranges)
+                official_start = time_map.to_official(cr.start_time)
+                official_end = time_map.to_official(cr.end_time)
             except Exception as e:
                 print(f"Предупреждение: Не удалось преобразовать время ЧИИ '{cr.name}': {e}")
                 continue
@@ -1349,7 +1349,9 @@ class PlayerShiftMapReport:
         :param key: "powerplay" для большинства, "penalty_kill" для меньшинства
         :return: время в секундах
         """
-        from utils.helpers import convert_global_to_official_time
+        from utils.helpers import get_official_time_map
+        # Карта официального времени строится один раз на вызов, поиск — bisect
+        time_map = get_official_time_map(report_data.original_project.match.calculated_ranges)
         
         # Получаем смены игрока
         shifts = report_data.shifts_by_player_id.get(player.player_id, [])
@@ -1417,14 +1419,8 @@ class PlayerShiftMapReport:
                 continue
             
             try:
-                official_start = convert_global_to_official_time(
-                    gm.start_time,
-                    report_data.original_project.match.calculated_ranges
-                )
-                official_end = convert_global_to_official_time(
-                    gm.end_time,
-                    report_data.original_project.match.calculated_ranges
-                )
+                official_start = time_map.to_official(gm.start_time)
+                official_end = time_map.to_official(gm.end_time)
             except:
                 continue
             
@@ -1520,7 +1516,9 @@ class PlayerShiftMapReport:
         -1 за каждый гол соперника, когда игрок был на льду
         ВАЖНО: +/- учитывается только при игре в равных составах (5 на 5, 4 на 4, 3 на 3)
         """
-        from utils.helpers import convert_global_to_official_time
+        from utils.helpers import get_official_time_map
+        # Карта официального времени строится один раз на вызов, поиск — bisect
+        time_map = get_official_time_map(report_data.original_project.match.calculated_ranges)
         
         plus_minus = 0
         
@@ -1576,14 +1574,8 @@ class PlayerShiftMapReport:
             
             for gm in game_modes:
                 try:
-                    official_start = convert_global_to_official_time(
-                        gm.start_time,
-                        report_data.original_project.match.calculated_ranges
-                    )
-                    official_end = convert_global_to_official_time(
-                        gm.end_time,
-                        report_data.original_project.match.calculated_ranges
-                    )
+                    official_start = time_map.to_official(gm.start_time)
+                    official_end = time_map.to_official(gm.end_time)
                 except:
                     continue
                 
@@ -2729,7 +2721,9 @@ class PlayerShiftMapReport:
         Проверяет, были ли равные составы в указанный момент времени.
         Равные составы: 5 на 5, 4 на 4, 3 на 3.
         """
-        from utils.helpers import convert_global_to_official_time
+        from utils.helpers import get_official_time_map
+        # Карта официального времени строится один раз на вызов, поиск — bisect
+        time_map = get_official_time_map(report_data.original_project.match.calculated_ranges)
         
         raw_modes = getattr(report_data.original_project.match, 'calculated_ranges', [])
         game_modes = [cr for cr in raw_modes if getattr(cr, 'label_type', '') == 'game_mode']
@@ -2750,14 +2744,8 @@ class PlayerShiftMapReport:
         
         for gm in game_modes:
             try:
-                official_start = convert_global_to_official_time(
-                    gm.start_time,
-                    report_data.original_project.match.calculated_ranges
-                )
-                official_end = convert_global_to_official_time(
-                    gm.end_time,
-                    report_data.original_project.match.calculated_ranges
-                )
+                official_start = time_map.to_official(gm.start_time)
+                official_end = time_map.to_official(gm.end_time)
             except Exception:
                 continue
             
@@ -2909,12 +2897,14 @@ class PlayerShiftMapReport:
         match_obj = report_data.original_project.match
         calculated_ranges = getattr(match_obj, 'calculated_ranges', [])
 
+        from utils.helpers import get_official_time_map
+        time_map = get_official_time_map(calculated_ranges)  # Карта строится один раз, поиск — bisect
+
         for cr in calculated_ranges:
             if getattr(cr, 'label_type', '') == 'Счёт':
-                from utils.helpers import convert_global_to_official_time
                 try:
-                    official_start = convert_global_to_official_time(cr.start_time, calculated_ranges)
-                    official_end = convert_global_to_official_time(cr.end_time, calculated_ranges)
+                    official_start = time_map.to_official(cr.start_time)
+                    official_end = time_map.to_official(cr.end_time)
 
                     if official_start is not None and official_end is not None:
                         score_ranges.append({
@@ -3358,18 +3348,14 @@ class PlayerShiftMapReport:
         
         game_modes.sort(key=lambda x: x.start_time)
         
-        from utils.helpers import convert_global_to_official_time
+        from utils.helpers import get_official_time_map
+        # Карта официального времени строится один раз на вызов, поиск — bisect
+        time_map = get_official_time_map(report_data.original_project.match.calculated_ranges)
         
         for gm in game_modes:
             try:
-                official_start = convert_global_to_official_time(
-                    gm.start_time, 
-                    report_data.original_project.match.calculated_ranges
-                )
-                official_end = convert_global_to_official_time(
-                    gm.end_time,
-                    report_data.original_project.match.calculated_ranges
-                )
+                official_start = time_map.to_official(gm.start_time)
+                official_end = time_map.to_official(gm.end_time)
             except:
                 continue
             
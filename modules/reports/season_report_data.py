@@ -4,12 +4,13 @@
 import os
 import json
 import glob
+import math
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass, field
 
 from model.project import Project
 from modules.reports.report_data import ReportData, SORT_BY_EXIT_TIME, OUR_TEAM_NAME
-from utils.helpers import load_project_from_file, convert_global_to_official_time
+from utils.helpers import load_project_from_file, convert_global_to_official_times
 
 
 # =============================================================================
@@ -56,6 +57,15 @@ def is_match_completed(project: Project) -> bool:
 # РАСЧЁТНЫЕ ФУНКЦИИ (по одному матчу)
 # =============================================================================
 
+def _game_modes_official(game_modes: List, calculated_ranges: List) -> Tuple[List[float], List[float]]:
+    """Официальное время начала и конца каждого game_mode (NaN — граница вне ЧИИ)."""
+    if not game_modes:
+        return [], []
+    starts = convert_global_to_official_times([gm.start_time for gm in game_modes], calculated_ranges)
+    ends = convert_global_to_official_times([gm.end_time for gm in game_modes], calculated_ranges)
+    return starts.tolist(), ends.tolist()
+
+
 def calculate_player_goals(report_data: ReportData, player_id: str) -> int:
     """Голы, забитые игроком."""
     return sum(
@@ -94,23 +104,17 @@ def calculate_player_plus_minus(report_data: ReportData, player_id: str) -> int:
         except (ValueError, IndexError):
             return False
 
+    # Границы всех game_mode в официальном времени — одним пакетом (NaN — вне ЧИИ)
+    gm_starts, gm_ends = _game_modes_official(game_modes, raw_modes)
+
     for goal in report_data.goals:
         goal_time = goal.official_time
         # Буллит не влияет на +/- ни у кого
         if goal.context.get("is_penalty_shot"):
             continue
         even = False
-        for gm in game_modes:
-            try:
-                o_start = convert_global_to_official_time(
-                    gm.start_time, report_data.original_project.match.calculated_ranges
-                )
-                o_end = convert_global_to_official_time(
-                    gm.end_time, report_data.original_project.match.calculated_ranges
-                )
-            except Exception:
-                continue
-            if o_start is None or o_end is None:
+        for gm, o_start, o_end in zip(game_modes, gm_starts, gm_ends):
+            if math.isnan(o_start) or math.isnan(o_end):
                 continue
             if o_start < goal_time <= o_end:
                 even = _is_even(getattr(gm, 'name', '5 на 5'))
@@ -179,22 +183,14 @@ def calculate_special_team_time(report_data: ReportData, player_id: str, key: st
         return our_cnt < their_cnt
 
     intervals = []
-    for gm in game_modes:
+    gm_starts, gm_ends = _game_modes_official(game_modes, raw_modes)
+    for gm, o_s, o_e in zip(game_modes, gm_starts, gm_ends):
         name = getattr(gm, 'name', '5 на 5')
         if not _is_special(name, key):
             continue
-        try:
-            o_s = convert_global_to_official_time(
-                gm.start_time, report_data.original_project.match.calculated_ranges
-            )
-            o_e = convert_global_to_official_time(
-                gm.end_time, report_data.original_project.match.calculated_ranges
-            )
-        except Exception:
-            continue
-        if o_s is None or o_e is None:
+        if math.isnan(o_s) or math.isnan(o_e):
             continue
-        intervals.append((o_s, o_e))
+        intervals.append((float(o_s), float(o_e)))
 
     total = 0
     for shift in shifts:
@@ -1,12 +1,150 @@
 # modules/smart.py
 
 # ... (остальные импорты) ...
+import math
 import uuid
+from dataclasses import dataclass, field
 from typing import List, Dict, Tuple, Set, Optional # <-- Добавлен Optional # <-- Убедитесь, что Dict, List, Set, Tuple импортированы
 from model.project import GenericLabel, CalculatedRange, PlayerShift, PlayerShiftInfo # <-- Убедитесь, что PlayerShift, PlayerShiftInfo импортированы
-from utils.helpers import create_official_time_map, map_global_time_to_official # <-- Импортируем новые функции
+from utils.helpers import OfficialTimeMap, get_official_time_map # Карта официального времени (строится один раз, поиск bisect)
 # ... (остальные импорты) ...
 
+# Пространство имён UUID для id рассчитанных диапазонов (uuid5 — детерминированный)
+RANGE_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_OID, "CalculatedRange")
+
+
+def calculated_range_id(label_type: str, source_label_ids: List[str], start_time: float, end_time: float) -> str:
+    """
+    Стабильный id CalculatedRange: uuid5 от типа, id исходных меток и границ диапазона.
+    Повторный запуск SMART на тех же метках даёт те же id, поэтому кеши и дерево/таймлайн
+    могут сравнивать результаты по id (diff_calculated_ranges).
+    """
+    key = f"{label_type}|{','.join(source_label_ids)}|{float(start_time)!r}|{float(end_time)!r}"
+    return str(uuid.uuid5(RANGE_ID_NAMESPACE, key))
+
+
+def _dedupe_range_ids(calculated_ranges: List[CalculatedRange]) -> None:
+    """Совпавшие id (одинаковые диапазоны одного типа) получают суффикс по порядку в списке."""
+    seen: Set[str] = set()
+    for cr in calculated_ranges:
+        range_id = cr.id
+        n = 1
+        while range_id in seen:
+            n += 1
+            range_id = str(uuid.uuid5(RANGE_ID_NAMESPACE, f"{cr.id}#{n}"))
+        cr.id = range_id
+        seen.add(range_id)
+
+
+@dataclass
+class CalculatedRangesDiff:
+    """Разница двух результатов SMART по id диапазонов."""
+    added: List[CalculatedRange] = field(default_factory=list)
+    removed: List[CalculatedRange] = field(default_factory=list)
+    changed: List[Tuple[CalculatedRange, CalculatedRange]] = field(default_factory=list) # (было, стало)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+
+def diff_calculated_ranges(old_ranges: List[CalculatedRange], new_ranges: List[CalculatedRange]) -> CalculatedRangesDiff:
+    """
+    Добавленные, удалённые и изменённые (тот же id, другое имя/контекст/границы) диапазоны
+    между двумя результатами SMART. Порядок — как в new_ranges (удалённые — как в old_ranges).
+    """
+    old_by_id = {cr.id: cr for cr in old_ranges}
+    new_ids = {cr.id for cr in new_ranges}
+    diff = CalculatedRangesDiff()
+    for cr in new_ranges:
+        old = old_by_id.get(cr.id)
+        if old is None:
+            diff.added.append(cr)
+        elif old is not cr and old.to_dict() != cr.to_dict():
+            diff.changed.append((old, cr))
+    diff.removed = [cr for cr in old_ranges if cr.id not in new_ids]
+    return diff
+
+
+# Типы меток, которые учитывает SMART; метки остальных типов на calculated_ranges и смены не влияют
+SMART_LABEL_TYPES = {"Удаление", "Сегмент", "Пауза", "Гол", "Смена"}
+# Метки, влияющие только на свой "Сегмент": их можно пересчитать инкрементально (process_incremental)
+INCREMENTAL_LABEL_TYPES = {"Пауза", "Смена"}
+
+
+def _segment_index(segment_ranges: List[CalculatedRange], global_time: float) -> int:
+    """Индекс первого Сегмента, содержащего время (границы включительно), или -1."""
+    for idx, seg_range in enumerate(segment_ranges):
+        if seg_range.start_time <= global_time <= seg_range.end_time:
+            return idx
+    return -1
+
+
+def _pause_intervals_by_segment(
+    pause_labels: List[GenericLabel],
+    segment_ranges: List[CalculatedRange]
+) -> Dict[str, List[Tuple[float, float]]]:
+    """
+    Пары меток "Пауза" (отсортированных по времени: чётный индекс - начало, нечётный - конец),
+    целиком лежащие внутри Сегмента. Возвращает id сегмента -> [(начало, конец)] в порядке времени.
+    """
+    pause_ranges_by_segment: Dict[str, List[Tuple[float, float]]] = {}
+    if not segment_ranges:
+        return pause_ranges_by_segment
+    for i in range(0, len(pause_labels) - 1, 2): # Начало (i), Конец (i+1)
+        start_time = pause_labels[i].global_time
+        end_time = pause_labels[i + 1].global_time
+        if end_time <= start_time:
+            continue
+        for seg_range in segment_ranges:
+            if seg_range.start_time <= start_time <= seg_range.end_time and \
+               seg_range.start_time <= end_time <= seg_range.end_time:
+                # Пауза полностью внутри сегмента
+                pause_ranges_by_segment.setdefault(seg_range.id, []).append((start_time, end_time))
+                break # Нашли сегмент, выходим из цикла по сегментам для этой паузы
+    return pause_ranges_by_segment
+
+
+def _chi_intervals(seg_start: float, seg_end: float, pauses_in_seg: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Интервалы ЧИИ Сегмента: его диапазон за вычетом пауз."""
+    chi_intervals = []
+    current_start = seg_start
+    for pause_start, pause_end in sorted(pauses_in_seg):
+        if pause_start > current_start:
+            # Есть интервал до паузы - это ЧИИ
+            chi_intervals.append((current_start, pause_start))
+        current_start = max(current_start, pause_end) # Следующий интервал начинается после паузы
+
+    # Проверяем остаток после последней паузы до конца сегмента
+    if current_start < seg_end:
+        chi_intervals.append((current_start, seg_end))
+    return chi_intervals
+
+
+def _chi_ranges_for_segment(seg_range: CalculatedRange, chi_intervals: List[Tuple[float, float]]) -> List[CalculatedRange]:
+    """CalculatedRange "ЧИИ" Сегмента с именами "Период X. ЧИИ №Y"."""
+    chi_ranges = []
+    for i, (chi_start, chi_end) in enumerate(chi_intervals):
+        if chi_end > chi_start: # Убедимся, что интервал не пустой
+            chi_ranges.append(CalculatedRange(
+                id=calculated_range_id("ЧИИ", seg_range.source_label_ids, chi_start, chi_end),
+                name=f"{seg_range.name}. ЧИИ №{i + 1}",
+                label_type="ЧИИ",
+                start_time=chi_start,
+                end_time=chi_end,
+                source_label_ids=seg_range.source_label_ids # Пока что связываем с метками сегмента
+            ))
+    return chi_ranges
+
+
+def _period_official_starts(time_map: OfficialTimeMap, excluded_names: Set[str]) -> Dict[str, float]:
+    """Официальное время начала каждого периода карты (кроме excluded_names)."""
+    starts: Dict[str, float] = {}
+    for name, official_start in zip(time_map.period_names, time_map.official_starts):
+        if name not in excluded_names:
+            starts.setdefault(name, official_start)
+    return starts
+
+
 class SMARTProcessor:
     """
     Модуль для анализа накопленных generic_labels и формирования calculated_ranges.
@@ -27,7 +165,7 @@ class SMARTProcessor:
         calculated_ranges = []
 
         # 0. Всегда создаём "Всё видео" первым
-        all_video_range_id = str(uuid.uuid4())
+        all_video_range_id = calculated_range_id("Всё видео", [], 0.0, total_duration_sec)
         all_video_range = CalculatedRange(
             id=all_video_range_id,
             name="Всё видео",
@@ -40,27 +178,28 @@ class SMARTProcessor:
         # ---
 
         # --- Новое: Обработка парных меток "Удаление" ---
-        # Словарь: frozenset(context_items) -> список global_time меток
-        penalty_context_to_times = {}
+        # Словарь: frozenset(context_items) -> список меток
+        penalty_context_to_labels = {}
         for label in generic_labels:
             if label.label_type == "Удаление" and label.context:
                 # Используем frozenset(items()) для создания неизменяемого хэшируемого ключа из словаря context
                 context_key = frozenset(label.context.items())
-                if context_key not in penalty_context_to_times:
-                    penalty_context_to_times[context_key] = []
-                penalty_context_to_times[context_key].append(label.global_time)
+                if context_key not in penalty_context_to_labels:
+                    penalty_context_to_labels[context_key] = []
+                penalty_context_to_labels[context_key].append(label)
 
         # Проходим по собранному словарю
-        for context_key, times_list in penalty_context_to_times.items():
-            # Сортируем времена для данной группы меток
-            sorted_times = sorted(times_list)
+        for context_key, labels_list in penalty_context_to_labels.items():
+            # Сортируем метки данной группы по времени
+            sorted_labels = sorted(labels_list, key=lambda x: x.global_time)
             # Обрабатываем пары (чётный индекс - start, нечётный - end)
-            for i in range(0, len(sorted_times) - 1, 2):
-                start_time = sorted_times[i]
-                end_time = sorted_times[i + 1]
+            for i in range(0, len(sorted_labels) - 1, 2):
+                start_time = sorted_labels[i].global_time
+                end_time = sorted_labels[i + 1].global_time
+                pair_label_ids = [sorted_labels[i].id, sorted_labels[i + 1].id]
 
                 # Создаём CalculatedRange для пары
-                penalty_range_id = str(uuid.uuid4())
+                penalty_range_id = calculated_range_id("Удаление", pair_label_ids, start_time, end_time)
                 # Восстанавливаем оригинальный словарь context из frozenset
                 original_context = dict(context_key)
                 penalty_range_name = f"Удаление {original_context.get('player_name', 'Unknown')} ({original_context.get('violation_type', 'Unknown')})"
@@ -70,7 +209,7 @@ class SMARTProcessor:
                     label_type="Удаление",
                     start_time=start_time,
                     end_time=end_time,
-                    source_label_ids=[], # Источник - пара меток, можно не заполнять или заполнять IDs пары
+                    source_label_ids=pair_label_ids, # Источник - пара меток
                     context=original_context # Сохраняем оригинальный context
                 )
                 calculated_ranges.append(penalty_range)
@@ -90,7 +229,7 @@ class SMARTProcessor:
             end_label = segment_labels[i + 1] if i + 1 < len(segment_labels) else None
 
             if end_label and end_label.global_time > start_label.global_time:
-                range_id = str(uuid.uuid4())
+                range_id = calculated_range_id("Сегмент", [start_label.id, end_label.id], start_label.global_time, end_label.global_time)
                 period_num = len(segment_ranges) + 1 # Номер периода после "Всё видео"
                 name = f"Период {period_num}"
                 new_range = CalculatedRange(
@@ -134,32 +273,7 @@ class SMARTProcessor:
         pause_labels = [label for label in generic_labels if label.label_type == "Пауза"]
         pause_labels.sort(key=lambda x: x.global_time) # Сортировка по времени
 
-        pause_ranges_by_segment: Dict[str, List[CalculatedRange]] = {} # Словарь: id сегмента -> [PauseCalculatedRange]
-
-        if segment_ranges:
-            for i in range(0, len(pause_labels) - 1, 2): # Начало (i), Конец (i+1)
-                start_label = pause_labels[i]
-                end_label = pause_labels[i + 1] if i + 1 < len(pause_labels) else None
-
-                if end_label and end_label.global_time > start_label.global_time:
-                    # Проверяем, в каком сегменте находится эта пауза
-                    for seg_range in segment_ranges:
-                        if seg_range.start_time <= start_label.global_time <= seg_range.end_time and \
-                           seg_range.start_time <= end_label.global_time <= seg_range.end_time:
-                            # Пауза полностью внутри сегмента
-                            pause_range_id = str(uuid.uuid4())
-                            pause_range_obj = CalculatedRange(
-                                id=pause_range_id,
-                                name=f"Пауза в {seg_range.name}", # Имя для внутреннего использования
-                                label_type="Пауза",
-                                start_time=start_label.global_time,
-                                end_time=end_label.global_time,
-                                source_label_ids=[start_label.id, end_label.id]
-                            )
-                            if seg_range.id not in pause_ranges_by_segment:
-                                pause_ranges_by_segment[seg_range.id] = []
-                            pause_ranges_by_segment[seg_range.id].append(pause_range_obj)
-                            break # Нашли сегмент, выходим из цикла по сегментам для этой паузы
+        pause_ranges_by_segment = _pause_intervals_by_segment(pause_labels, segment_ranges) # id сегмента -> [(начало, конец)]
 
         # 3. Обработка "ЧИИ" (на основе "Сегментов" и "Пауз"):
         #    - Для каждого CalculatedRange "Сегмент":
@@ -175,40 +289,12 @@ class SMARTProcessor:
             seg_start = seg_range.start_time
             seg_end = seg_range.end_time
 
-            # Получаем паузы для этого сегмента
-            pauses_in_seg = pause_ranges_by_segment.get(seg_range.id, [])
-            pauses_in_seg.sort(key=lambda x: x.start_time) # Сортировка пауз в сегменте по времени
-
             # Найдём интервалы "ЧИИ" внутри сегмента, вычитая паузы
-            chi_intervals = []
-            current_start = seg_start
-            for pause_range in pauses_in_seg:
-                if pause_range.start_time > current_start:
-                    # Есть интервал до паузы - это ЧИИ
-                    chi_intervals.append((current_start, pause_range.start_time))
-                current_start = max(current_start, pause_range.end_time) # Следующий интервал начинается после паузы
-
-            # Проверяем остаток после последней паузы до конца сегмента
-            if current_start < seg_end:
-                chi_intervals.append((current_start, seg_end))
+            chi_intervals = _chi_intervals(seg_start, seg_end, pause_ranges_by_segment.get(seg_range.id, []))
 
             # Создаём CalculatedRange для каждого интервала ЧИИ
-            chi_ranges_for_this_segment = []
-            for i, (chi_start, chi_end) in enumerate(chi_intervals):
-                if chi_end > chi_start: # Убедимся, что интервал не пустой
-                    chi_range_id = str(uuid.uuid4())
-                    chi_num = i + 1
-                    name = f"{seg_range.name}. ЧИИ №{chi_num}"
-                    chi_range = CalculatedRange(
-                        id=chi_range_id,
-                        name=name,
-                        label_type="ЧИИ",
-                        start_time=chi_start,
-                        end_time=chi_end,
-                        source_label_ids=seg_range.source_label_ids # Пока что связываем с метками сегмента
-                    )
-                    calculated_ranges.append(chi_range) # Добавляем в общий список
-                    chi_ranges_for_this_segment.append(chi_range) # Сохраняем для создания суммы ЧИИ
+            chi_ranges_for_this_segment = _chi_ranges_for_segment(seg_range, chi_intervals)
+            calculated_ranges.extend(chi_ranges_for_this_segment) # Добавляем в общий список
 
             chi_ranges_by_segment[seg_range.id] = chi_ranges_for_this_segment
 
@@ -244,7 +330,7 @@ class SMARTProcessor:
             for goal_label in goals_in_segment:
                 # 1. Создаём диапазон с предыдущим счётом от previous_time до времени гола
                 if goal_label.global_time > previous_time:
-                    score_range_id = str(uuid.uuid4())
+                    score_range_id = calculated_range_id("Счёт", [], previous_time, goal_label.global_time)
                     score_name = f"{current_home_score}:{current_away_score}"
                     score_range = CalculatedRange(
                         id=score_range_id,
@@ -269,7 +355,7 @@ class SMARTProcessor:
 
             # 4. Создаём финальный диапазон счёта для оставшегося времени в сегменте (от последнего гола до конца сегмента)
             if seg_end > previous_time:
-                final_score_range_id = str(uuid.uuid4())
+                final_score_range_id = calculated_range_id("Счёт", [], previous_time, seg_end)
                 final_score_name = f"{current_home_score}:{current_away_score}"
                 final_score_range = CalculatedRange(
                     id=final_score_range_id,
@@ -349,7 +435,7 @@ class SMARTProcessor:
                     s_team_players = 5 - sum(1 for p in active_penalties.values() if p["team"] == "s-team")
 
                     game_mode_name = f"{f_team_players} на {s_team_players}"
-                    game_mode_range_id = str(uuid.uuid4())
+                    game_mode_range_id = calculated_range_id("game_mode", [], current_time, event_time)
                     # Создаём CalculatedRange с context
                     new_range = CalculatedRange(
                         id=game_mode_range_id,
@@ -380,6 +466,8 @@ class SMARTProcessor:
         calculated_ranges.extend(game_mode_ranges)
         # === КОНЕЦ НОВОГО БЛОКА ===
 
+        _dedupe_range_ids(calculated_ranges)
+
         # 5. Возврат:
         #    - Вернуть итоговый список всех созданных CalculatedRange ("Всё видео", "Сегменты", "ЧИИ", "ЧИИ_СУММА").
         return calculated_ranges
@@ -681,7 +769,12 @@ class SMARTProcessor:
         """
         
         # 1. Создаём "карту" официального времени и информацию о периодах
-        official_timeline_map, period_info = create_official_time_map(calculated_ranges) # <-- Теперь возвращает два значения
+        official_time_map = get_official_time_map(calculated_ranges)
+        # Все границы смен переводятся одной векторной операцией (NaN — вне ЧИИ)
+        all_shifts = [shift_obj for player_info_obj in player_shifts_data.values() for shift_obj in player_info_obj.shifts]
+        official_starts = official_time_map.to_official_array([shift_obj.start_time for shift_obj in all_shifts])
+        official_ends = official_time_map.to_official_array([shift_obj.end_time for shift_obj in all_shifts])
+        shift_pos = 0
 
         # 2. Результат: словарь player_id_fhm -> PlayerShiftInfo
         player_shifts_ot_result: Dict[str, PlayerShiftInfo] = {}
@@ -698,9 +791,12 @@ class SMARTProcessor:
                 original_start_time = shift_obj.start_time
                 original_end_time = shift_obj.end_time
 
-              # 6. Переводим start_time и end_time в официальное время
-                official_start_time = map_global_time_to_official(original_start_time, official_timeline_map, period_info) # <-- Три аргумента
-                official_end_time = map_global_time_to_official(original_end_time, official_timeline_map, period_info) # <-- Три аргумента
+              # 6. Берём start_time и end_time в официальном времени из пакетного перевода
+                official_start_time = official_starts[shift_pos]
+                official_end_time = official_ends[shift_pos]
+                shift_pos += 1
+                official_start_time = None if math.isnan(official_start_time) else float(official_start_time)
+                official_end_time = None if math.isnan(official_end_time) else float(official_end_time)
 
                 # 7. Проверяем, попали ли времена в ЧИИ
                 if official_start_time is None or official_end_time is None:
@@ -727,6 +823,309 @@ class SMARTProcessor:
 
         return player_shifts_ot_result
     
+    def process_incremental(
+        self,
+        generic_labels: List[GenericLabel],
+        changed_labels: List[GenericLabel],
+        calculated_ranges: List[CalculatedRange],
+        player_shifts: Dict[str, PlayerShiftInfo],
+        player_shifts_official_timer: Dict[str, PlayerShiftInfo],
+        total_duration_sec: float,
+        rosters: Dict[str, List[Dict]] = None
+    ) -> Optional[Tuple[List[CalculatedRange], Dict[str, PlayerShiftInfo], Dict[str, PlayerShiftInfo]]]:
+        """
+        Инкрементальный SMART после добавления, удаления или изменения меток changed_labels
+        (удалённые метки передаются как есть, в generic_labels их уже нет).
+        Пересчитывает только затронутый "Сегмент": его ЧИИ (метки "Пауза") или смены игроков в нём
+        (метки "Смена"), и вклеивает результат в копии calculated_ranges / player_shifts /
+        player_shifts_official_timer. Остальные диапазоны и смены переиспользуются вместе с их id.
+        calculated_ranges, player_shifts и player_shifts_official_timer должны быть результатом SMART
+        для меток до изменения.
+
+        Returns:
+            (calculated_ranges, player_shifts, player_shifts_official_timer) или None, если изменение
+            затрагивает весь матч ("Сегмент", "Гол", "Удаление", другая длительность видео) —
+            тогда нужен полный пересчёт (process и т.д.).
+        """
+        changed_types = {label.label_type for label in changed_labels} & SMART_LABEL_TYPES
+        if not changed_types:
+            # Метки не участвуют в SMART — пересчитывать нечего
+            return calculated_ranges, player_shifts, player_shifts_official_timer
+        if not changed_types <= INCREMENTAL_LABEL_TYPES:
+            return None
+        all_video_range = next((cr for cr in calculated_ranges if cr.label_type == "Всё видео"), None)
+        if all_video_range is None or all_video_range.end_time != total_duration_sec:
+            return None
+
+        segment_ranges = sorted((cr for cr in calculated_ranges if cr.label_type == "Сегмент"), key=lambda x: x.start_time)
+
+        # period_name у новых/изменённых "Пауза" и "Смена" — как в process
+        for label in changed_labels:
+            if label.label_type in INCREMENTAL_LABEL_TYPES:
+                if label.context is None:
+                    label.context = {}
+                label.context.pop("period_name", None)
+                seg_idx = _segment_index(segment_ranges, label.global_time)
+                if seg_idx >= 0:
+                    label.context["period_name"] = segment_ranges[seg_idx].name
+
+        new_ranges = calculated_ranges
+        new_shifts = player_shifts
+        new_shifts_ot = player_shifts_official_timer
+        if "Пауза" in changed_types:
+            spliced = self._splice_chi_ranges(generic_labels, new_ranges, segment_ranges)
+            new_ranges, changed_segments = spliced
+            if changed_segments:
+                player_ids = self._players_for_chi_change(new_shifts, calculated_ranges, new_ranges, changed_segments)
+                new_shifts_ot = self._splice_official_shifts(new_shifts, new_shifts_ot, new_ranges, player_ids)
+        if "Смена" in changed_types:
+            changed_shift_labels = [label for label in changed_labels if label.label_type == "Смена"]
+            spliced_shifts = self._splice_player_shifts(
+                generic_labels, changed_shift_labels, segment_ranges, new_shifts, total_duration_sec, rosters
+            )
+            if spliced_shifts is None:
+                return None
+            old_shifts = new_shifts
+            new_shifts, player_ids = spliced_shifts
+            # ЧИИ при этом не менялись (иначе смены переводятся заново целиком)
+            reuse = old_shifts if "Пауза" not in changed_types else None
+            new_shifts_ot = self._splice_official_shifts(new_shifts, new_shifts_ot, new_ranges, player_ids, reuse)
+        return new_ranges, new_shifts, new_shifts_ot
+
+    def _splice_chi_ranges(
+        self,
+        generic_labels: List[GenericLabel],
+        calculated_ranges: List[CalculatedRange],
+        segment_ranges: List[CalculatedRange]
+    ) -> Tuple[List[CalculatedRange], List[CalculatedRange]]:
+        """
+        Пересчитывает ЧИИ по текущим меткам "Пауза" и заменяет ЧИИ только тех Сегментов, у которых
+        они изменились (пары пауз считаются по всем меткам, как в process: метка без пары сдвигает
+        чётность, поэтому затронутым может оказаться и соседний Сегмент).
+
+        Returns:
+            (новый список calculated_ranges, Сегменты с изменившимися ЧИИ)
+        """
+        pause_labels = sorted((label for label in generic_labels if label.label_type == "Пауза"), key=lambda x: x.global_time)
+        pause_ranges_by_segment = _pause_intervals_by_segment(pause_labels, segment_ranges)
+
+        old_chi_by_segment: Dict[str, List[CalculatedRange]] = {seg_range.id: [] for seg_range in segment_ranges}
+        for cr in calculated_ranges:
+            if cr.label_type == "ЧИИ":
+                seg_idx = _segment_index(segment_ranges, cr.start_time)
+                if seg_idx >= 0:
+                    old_chi_by_segment[segment_ranges[seg_idx].id].append(cr)
+
+        chi_by_segment: Dict[str, List[CalculatedRange]] = {}
+        changed_segments: List[CalculatedRange] = []
+        for seg_range in segment_ranges:
+            old_chi = old_chi_by_segment[seg_range.id]
+            chi_intervals = _chi_intervals(seg_range.start_time, seg_range.end_time, pause_ranges_by_segment.get(seg_range.id, []))
+            if [(chi.start_time, chi.end_time) for chi in old_chi] == chi_intervals:
+                chi_by_segment[seg_range.id] = old_chi
+            else:
+                chi_by_segment[seg_range.id] = _chi_ranges_for_segment(seg_range, chi_intervals)
+                changed_segments.append(seg_range)
+        if not changed_segments:
+            return calculated_ranges, []
+
+        # ЧИИ стоят в списке блоком (по порядку Сегментов) сразу после Сегментов — как в process
+        all_chi = [chi for seg_range in segment_ranges for chi in chi_by_segment[seg_range.id]]
+        new_ranges: List[CalculatedRange] = []
+        chi_inserted = False
+        last_segment_pos = max((i for i, cr in enumerate(calculated_ranges) if cr.label_type == "Сегмент"), default=-1)
+        for i, cr in enumerate(calculated_ranges):
+            if cr.label_type == "ЧИИ":
+                if not chi_inserted:
+                    new_ranges.extend(all_chi)
+                    chi_inserted = True
+                continue
+            new_ranges.append(cr)
+            if i == last_segment_pos and not chi_inserted and (i + 1 >= len(calculated_ranges) or calculated_ranges[i + 1].label_type != "ЧИИ"):
+                new_ranges.extend(all_chi)
+                chi_inserted = True
+        print(f"[SMART] Инкрементально: пересчитаны ЧИИ {', '.join(seg.name for seg in changed_segments)}.")
+        return new_ranges, changed_segments
+
+    def _players_for_chi_change(
+        self,
+        player_shifts: Dict[str, PlayerShiftInfo],
+        old_ranges: List[CalculatedRange],
+        new_ranges: List[CalculatedRange],
+        changed_segments: List[CalculatedRange]
+    ) -> Set[str]:
+        """
+        Игроки, чьё официальное время смен изменилось после пересчёта ЧИИ changed_segments.
+        Обычный период всегда занимает 1200 с официального времени, поэтому сдвигаются только смены
+        внутри изменившихся Сегментов. Если сдвинулось официальное начало другого периода
+        (у Сегмента пропали или появились ЧИИ, овертайм) — затронуты все.
+        """
+        changed_names = {seg_range.name for seg_range in changed_segments}
+        old_starts = _period_official_starts(get_official_time_map(old_ranges), changed_names)
+        new_starts = _period_official_starts(get_official_time_map(new_ranges), changed_names)
+        if old_starts.keys() != new_starts.keys() or \
+           any(abs(old_starts[name] - new_starts[name]) > 1e-9 for name in old_starts):
+            return set(player_shifts.keys())
+        return {
+            player_id for player_id, info in player_shifts.items()
+            if any(shift.start_time <= seg_range.end_time and shift.end_time >= seg_range.start_time
+                   for shift in info.shifts for seg_range in changed_segments)
+        }
+
+    def _splice_player_shifts(
+        self,
+        generic_labels: List[GenericLabel],
+        changed_shift_labels: List[GenericLabel],
+        segment_ranges: List[CalculatedRange],
+        player_shifts: Dict[str, PlayerShiftInfo],
+        total_duration_sec: float,
+        rosters: Dict[str, List[Dict]] = None
+    ) -> Optional[Tuple[Dict[str, PlayerShiftInfo], Set[str]]]:
+        """
+        Пересчитывает смены игроков в Сегменте изменённых меток "Смена" через _process_player_shifts
+        и вклеивает их вместо прежних смен этого Сегмента (номера смен пересчитываются по порядку).
+        _process_player_shifts сбрасывает состояние на границе периода, поэтому Сегменты независимы;
+        исключение — вратарь, оставшийся на льду в последнем размеченном Сегменте: его смены
+        продолжаются во всех следующих Сегментах. Поэтому для последнего размеченного Сегмента
+        пересчитывается хвост матча от предыдущего размеченного Сегмента.
+
+        Returns:
+            (новый player_shifts, id игроков с изменившимися сменами) или None — нужен полный пересчёт.
+        """
+        shift_labels = [label for label in generic_labels if label.label_type == "Смена"]
+        label_segments = [_segment_index(segment_ranges, label.global_time) for label in shift_labels]
+        affected = {_segment_index(segment_ranges, label.global_time) for label in changed_shift_labels}
+        if -1 in label_segments or -1 in affected or len(affected) != 1:
+            # Метки вне Сегментов переносят состояние между периодами — только полный пересчёт
+            return None
+        seg_idx = affected.pop()
+        labelled = sorted(set(label_segments))
+        if labelled and seg_idx < labelled[-1]:
+            region = (seg_idx, seg_idx)
+        else:
+            previous = [idx for idx in labelled if idx < seg_idx]
+            region = (previous[-1] if previous else seg_idx, len(segment_ranges) - 1)
+        region_start = segment_ranges[region[0]].start_time
+        region_end = segment_ranges[region[1]].end_time
+        # Смежные Сегменты с общей границей: принадлежность смены на границе неоднозначна
+        if (region[0] > 0 and segment_ranges[region[0] - 1].end_time >= region_start) or \
+           (region[1] + 1 < len(segment_ranges) and segment_ranges[region[1] + 1].start_time <= region_end):
+            return None
+
+        region_labels = [label for label, idx in zip(shift_labels, label_segments) if region[0] <= idx <= region[1]]
+        region_shifts = self._process_player_shifts(
+            generic_labels=region_labels,
+            calculated_ranges=segment_ranges[region[0]:region[1] + 1],
+            total_duration_sec=total_duration_sec,
+            rosters=rosters
+        )
+
+        changed_players: Set[str] = set(region_shifts.keys())
+        new_player_shifts: Dict[str, PlayerShiftInfo] = {}
+        for player_id, info in player_shifts.items():
+            kept = [shift for shift in info.shifts if not (region_start <= shift.start_time <= region_end)]
+            if len(kept) != len(info.shifts):
+                changed_players.add(player_id)
+            if player_id not in changed_players:
+                new_player_shifts[player_id] = info
+            elif kept or player_id in region_shifts:
+                new_player_shifts[player_id] = PlayerShiftInfo(id_fhm=player_id, name=info.name, shifts=kept)
+        for player_id, info in region_shifts.items():
+            existing_info = new_player_shifts.get(player_id)
+            if existing_info is None:
+                existing_info = PlayerShiftInfo(id_fhm=player_id, name=info.name, shifts=[])
+                new_player_shifts[player_id] = existing_info
+            existing_info.shifts.extend(info.shifts)
+        for player_id in changed_players:
+            existing_info = new_player_shifts.get(player_id)
+            if existing_info is None:
+                continue
+            existing_info.shifts.sort(key=lambda x: x.start_time)
+            existing_info.shifts = [
+                PlayerShift(number=number, start_time=shift.start_time, end_time=shift.end_time)
+                for number, shift in enumerate(existing_info.shifts, start=1)
+            ]
+        print(f"[SMART] Инкрементально: пересчитаны смены {segment_ranges[region[0]].name}"
+              f"{'' if region[0] == region[1] else ' - ' + segment_ranges[region[1]].name} ({len(changed_players)} игроков).")
+        return new_player_shifts, changed_players
+
+    def _splice_official_shifts(
+        self,
+        player_shifts: Dict[str, PlayerShiftInfo],
+        player_shifts_official_timer: Dict[str, PlayerShiftInfo],
+        calculated_ranges: List[CalculatedRange],
+        player_ids: Set[str],
+        old_player_shifts: Optional[Dict[str, PlayerShiftInfo]] = None
+    ) -> Dict[str, PlayerShiftInfo]:
+        """
+        player_shifts_official_timer, в котором пересчитаны только смены игроков player_ids.
+        old_player_shifts — смены до изменения, если ЧИИ не менялись: тогда официальное время
+        уже известных смен берётся из player_shifts_official_timer (по номеру смены), а переводятся
+        только новые смены.
+        """
+        if old_player_shifts is None:
+            to_convert = {
+                player_id: info for player_id, info in player_shifts.items()
+                if player_id in player_ids or player_id not in player_shifts_official_timer
+            }
+            converted = self._process_player_shifts_official_timer(to_convert, calculated_ranges) if to_convert else {}
+        else:
+            converted = self._reuse_official_shifts(
+                {player_id: info for player_id, info in player_shifts.items() if player_id in player_ids},
+                player_shifts_official_timer, calculated_ranges, old_player_shifts
+            )
+        return {
+            player_id: converted[player_id] if player_id in converted else player_shifts_official_timer[player_id]
+            for player_id in player_shifts
+        }
+
+    def _reuse_official_shifts(
+        self,
+        player_shifts: Dict[str, PlayerShiftInfo],
+        player_shifts_official_timer: Dict[str, PlayerShiftInfo],
+        calculated_ranges: List[CalculatedRange],
+        old_player_shifts: Dict[str, PlayerShiftInfo]
+    ) -> Dict[str, PlayerShiftInfo]:
+        """То же, что _process_player_shifts_official_timer, но переводит только смены, которых не было в old_player_shifts."""
+        # (игрок, начало, конец) -> официальные (начало, конец) или None (смена вне ЧИИ)
+        known: Dict[Tuple[str, float, float], Optional[Tuple[float, float]]] = {}
+        for player_id in player_shifts:
+            old_info = old_player_shifts.get(player_id)
+            old_ot_info = player_shifts_official_timer.get(player_id)
+            if old_info is None or old_ot_info is None:
+                continue
+            ot_by_number = {shift.number: shift for shift in old_ot_info.shifts}
+            for shift in old_info.shifts:
+                ot_shift = ot_by_number.get(shift.number)
+                known[(player_id, shift.start_time, shift.end_time)] = \
+                    None if ot_shift is None else (ot_shift.start_time, ot_shift.end_time)
+
+        new_shifts = {
+            player_id: [shift for shift in info.shifts if (player_id, shift.start_time, shift.end_time) not in known]
+            for player_id, info in player_shifts.items()
+        }
+        converted = self._process_player_shifts_official_timer(
+            {player_id: PlayerShiftInfo(id_fhm=player_id, name=player_shifts[player_id].name, shifts=shifts)
+             for player_id, shifts in new_shifts.items() if shifts},
+            calculated_ranges
+        )
+        for player_id, shifts in new_shifts.items():
+            ot_by_number = {shift.number: shift for shift in converted[player_id].shifts} if player_id in converted else {}
+            for shift in shifts:
+                ot_shift = ot_by_number.get(shift.number)
+                known[(player_id, shift.start_time, shift.end_time)] = \
+                    None if ot_shift is None else (ot_shift.start_time, ot_shift.end_time)
+
+        result: Dict[str, PlayerShiftInfo] = {}
+        for player_id, info in player_shifts.items():
+            ot_info = PlayerShiftInfo(id_fhm=player_id, name=info.name, shifts=[])
+            for shift in info.shifts:
+                official = known[(player_id, shift.start_time, shift.end_time)]
+                if official is not None:
+                    ot_info.shifts.append(PlayerShift(number=shift.number, start_time=official[0], end_time=official[1]))
+            result[player_id] = ot_info
+        return result
+
     def convert_global_to_official_time(self, global_time: float, calculated_ranges: List[CalculatedRange]) -> Optional[float]:
         """
         Переводит глобальное время в официальное игровое время.
@@ -738,8 +1137,7 @@ class SMARTProcessor:
         Returns:
             Официальное время или None, если не попадает в ЧИИ.
         """
-        official_timeline_map, period_info = create_official_time_map(calculated_ranges)
-        return map_global_time_to_official(global_time, official_timeline_map, period_info)
+        return get_official_time_map(calculated_ranges).to_official(global_time)
 
 
         # ... (остальной код класса SMARTProcessor) ...
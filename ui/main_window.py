@@ -10,10 +10,13 @@ import json
 from model.project import Project, GenericLabel, CalculatedRange # Импортируем нужные классы
 from ui.video_player_widget import VideoPlayerWidget
 from utils.helpers import load_project_from_file, save_project_to_file
+from utils.keyframe_index import sidecar_path_for_project
+from utils.thumbnail_atlas import atlas_paths_for_project
+from utils.virtual_video import build_segments_from_files, source_files, source_label
 # --- Новые импорты ---
 from ui.universal_label_editor import UniversalLabelEditor
 from ui.labels_tree_widget import LabelsTreeWidget
-from modules.smart import SMARTProcessor # <-- Новый импорт
+from modules.smart import SMARTProcessor, diff_calculated_ranges # <-- Новый импорт
 from ui.protocol_validation_widget import ProtocolValidationWidget
 # - Новые импорты -
 from ui.timeline_widget import TimelineWidget # Импортируем TimelineWidget
@@ -22,9 +25,12 @@ from ui.lineup_module_widget import LineupModuleWidget
 from modules.reports import PlayerShiftMapReport, ReportData, SORT_BY_POSITION_BLOCKS
 from ui.report_viewer_window import ReportViewerWindow
 # --- Конец новых импортов ---
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from PyQt5.QtWidgets import QStackedWidget
 
+# Сколько следующих диапазонов из range_selector предвыбирать в кэш кадров при выборе диапазона
+PREFETCH_NEXT_RANGES = 3
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -324,6 +330,8 @@ class MainWindow(QMainWindow):
         # 1.2. Сигнал от VideoPlayerWidget о нажатии '9' -> обработчик в MainWindow
         self.video_player_widget.snapToNextRequested.connect(self.handle_snap_to_next)
         # --- КОНЕЦ НОВОГО ---
+        # 1.3. Предпросмотр миниатюр на таймлайне берётся из атласа плеера
+        self.timeline_widget.set_thumbnail_provider(self.video_player_widget.thumbnail_at)
         # 2. Сигнал от UniversalLabelEditor о запросе метки -> обработчик в MainWindow
         self.universal_label_editor_widget.labelSet.connect(self.on_label_requested_from_editor)
         # 3. Изменение выбора в range_selector (теперь внутри UniversalLabelEditor) -> обработчик в MainWindow
@@ -335,7 +343,7 @@ class MainWindow(QMainWindow):
         # 4.1. Сигнал от LabelsTreeWidget о двойном клике по метке "Смена" -> восстановление состава
         self.labels_tree_widget.shiftLabelDoubleClicked.connect(self._on_shift_label_double_clicked)
         # 5. Сигнал от кнопки SMART -> вызов SMART
-        self.run_smart_button.clicked.connect(self.run_smart_analysis)
+        self.run_smart_button.clicked.connect(lambda: self.run_smart_analysis())
         # 6. Сигнал от чекбокса SMART -> обновление состояния
         self.auto_smart_checkbox.stateChanged.connect(self.on_auto_smart_toggled)
         # 6.1. Сигнал от LabelsTreeWidget об изменении развёрнутости -> сохранение в проект
@@ -666,10 +674,11 @@ class MainWindow(QMainWindow):
                 self._save_project_callback,
                 self.project.match.rosters
             )
+            self._update_player_hotspots()
 
             # 8. Вызвать SMART, если включён
             if self.auto_smart_checkbox.isChecked():
-                self.run_smart_analysis()
+                self.run_smart_analysis(changed_labels=[new_label])
 
             # 9. ВАЖНО: Завершаем метод, чтобы не выполнить оставшуюся логику
             return
@@ -793,12 +802,13 @@ class MainWindow(QMainWindow):
             self._save_project_callback,
             self.project.match.rosters
         )
+        self._update_player_hotspots()
 
         # Вызов SMART (для остальных типов, кроме "Гол" и "Удаление")
         # Метки "Гол" и "Удаление" не влияют на calculated_ranges,
         # поэтому SMART вызывать не нужно — это сохранит статусное сообщение с деталями
         if self.auto_smart_checkbox.isChecked() and label_type not in ("Гол", "Удаление"):
-            self.run_smart_analysis()
+            self.run_smart_analysis(changed_labels=[new_label])
 
 
     def on_range_selection_changed(self, text: str):
@@ -809,10 +819,25 @@ class MainWindow(QMainWindow):
                 # Установить границы "схлопывания"
                 self.video_player_widget.set_navigation_bounds(calc_range.start_time, calc_range.end_time)
                 self.status_label.setText(f"Режим: {text}")
+                self._prefetch_ranges_from(text)
                 break # Нашли и применили, выходим из цикла
         # Если диапазон не найден (например, "Всё видео" не был в calculated_ranges до SMART),
         # цикл завершится, и режим не изменится. Это маловероятно, так как SMART всегда добавляет "Всё видео".
 
+    def _prefetch_ranges_from(self, range_name: str):
+        """
+        Запускает фоновую предвыборку начала выбранного диапазона и PREFETCH_NEXT_RANGES следующих
+        за ним в range_selector, чтобы переключение периодов при просмотре было мгновенным.
+        """
+        range_selector = self.universal_label_editor_widget.get_range_selector()
+        index = range_selector.findText(range_name)
+        if index < 0:
+            return
+        ranges_by_name = {cr.name: cr for cr in self.project.match.calculated_ranges}
+        names = [range_selector.itemText(i) for i in range(index, min(range_selector.count(), index + 1 + PREFETCH_NEXT_RANGES))]
+        ranges = [(ranges_by_name[name].start_time, ranges_by_name[name].end_time) for name in names if name in ranges_by_name]
+        self.video_player_widget.prefetch_ranges(ranges)
+
     # --- Конец новых методов ---
 
     def update_recent_projects_menu(self):
@@ -844,9 +869,19 @@ class MainWindow(QMainWindow):
                  self.timeline_widget.update_active_range(all_video_range.start_time, all_video_range.end_time, all_video_range.name)
 
     def create_new_project(self):
-        video_path, _ = QFileDialog.getOpenFileName(self, "Выберите видеофайл", "", "Видео (*.mp4 *.avi *.mov)")
-        if not video_path:
+        # Можно выбрать несколько файлов (матч записан по периодам) — они станут сегментами одной шкалы
+        video_paths, _ = QFileDialog.getOpenFileNames(self, "Выберите видеофайл(ы)", "", "Видео (*.mp4 *.avi *.mov)")
+        if not video_paths:
             return # Пользователь отменил выбор видео
+        video_paths = sorted(video_paths)
+        video_path = video_paths[0]
+        video_segments = []
+        if len(video_paths) > 1:
+            try:
+                video_segments = build_segments_from_files(video_paths)
+            except ValueError as e:
+                QMessageBox.critical(self, "Ошибка", str(e))
+                return
         # Запрос имени файла проекта через "Сохранить как..."
         project_path, _ = QFileDialog.getSaveFileName(self, "Сохранить проект как", "", "Проект (*.hkt)")
         if not project_path:
@@ -854,6 +889,7 @@ class MainWindow(QMainWindow):
         # Инициализация нового проекта
         self.project = Project() # Создаём проект версии 4.0
         self.project.video_path = video_path
+        self.project.video_segments = video_segments
         self.current_video_path = video_path
         # Сохраняем путь проекта
         self.project_file_path = project_path
@@ -861,8 +897,9 @@ class MainWindow(QMainWindow):
         self.update_window_title()
         # --- Конец нового ---
         # Загрузка видео в плеер
-        self.video_player_widget.load_video(video_path)
-        self.status_label.setText(f"Новый проект, видео: {os.path.basename(video_path)}")
+        video_source = self.project.get_video_source()
+        self.video_player_widget.load_video(video_source, sidecar_path_for_project(project_path), atlas_paths_for_project(project_path))
+        self.status_label.setText(f"Новый проект, видео: {source_label(video_source)}")
         # --- Новое: Запуск SMART после загрузки видео ---
         # Это создаст CalculatedRange "Всё видео" и, возможно, другие диапазоны на основе пустого списка меток (или базовых правил)
         self.run_smart_analysis()
@@ -894,8 +931,10 @@ class MainWindow(QMainWindow):
             self.update_window_title()
             # --- Конец нового ---
             self.current_video_path = self.project.video_path
-            if self.current_video_path and os.path.exists(self.current_video_path):
-                self.video_player_widget.load_video(self.current_video_path)
+            video_source = self.project.get_video_source()
+            missing_files = [path for path in source_files(video_source) if not os.path.exists(path)]
+            if self.current_video_path and not missing_files:
+                self.video_player_widget.load_video(video_source, sidecar_path_for_project(project_path), atlas_paths_for_project(project_path))
                 self.status_label.setText(f"Открыт проект: {os.path.basename(project_path)}")
                 self.add_to_recent_projects(project_path)
                 # --- Новое: Загрузка сохранённых фильтров TimelineWidget ---
@@ -921,7 +960,7 @@ class MainWindow(QMainWindow):
                 self._init_protocol_validation_widget()
                 # --- Конец нового ---
             else:
-                QMessageBox.critical(self, "Ошибка", f"Видеофайл не найден: {self.current_video_path}")
+                QMessageBox.critical(self, "Ошибка", f"Видеофайл не найден: {', '.join(missing_files) or self.current_video_path}")
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить проект:\n{str(e)}")
 
@@ -1063,40 +1102,70 @@ class MainWindow(QMainWindow):
 # ui/main_window.py
 # ... (внутри класса MainWindow) ...
 
-    def run_smart_analysis(self):
-        """Вызывает SMARTProcessor и обновляет calculated_ranges, player_shifts, player_shifts_official_timer и интерфейс."""
-        # 1. Вызвать основной процессор для calculated_ranges
-        try:
-            # Передаём total_duration_sec из VideoPlayerWidget
-            total_duration = self.video_player_widget.get_total_duration()
-            new_calculated_ranges = self.smart_processor.process(self.project.match.generic_labels, total_duration)
-        except Exception as e:
-            QMessageBox.warning(self, "Предупреждение", f"Ошибка при выполнении анализа SMART (calculated_ranges): {str(e)}")
-            return # Не обновляем, если ошибка
+    def run_smart_analysis(self, changed_labels: Optional[List[GenericLabel]] = None):
+        """
+        Вызывает SMARTProcessor и обновляет calculated_ranges, player_shifts, player_shifts_official_timer и интерфейс.
+        changed_labels — метки, добавленные/удалённые/изменённые с прошлого запуска SMART: тогда пересчитывается
+        только затронутый "Сегмент" (SMARTProcessor.process_incremental), а если это невозможно — весь матч.
+        """
+        total_duration = self.video_player_widget.get_total_duration()
+        incremental_result = None
+        if changed_labels:
+            try:
+                incremental_result = self.smart_processor.process_incremental(
+                    generic_labels=self.project.match.generic_labels,
+                    changed_labels=changed_labels,
+                    calculated_ranges=self.project.match.calculated_ranges,
+                    player_shifts=self.project.match.player_shifts,
+                    player_shifts_official_timer=self.project.match.player_shifts_official_timer,
+                    total_duration_sec=total_duration,
+                    rosters=getattr(self.project.match, 'rosters', None)
+                )
+            except Exception as e:
+                print(f"[SMART] Инкрементальный пересчёт не удался ({e}), выполняется полный.")
+                incremental_result = None
 
-        # 2. Вызвать процессор для player_shifts
-        try:
-            # Передаём generic_labels, только что вычисленные calculated_ranges, total_duration и rosters
-            new_player_shifts = self.smart_processor._process_player_shifts(
-                generic_labels=self.project.match.generic_labels,
-                calculated_ranges=new_calculated_ranges, # Используем свежие calculated_ranges
-                total_duration_sec=total_duration,
-                rosters=getattr(self.project.match, 'rosters', None) # Передаём составы для определения вратарей
-            )
-        except Exception as e:
-            QMessageBox.warning(self, "Предупреждение", f"Ошибка при выполнении анализа SMART (player_shifts): {str(e)}")
-            return # Не обновляем, если ошибка
+        if incremental_result is not None:
+            new_calculated_ranges, new_player_shifts, new_player_shifts_ot = incremental_result
+        else:
+            # 1. Вызвать основной процессор для calculated_ranges
+            try:
+                new_calculated_ranges = self.smart_processor.process(self.project.match.generic_labels, total_duration)
+            except Exception as e:
+                QMessageBox.warning(self, "Предупреждение", f"Ошибка при выполнении анализа SMART (calculated_ranges): {str(e)}")
+                return # Не обновляем, если ошибка
 
-        # 3. Вызвать процессор для player_shifts_official_timer
-        try:
-            # Передаём уже вычисленные player_shifts и calculated_ranges
-            new_player_shifts_ot = self.smart_processor._process_player_shifts_official_timer(
-                player_shifts_data=new_player_shifts, # Используем свежие player_shifts
-                calculated_ranges=new_calculated_ranges # Используем свежие calculated_ranges
-            )
-        except Exception as e:
-            QMessageBox.warning(self, "Предупреждение", f"Ошибка при выполнении анализа SMART (player_shifts_official_timer): {str(e)}")
-            return # Не обновляем, если ошибка
+            # 2. Вызвать процессор для player_shifts
+            try:
+                # Передаём generic_labels, только что вычисленные calculated_ranges, total_duration и rosters
+                new_player_shifts = self.smart_processor._process_player_shifts(
+                    generic_labels=self.project.match.generic_labels,
+                    calculated_ranges=new_calculated_ranges, # Используем свежие calculated_ranges
+                    total_duration_sec=total_duration,
+                    rosters=getattr(self.project.match, 'rosters', None) # Передаём составы для определения вратарей
+                )
+            except Exception as e:
+                QMessageBox.warning(self, "Предупреждение", f"Ошибка при выполнении анализа SMART (player_shifts): {str(e)}")
+                return # Не обновляем, если ошибка
+
+            # 3. Вызвать процессор для player_shifts_official_timer
+            try:
+                # Передаём уже вычисленные player_shifts и calculated_ranges
+                new_player_shifts_ot = self.smart_processor._process_player_shifts_official_timer(
+                    player_shifts_data=new_player_shifts, # Используем свежие player_shifts
+                    calculated_ranges=new_calculated_ranges # Используем свежие calculated_ranges
+                )
+            except Exception as e:
+                QMessageBox.warning(self, "Предупреждение", f"Ошибка при выполнении анализа SMART (player_shifts_official_timer): {str(e)}")
+                return # Не обновляем, если ошибка
+
+        # id диапазонов стабильны, поэтому результат сравнивается с прежним: если диапазоны не изменились
+        # (например, пересчитаны только смены), селектор и дерево не перестраиваются
+        ranges_changed = new_calculated_ranges is not self.project.match.calculated_ranges and \
+            not diff_calculated_ranges(self.project.match.calculated_ranges, new_calculated_ranges).is_empty()
+        if not ranges_changed:
+            # Содержимое то же — оставляем прежний список, на который ссылаются дерево и таймлайн
+            new_calculated_ranges = self.project.match.calculated_ranges
 
         # 4. Обновить calculated_ranges в проекте
         self.project.match.calculated_ranges = new_calculated_ranges
@@ -1116,19 +1185,20 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 QMessageBox.warning(self, "Предупреждение", f"Не удалось сохранить проект после SMART: {str(e)}")
 
-        # 8. Обновить range_selector
-        self._update_range_selector()
+        if ranges_changed:
+            # 8. Обновить range_selector
+            self._update_range_selector()
 
-        # 9. Обновить labels_tree_widget (опционально, так как метки не изменились, но обновим для консистентности)
-        self.labels_tree_widget.update_tree(
-            self.project.match.generic_labels,          # generic_labels
-            self.project.match.calculated_ranges,       # calculated_ranges
-            self.project.match.generic_labels,          # generic_labels_ref
-            self.project.match.calculated_ranges,       # calculated_ranges_ref
-            self.video_player_widget,                 # video_player_widget
-            self._save_project_callback,              # save_callback
-            self.project.match.rosters
-        )
+            # 9. Обновить labels_tree_widget (опционально, так как метки не изменились, но обновим для консистентности)
+            self.labels_tree_widget.update_tree(
+                self.project.match.generic_labels,          # generic_labels
+                self.project.match.calculated_ranges,       # calculated_ranges
+                self.project.match.generic_labels,          # generic_labels_ref
+                self.project.match.calculated_ranges,       # calculated_ranges_ref
+                self.video_player_widget,                 # video_player_widget
+                self._save_project_callback,              # save_callback
+                self.project.match.rosters
+            )
         # --- НОВОЕ: Обновляем TimelineWidget ---
         if self.timeline_widget:
             self.timeline_widget.update_data(
@@ -1136,9 +1206,25 @@ class MainWindow(QMainWindow):
                 self.project.match.calculated_ranges
             )
         # --- Конец НОВОГО ---
+        if ranges_changed:
+            self._update_player_hotspots()
 
     # --- Конец нового метода ---
 
+    def _update_player_hotspots(self):
+        """
+        Передаёт плееру "горячие точки" навигации: время меток и границы рассчитанных диапазонов.
+        Кадры рядом с текущей позицией заранее декодируются в кэш, поэтому переходы
+        из дерева меток, таймлайна и по клавишам 8/9 отображаются без seek.
+        """
+        if not self.project:
+            return
+        times = [label.global_time for label in self.project.match.generic_labels]
+        for cr in self.project.match.calculated_ranges:
+            times.append(cr.start_time)
+            times.append(cr.end_time)
+        self.video_player_widget.set_hotspot_times(times)
+
 # ... (остальной код MainWindow) ...
 
 # ... (остальной код MainWindow) ...
@@ -1151,6 +1237,7 @@ class MainWindow(QMainWindow):
                 save_project_to_file(self.project, self.project_file_path)
                 self.status_label.setText("Проект сохранён (из LabelsTreeWidget).")
                 self._try_auto_refresh_report()
+                self._update_player_hotspots()
             except Exception as e:
                 QMessageBox.warning(self, "Предупреждение", f"Не удалось сохранить проект из LabelsTreeWidget: {str(e)}")
         else:
@@ -1198,9 +1285,9 @@ class MainWindow(QMainWindow):
         # - Конец нового -
     # --- Конец нового метода ---
 
-    def on_video_loaded(self, path: str, duration: float, fps: float):
-        """Обработчик сигнала от плеера о загрузке видео."""
-        self.status_label.setText(f"Видео загружено: {os.path.basename(path)} ({duration:.1f}s, {fps:.1f}fps)")
+    def on_video_loaded(self, source_name: str, duration: float, fps: float):
+        """Обработчик сигнала от плеера о загрузке видео (source_name — имя файла или 'файл (+N файлов)')."""
+        self.status_label.setText(f"Видео загружено: {source_name} ({duration:.1f}s, {fps:.1f}fps)")
 
     def set_active_protocol_event(self, event_dict: Dict[str, Any]):
         """Устанавливает активное событие из протокола для последующего заполнения context."""
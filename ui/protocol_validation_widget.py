@@ -3,6 +3,8 @@ from PyQt5.QtWidgets import QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem
 from PyQt5.QtCore import Qt
 from typing import List, Dict, Any
 
+from utils.helpers import get_official_time_map
+
 class ProtocolValidationWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -102,61 +104,32 @@ class ProtocolValidationWidget(QWidget):
         else:
             return
 
-        # 1. Определяем период и локальное время
-        period_index = time_sec // 1200
-        t_proto = time_sec % 1200
-        period_num = period_index + 1
-        period_name = f"Период {period_num}"
-
-        # 2. Находим СЕГМЕНТ периода (не ЧИИ!)
-        period_range = None
-        for cr in self.main_window.project.match.calculated_ranges:
-            if cr.name == period_name and cr.label_type == "Сегмент":
-                period_range = cr
-                break
-
-        if period_range is None:
-            QMessageBox.warning(self, "Предупреждение", f"Не найден сегмент '{period_name}'. Сначала разметьте 'Сегменты' и запустите SMART.")
+        # 1. Карта официального времени (строится один раз на calculated_ranges и кешируется)
+        time_map = get_official_time_map(self.main_window.project.match.calculated_ranges)
+        if not len(time_map):
+            QMessageBox.warning(self, "Предупреждение", "Не найдены ЧИИ. Сначала разметьте 'Сегменты' и паузы и запустите SMART.")
             return
 
-        # 3. Переключаем плеер на нужный период
-        self.main_window._select_range_in_selector_and_playback(period_name)
-
-        # 4. Находим все ЧИИ этого периода
-        chi_ranges = []
-        for cr in self.main_window.project.match.calculated_ranges:
-            if cr.label_type == "ЧИИ" and cr.name.startswith(f"{period_name}. ЧИИ"):
-                chi_ranges.append(cr)
-
-        if not chi_ranges:
-            QMessageBox.warning(self, "Предупреждение", f"Не найдены ЧИИ для {period_name}. Сначала разметьте паузы и запустите SMART.")
+        # 2. Обратная проекция протокольного времени на ЧИИ (bisect, с коэффициентом периода и овертаймом)
+        chi_index = time_map.official_segment_index(time_sec)
+        if chi_index is None:
+            QMessageBox.warning(self, "Предупреждение", f"Время {time_sec // 60:02d}:{time_sec % 60:02d} выходит за пределы всех ЧИИ.")
             return
+        target_global_time = time_map.to_global(time_sec)
+        period_name = time_map.period_name(chi_index)
 
-        chi_ranges.sort(key=lambda x: x.start_time)
-
-        # 5. Проекция на ЧИИ
-        accumulated = 0.0
-        target_global_time = None
-        for chi in chi_ranges:
-            chi_duration = chi.end_time - chi.start_time
-            if accumulated + chi_duration >= t_proto:
-                offset_in_chi = t_proto - accumulated
-                target_global_time = chi.start_time + offset_in_chi
-                break
-            accumulated += chi_duration
-
-        if target_global_time is None:
-            QMessageBox.warning(self, "Предупреждение", f"Событие выходит за пределы всех ЧИИ {period_name}.")
-            return
+        # 3. Переключаем плеер на нужный период
+        if period_name is not None:
+            self.main_window._select_range_in_selector_and_playback(period_name)
 
-        # 6. Сохраняем событие для context
+        # 4. Сохраняем событие для context
         self.main_window.set_active_protocol_event(dict(event))
 
-        # 7. Устанавливаем фокус и тип метки
+        # 5. Устанавливаем фокус и тип метки
         self.main_window.video_player_widget.setFocus()
         self.main_window.universal_label_editor_widget.set_current_label_type(event_type)
 
-        # 8. Переходим к времени
+        # 6. Переходим к времени
         self.main_window.go_to_time(target_global_time)
 
         self.main_window.status_label.setText(
@@ -0,0 +1,47 @@
+# ui/thumbnail_preview.py
+"""
+Всплывающее окно предпросмотра миниатюры из атласа (utils/thumbnail_atlas.py).
+Используется слайдером плеера и таймлайном при наведении/перемотке; декодер не затрагивается.
+"""
+
+import cv2
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout
+from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtGui import QImage, QPixmap, QFont
+
+
+def format_hms(seconds: float) -> str:
+    seconds = max(0.0, seconds)
+    return f"{int(seconds // 3600):02d}:{int((seconds % 3600) // 60):02d}:{int(seconds % 60):02d}"
+
+
+class ThumbnailPreview(QWidget):
+    """Окно без рамки с миниатюрой и подписью времени, показывается над точкой наведения."""
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.ToolTip | Qt.FramelessWindowHint)
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(2, 2, 2, 2)
+        layout.setSpacing(0)
+        self.image_label = QLabel()
+        layout.addWidget(self.image_label)
+        self.time_label = QLabel()
+        self.time_label.setFont(QFont("Arial", 8))
+        self.time_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.time_label)
+        self.setStyleSheet("background-color: black; color: white;")
+
+    def show_thumbnail(self, thumb, caption: str, anchor: QPoint):
+        """
+        Показывает миниатюру thumb (BGR) с подписью caption.
+        anchor — глобальная точка, над которой центрируется окно.
+        """
+        rgb = cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
+        h, w, ch = rgb.shape
+        qt_img = QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888)
+        self.image_label.setPixmap(QPixmap.fromImage(qt_img))
+        self.time_label.setText(caption)
+        self.adjustSize()
+        self.move(anchor.x() - self.width() // 2, anchor.y() - self.height() - 4)
+        if not self.isVisible():
+            self.show()
@@ -6,6 +6,8 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import pyqtSignal, QObject, QRectF, QPointF, Qt # Добавлен Qt для FocusPolicy
 from PyQt5.QtGui import QColor, QPen, QBrush, QPainter
 from model.project import GenericLabel, CalculatedRange # Импортируем нужные классы из модели проекта
+from ui.thumbnail_preview import ThumbnailPreview, format_hms
+from typing import Optional, Callable
 
 # --- визуальные параметры: Цвета,толщины, высоты ---
 COLOR_MAPPING = {
@@ -241,6 +243,8 @@ class TimelineView(QGraphicsView):
         self.setVerticalScrollBarPolicy(1) # Qt.ScrollBarAlwaysOff
         # Устанавливаем фиксированную высоту для области просмотра
         self.setFixedHeight(150) # Можно настроить позже
+        # Отслеживание курсора без нажатия — для предпросмотра миниатюр
+        self.setMouseTracking(True)
 
     def setScene(self, scene: 'TimelineScene'):
         """Устанавливает сцену и передаёт ссылку на TimelineWidget."""
@@ -292,6 +296,25 @@ class TimelineView(QGraphicsView):
             # pass#print(f"[DEBUG] TimelineView.mousePressEvent: Клик на X={x_scene}, вычислено глобальное время {calculated_global_time:.3f}s. Вне активного диапазона ({active_start} - {active_end}). Игнорируем.")
             pass
 
+    def mouseMoveEvent(self, event):
+        """Показывает миниатюру кадра под курсором (из атласа, без обращения к декодеру)."""
+        timeline_widget = self.parent()
+        if timeline_widget and isinstance(timeline_widget, TimelineWidget):
+            active_start = timeline_widget.active_start_time
+            active_duration = timeline_widget.active_end_time - active_start
+            if self.width() > 0 and active_duration > 0:
+                x_scene = self.mapToScene(event.pos()).x()
+                global_time = active_start + x_scene * active_duration / self.width()
+                anchor = self.mapToGlobal(event.pos())
+                timeline_widget.show_thumbnail_preview(global_time, anchor)
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        timeline_widget = self.parent()
+        if timeline_widget and isinstance(timeline_widget, TimelineWidget):
+            timeline_widget.hide_thumbnail_preview()
+        super().leaveEvent(event)
+
 class TimelineScene(QGraphicsScene):
     """QGraphicsScene для отображения элементов шкалы и индикатора времени."""
     def __init__(self, parent=None):
@@ -482,6 +505,10 @@ class TimelineWidget(QWidget):
         self.saved_filter_states: Optional[dict] = None
         # --------------------------------------------------------------------------------------
 
+        # --- Предпросмотр миниатюр: provider(global_time) -> BGR-миниатюра или None ---
+        self.thumbnail_provider: Optional[Callable] = None
+        self.thumbnail_preview = ThumbnailPreview(self)
+
         # --- Установка FocusPolicy ---
         self.setFocusPolicy(Qt.StrongFocus)
 
@@ -754,6 +781,23 @@ class TimelineWidget(QWidget):
         """Устанавливает состояния фильтров из проекта для применения при создании чекбоксов."""
         self.saved_filter_states = states
 
+    def set_thumbnail_provider(self, provider: Optional[Callable]):
+        """Устанавливает источник миниатюр для предпросмотра при наведении (обычно VideoPlayerWidget.thumbnail_at)."""
+        self.thumbnail_provider = provider
+
+    def show_thumbnail_preview(self, global_time: float, anchor):
+        if not self.thumbnail_provider or not (self.active_start_time <= global_time <= self.active_end_time):
+            self.hide_thumbnail_preview()
+            return
+        thumb = self.thumbnail_provider(global_time)
+        if thumb is None:
+            self.hide_thumbnail_preview()
+            return
+        self.thumbnail_preview.show_thumbnail(thumb, format_hms(global_time), anchor)
+
+    def hide_thumbnail_preview(self):
+        self.thumbnail_preview.hide()
+
     def update_data(self, generic_labels: list[GenericLabel], calculated_ranges: list[CalculatedRange]):
         """Обновляет внутренние списки данных и чекбоксы фильтров."""
         #print(f"[DEBUG] TimelineWidget.update_data() вызван. generic_labels: {len(generic_labels)}, calculated_ranges: {len(calculated_ranges)}")
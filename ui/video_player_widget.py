@@ -6,19 +6,62 @@ import sys
 import os
 import cv2
 import time
-from typing import List, Optional
+import threading
+from typing import List, Optional, Tuple
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton,
     QSlider, QComboBox, QApplication, QMessageBox
 )
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal
-from PyQt5.QtGui import QImage, QPixmap, QFont, QMouseEvent
+from PyQt5.QtCore import Qt, QTimer, QPoint, QRect, pyqtSignal
+from PyQt5.QtGui import QImage, QFont, QMouseEvent, QPainter, QColor
+import numpy as np
+from utils.video_decoder import SequentialFrameDecoder, ReverseGopDecoder
+from utils.keyframe_index import KeyframeIndex, load_or_build_keyframe_index, seek_and_read
+from utils.video_proxy import ProxyBuilder
+from utils.frame_cache import (
+    FrameLRUCache, FramePrewarmer, DEFAULT_CACHE_BUDGET_MB, downscale_for_display, nearest_hotspots
+)
+from utils.thumbnail_atlas import ThumbnailAtlas, ThumbnailAtlasBuilder
+from utils.virtual_video import open_video_capture, is_multi_segment, source_label
+from ui.thumbnail_preview import ThumbnailPreview, format_hms
 
 # === Допустимые значения скорости: от -3.0 до +3.0 с шагом 0.2, без 0 ===
 SPEED_VALUES = [round(x * 0.2, 1) for x in range(-15, 0)] + [round(x * 0.2, 1) for x in range(1, 16)]
 # → [-3.0, -2.8, ..., -0.2, 0.2, ..., 2.8, 3.0]
 
+# Сколько ближайших "горячих точек" (метки, границы диапазонов) прогревать после каждого перехода
+PREWARM_HOTSPOT_COUNT = 8
+# Предвыборка при выборе диапазона: сколько секунд от начала каждого диапазона декодировать в кэш
+PREFETCH_RANGE_SECONDS = 1.0
+
+# --- Планировщик воспроизведения ---
+# Минимальный интервал тика: быстрее кадры всё равно не успевают отрисоваться,
+# поэтому на высоких скоростях лишние кадры пропускаются намеренно
+MIN_TICK_MS = 15
+# Тик считается опоздавшим, если пришёл позже запланированного более чем в 1.5 раза
+LATE_TICK_FACTOR = 1.5
+
 class ClickableSlider(QSlider):
+    # Наведение/перетаскивание: (значение слайдера под курсором, X курсора) — для предпросмотра миниатюр
+    hoverValueChanged = pyqtSignal(int, int)
+    hoverLeft = pyqtSignal()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setMouseTracking(True)
+
+    def _value_at(self, x: int) -> int:
+        x = max(0, min(self.width(), x))
+        return int(self.minimum() + (self.maximum() - self.minimum()) * x / max(1, self.width()))
+
+    def mouseMoveEvent(self, event):
+        self.hoverValueChanged.emit(self._value_at(event.x()), event.x())
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        self.hoverLeft.emit()
+        super().leaveEvent(event)
+
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
             # Используем текущий диапазон слайдера для вычисления значения
@@ -27,11 +70,83 @@ class ClickableSlider(QSlider):
             self.sliderReleased.emit()
         super().mousePressEvent(event)
 
+# Format_BGR888 появился в Qt 5.14; на более старых версиях кадр переводится в RGB в тот же буфер
+HAS_BGR888 = hasattr(QImage, "Format_BGR888")
+
+
+class VideoFrameView(QWidget):
+    """
+    Область отображения кадра. Кадр масштабируется один раз (cv2.resize) в переиспользуемый буфер
+    и рисуется в paintEvent через QImage, построенный поверх этого буфера, без QPixmap и лишних копий.
+    """
+    def __init__(self, placeholder: str = "", parent=None):
+        super().__init__(parent)
+        self.placeholder = placeholder
+        self._buffer: Optional[np.ndarray] = None  # Переиспользуемый буфер кадра нужного размера
+        self._frame_ref: Optional[np.ndarray] = None  # Кадр, поверх которого построен _image (держим ссылку)
+        self._image: Optional[QImage] = None
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.last_present_ms: float = 0.0  # Время подготовки последнего кадра (для отладки)
+
+    def _target_size(self, w: int, h: int):
+        """Размер, вписанный в виджет с сохранением пропорций."""
+        scale = min(self.width() / w, self.height() / h)
+        return max(1, int(w * scale)), max(1, int(h * scale))
+
+    def set_frame(self, frame, render_size=None):
+        """
+        Показывает BGR-кадр. render_size — (ширина, высота) упрощённого рендера для режимов
+        "low"/"medium"; растяжение до размера виджета выполняет QPainter при отрисовке.
+        Без render_size кадр масштабируется сразу до размера виджета.
+        """
+        started = time.perf_counter()
+        h, w = frame.shape[:2]
+        target_w, target_h = render_size if render_size else self._target_size(w, h)
+
+        if (w, h) == (target_w, target_h) and HAS_BGR888 and frame.flags['C_CONTIGUOUS']:
+            # Кадр уже нужного размера (например, из кэша кадров) — рисуем его напрямую
+            image_data = frame
+        else:
+            if self._buffer is None or self._buffer.shape[:2] != (target_h, target_w):
+                self._buffer = np.empty((target_h, target_w, 3), dtype=np.uint8)
+            if (w, h) == (target_w, target_h):
+                np.copyto(self._buffer, frame)
+            else:
+                interpolation = cv2.INTER_AREA if target_w * 2 <= w else cv2.INTER_LINEAR
+                cv2.resize(frame, (target_w, target_h), dst=self._buffer, interpolation=interpolation)
+            if not HAS_BGR888:
+                cv2.cvtColor(self._buffer, cv2.COLOR_BGR2RGB, dst=self._buffer)
+            image_data = self._buffer
+
+        image_format = QImage.Format_BGR888 if HAS_BGR888 else QImage.Format_RGB888
+        self._frame_ref = image_data
+        self._image = QImage(image_data.data, target_w, target_h, image_data.strides[0], image_format)
+        self.last_present_ms = (time.perf_counter() - started) * 1000.0
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(0, 0, 0))
+        if self._image is None:
+            painter.setPen(QColor(255, 255, 255))
+            painter.drawText(self.rect(), Qt.AlignCenter, self.placeholder)
+            return
+        draw_w, draw_h = self._target_size(self._image.width(), self._image.height())
+        x = (self.width() - draw_w) // 2
+        y = (self.height() - draw_h) // 2
+        if (draw_w, draw_h) == (self._image.width(), self._image.height()):
+            painter.drawImage(x, y, self._image)
+        else:
+            # Растяжение упрощённого рендера ("low"/"medium") до размера виджета
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawImage(QRect(x, y, draw_w, draw_h), self._image)
+
+
 class VideoPlaybackController:
     """
     Класс, отвечающий за ядро воспроизведения и базовую логику "схлопывания".
     """
-    def __init__(self):
+    def __init__(self, frame_cache_mb: float = DEFAULT_CACHE_BUDGET_MB):
         self.video_path = None
         self.cap = None
         self.fps = 30.0
@@ -41,17 +156,58 @@ class VideoPlaybackController:
         self.current_time_sec = 0.0
         self.playing = False
         self.speed = 1.0
-        self.last_frame_time = 0.0
+        self.last_frame_time = 0.0  # time.perf_counter() предыдущего тика
+        # --- Счётчики воспроизведения (сбрасываются при старте) ---
+        self.presented_frames = 0  # Тики, на которых сменился кадр
+        self.dropped_frames = 0    # Индексы кадров, перескочённые между соседними показами
+        self.late_ticks = 0        # Тики, пришедшие заметно позже запланированного
+        self.idle_ticks = 0        # Тики без смены кадра (декодирование пропущено)
         # --- Новые поля для "схлопывания" ---
         self.nav_start_global = 0.0  # Начало доступной области (глобальное время)
         self.nav_end_global = 0.0    # Конец доступной области (глобальное время)
         self.nav_start_local = 0.0   # Смещение для отображения локального времени (глобальное время начала интервала)
         self.nav_duration = 0.0      # Длительность доступной области (для отображения локального времени)
-
-    def load_video(self, path):
+        # --- Фоновый последовательный декодер (кольцевой буфер кадров) ---
+        self.decoder: Optional[SequentialFrameDecoder] = None
+        # --- Декодер обратного воспроизведения (блоки GOP в память, создаётся по требованию) ---
+        self.reverse_decoder: Optional[ReverseGopDecoder] = None
+        # --- Индекс ключевых кадров для быстрых произвольных переходов ---
+        self.keyframe_index: Optional[KeyframeIndex] = None
+        # --- Прокси низкого разрешения (для режимов "low"/"medium") ---
+        self.proxy_builder: Optional[ProxyBuilder] = None
+        self.proxy_cap = None
+        self._ready_proxy_path: Optional[str] = None  # Прокси готов, но ещё не открыт в GUI-потоке
+        self.prefer_proxy = False  # Плеер хочет играть прокси (режим качества не "high")
+        self.use_proxy = False     # Сейчас кадры идут из прокси
+        # --- Кэш уменьшенных кадров для мгновенных переходов к меткам и границам диапазонов ---
+        self.frame_cache = FrameLRUCache(frame_cache_mb)
+        self.prewarmer: Optional[FramePrewarmer] = None
+        self.hotspot_times: List[float] = []  # Отсортированные глобальные времена "горячих точек"
+        # --- Атлас миниатюр для предпросмотра при перемотке ---
+        self.thumbnail_atlas: Optional[ThumbnailAtlas] = None
+        self.thumbnail_builder: Optional[ThumbnailAtlasBuilder] = None
+
+    def load_video(self, path, keyframe_index_path: Optional[str] = None,
+                   thumbnail_atlas_paths: Optional[Tuple[str, str]] = None):
+        """
+        Открывает видео. path — путь к файлу или список сегментов (VideoSegment) матча,
+        записанного несколькими файлами: глобальное время отображается на (файл, локальное время)
+        в VirtualVideoCapture, соседние файлы держатся открытыми.
+        keyframe_index_path — sidecar-файл индекса ключевых кадров
+        (рядом с .hkt); если не указан, индекс строится, но не сохраняется.
+        thumbnail_atlas_paths — (атлас, метаданные) миниатюр; если не указаны, предпросмотра нет.
+        """
         if self.cap:
             self.cap.release()
-        self.cap = cv2.VideoCapture(path)
+        if self.decoder:
+            self.decoder.stop()
+            self.decoder = None
+        self._stop_reverse_decoder()
+        self._release_proxy()
+        self._stop_prewarmer()
+        self.frame_cache.clear()
+        self._stop_thumbnail_builder()
+        self.cap = open_video_capture(path)
         if not self.cap.isOpened():
             raise IOError("Не удалось открыть видео")
         self.video_path = path
@@ -64,6 +220,164 @@ class VideoPlaybackController:
         self.set_navigation_bounds(0.0, self.total_duration_sec)
         self.playing = False
         self.speed = 1.0
+        self.decoder = SequentialFrameDecoder(path)
+        self.decoder.start(0)
+        self.keyframe_index = None
+        if not is_multi_segment(path):
+            # Индекс ключевых кадров и прокси строятся по одному файлу (ffprobe/ffmpeg)
+            self._start_keyframe_index_build(path, keyframe_index_path)
+            self.proxy_builder = ProxyBuilder(path, on_ready=self._on_proxy_ready)
+            self.proxy_builder.start()
+        self.prewarmer = FramePrewarmer(path, self.frame_cache)
+        self.prewarmer.start()
+        self._schedule_prewarm()
+        if thumbnail_atlas_paths:
+            self._start_thumbnail_atlas(path, *thumbnail_atlas_paths)
+
+    def _start_keyframe_index_build(self, path: str, sidecar_path: Optional[str]):
+        """Загружает или строит индекс ключевых кадров в фоновом потоке (однократно на видео)."""
+        fps = self.fps
+
+        def worker():
+            index = load_or_build_keyframe_index(path, sidecar_path, fps)
+            if self.video_path != path:
+                return # За время сканирования открыли другое видео
+            self.keyframe_index = index
+            if self.decoder and self.decoder.video_path == path:
+                self.decoder.keyframe_index = index
+            if self.reverse_decoder and self.reverse_decoder.video_path == path:
+                self.reverse_decoder.keyframe_index = index
+            if self.prewarmer and self.prewarmer.video_path == path:
+                self.prewarmer.keyframe_index = index
+            if self.thumbnail_builder and self.thumbnail_builder.video_path == path:
+                self.thumbnail_builder.keyframe_index = index
+
+        threading.Thread(target=worker, name="KeyframeIndexBuilder", daemon=True).start()
+
+    # --- Атлас миниатюр ---
+    def _start_thumbnail_atlas(self, path: str, atlas_path: str, meta_path: str):
+        """Открывает атлас (или создаёт пустой) и достраивает его в фоне."""
+        try:
+            self.thumbnail_atlas = ThumbnailAtlas.open_or_create(path, atlas_path, meta_path, self.total_duration_sec)
+        except (OSError, ValueError) as e:
+            print(f"[THUMBS] Атлас миниатюр недоступен: {e}")
+            return
+        self.thumbnail_builder = ThumbnailAtlasBuilder(path, self.thumbnail_atlas, self.fps)
+        self.thumbnail_builder.keyframe_index = self.keyframe_index
+        self.thumbnail_builder.start()
+
+    def _stop_thumbnail_builder(self):
+        if self.thumbnail_builder:
+            self.thumbnail_builder.stop()
+        self.thumbnail_builder = None
+        self.thumbnail_atlas = None
+
+    def thumbnail_at(self, global_time: float):
+        """Миниатюра (BGR 160x90) для глобального времени или None, если атлас ещё не дошёл до этого места."""
+        if not self.thumbnail_atlas:
+            return None
+        return self.thumbnail_atlas.thumbnail_at(global_time)
+
+    # --- Прокси ---
+    def _on_proxy_ready(self, proxy_path: str):
+        """Вызывается из фонового потока ProxyBuilder. Открытие прокси — в GUI-потоке (read_frame)."""
+        if self.proxy_builder and self.proxy_builder.proxy_path == proxy_path:
+            self._ready_proxy_path = proxy_path
+
+    def _release_proxy(self):
+        if self.proxy_cap:
+            self.proxy_cap.release()
+        self.proxy_cap = None
+        if self.proxy_builder:
+            self.proxy_builder.stop()
+        self.proxy_builder = None
+        self._ready_proxy_path = None
+        self.use_proxy = False
+
+    def set_prefer_proxy(self, prefer: bool):
+        """
+        Включает/выключает воспроизведение прокси. Оригинал используется в режиме "high".
+        Нумерация кадров общая, время не пересчитывается.
+        """
+        self.prefer_proxy = prefer
+        self._update_playback_source()
+
+    def _update_playback_source(self):
+        if self._ready_proxy_path and self.proxy_cap is None:
+            proxy_cap = cv2.VideoCapture(self._ready_proxy_path)
+            if proxy_cap.isOpened():
+                self.proxy_cap = proxy_cap
+            else:
+                print(f"[PROXY] Не удалось открыть прокси: {self._ready_proxy_path}")
+                self._ready_proxy_path = None
+        want_proxy = self.prefer_proxy and self.proxy_cap is not None
+        if want_proxy == self.use_proxy:
+            return
+        self.use_proxy = want_proxy
+        # Перезапускаем фоновый декодер на новом источнике с текущей позиции
+        if self.decoder:
+            self.decoder.stop()
+        self._stop_reverse_decoder()
+        self.decoder = SequentialFrameDecoder(self._playback_source_path())
+        if not self.use_proxy:
+            self.decoder.keyframe_index = self.keyframe_index
+        self.decoder.start(self.current_frame)
+
+    def _playback_source_path(self) -> str:
+        return self._ready_proxy_path if self.use_proxy else self.video_path
+
+    # --- Обратное воспроизведение ---
+    def _ensure_reverse_decoder(self) -> ReverseGopDecoder:
+        if self.reverse_decoder is None:
+            # Для прокси с коротким GOP индекс не нужен — блоки фиксированной длины
+            keyframe_index = None if self.use_proxy else self.keyframe_index
+            self.reverse_decoder = ReverseGopDecoder(self._playback_source_path(), keyframe_index)
+            self.reverse_decoder.start()
+        return self.reverse_decoder
+
+    def _stop_reverse_decoder(self):
+        if self.reverse_decoder:
+            self.reverse_decoder.stop()
+        self.reverse_decoder = None
+
+    # --- Кэш кадров и прогрев ---
+    def set_hotspot_times(self, times: List[float]):
+        """
+        Задаёт глобальные времена, к которым пользователь часто прыгает
+        (время меток, начала/концы диапазонов). Кадры рядом с текущей позицией прогреваются в кэш.
+        """
+        self.hotspot_times = sorted(set(times))
+        self._schedule_prewarm()
+
+    def _schedule_prewarm(self):
+        if not self.prewarmer or not self.hotspot_times:
+            return
+        times = nearest_hotspots(self.hotspot_times, self.current_time_sec, PREWARM_HOTSPOT_COUNT)
+        # Индекс кадра вычисляется так же, как в seek_to_time, чтобы переход попадал в кэш
+        self.prewarmer.request(
+            int(round(t * self.fps)) for t in times if 0.0 <= t <= self.total_duration_sec
+        )
+
+    def prefetch_ranges(self, ranges: List[Tuple[float, float]]):
+        """
+        Асинхронно декодирует в кэш кадров первые PREFETCH_RANGE_SECONDS каждого диапазона
+        (start, end) — в порядке списка. Переключение на эти диапазоны и старт воспроизведения
+        с их начала не требуют холодного seek.
+        """
+        if not self.prewarmer:
+            return
+        prefetch_frames = max(1, int(round(PREFETCH_RANGE_SECONDS * self.fps)))
+        indices = []
+        for start, end in ranges:
+            first = int(round(start * self.fps))
+            last = min(int(round(end * self.fps)), first + prefetch_frames - 1, self.total_frames - 1)
+            indices.extend(range(first, last + 1))
+        self.prewarmer.request_background(indices)
+
+    def _stop_prewarmer(self):
+        if self.prewarmer:
+            self.prewarmer.stop()
+        self.prewarmer = None
 
     def set_navigation_bounds(self, start_sec: float, end_sec: float):
         """
@@ -108,17 +422,54 @@ class VideoPlaybackController:
             self.set_speed(1.0)
         self.playing = not self.playing
         if self.playing:
-            self.last_frame_time = time.time()
+            self.reset_playback_stats()
+            self.reset_clock()
         else:
             self.last_frame_time = 0.0
 
-    def playback_step(self):
+    def reset_clock(self):
+        """Перезапускает часы воспроизведения с текущего момента (после перехода, смены скорости)."""
+        self.last_frame_time = time.perf_counter()
+
+    def playback_interval_ms(self) -> int:
+        """
+        Интервал тика для текущих fps и скорости: один кадр видео на тик.
+        Ниже MIN_TICK_MS не опускается — на высоких скоростях часть кадров пропускается.
+        """
+        frames_per_sec = self.fps * max(0.2, abs(self.speed))
+        return max(MIN_TICK_MS, int(1000.0 / frames_per_sec))
+
+    def reset_playback_stats(self):
+        self.presented_frames = 0
+        self.dropped_frames = 0
+        self.late_ticks = 0
+        self.idle_ticks = 0
+
+    def get_playback_stats(self) -> dict:
+        """Счётчики с момента запуска воспроизведения."""
+        return {
+            "presented": self.presented_frames,
+            "dropped": self.dropped_frames,
+            "late": self.late_ticks,
+            "idle": self.idle_ticks,
+        }
+
+    def playback_step(self) -> bool:
+        """
+        Продвигает часы воспроизведения.
+
+        Returns:
+            True, если сменился индекс кадра и его нужно декодировать и показать;
+            False, если кадр тот же (декодирование пропускается) или воспроизведение не идёт.
+        """
         if not self.cap or not self.playing:
-            return
+            return False
 
-        now = time.time()
+        now = time.perf_counter()
         elapsed = now - self.last_frame_time
         self.last_frame_time = now
+        if elapsed * 1000.0 > self.playback_interval_ms() * LATE_TICK_FACTOR:
+            self.late_ticks += 1
 
         self.current_time_sec += elapsed * self.speed
         # Ограничиваем время границами "схлопывания"
@@ -129,24 +480,87 @@ class VideoPlaybackController:
             self.current_time_sec = self.nav_end_global
             self.playing = False
 
-        self.current_frame = int(round(self.current_time_sec * self.fps))
+        new_frame = int(round(self.current_time_sec * self.fps))
+        if new_frame == self.current_frame:
+            self.idle_ticks += 1
+            return False
+        self.dropped_frames += abs(new_frame - self.current_frame) - 1
+        self.presented_frames += 1
+        self.current_frame = new_frame
+        return True
 
     def seek_to_time(self, seconds):
         # seconds - глобальное время
         self.current_time_sec = max(self.nav_start_global, min(self.nav_end_global, seconds))
         self.current_frame = int(round(self.current_time_sec * self.fps))
         # --- Новое: обновляем last_frame_time при ручной установке времени ---
-        self.last_frame_time = time.time()
+        self.reset_clock()
         # ---
+        self._schedule_prewarm()
 
     def seek_delta(self, delta_sec):
         new_time = self.current_time_sec + delta_sec
         self.seek_to_time(new_time)
      # --- Новое: обновляем last_frame_time при ручной установке времени ---
-        self.last_frame_time = time.time()
+        self.reset_clock()
     # ---
 
+    def read_frame(self, frame_index: int):
+        """
+        Возвращает кадр frame_index (BGR) или None.
+        Сначала пробует кольцевой буфер фонового декодера; настоящий seek делается,
+        только если кадр вне окна буфера (перемотка, прыжок ±300с, смена границ навигации).
+        Переходы к прогретым меткам и границам диапазонов отдаются из кэша кадров без seek.
+        """
+        if not self.cap:
+            return None
+        if self.prefer_proxy != self.use_proxy:
+            self._update_playback_source()
+        if not (self.playing and self.speed < 0):
+            cached = self.frame_cache.get(frame_index)
+            if cached is not None:
+                # Декодер догоняет позицию в фоне, чтобы продолжение воспроизведения шло без seek
+                if self.decoder:
+                    self.decoder.follow(frame_index)
+                return cached
+        if self.playing and self.speed < 0:
+            # Обратное воспроизведение: блок GOP декодирован вперёд и отдаётся с конца
+            frame = self._ensure_reverse_decoder().get_frame(frame_index)
+            if frame is not None:
+                return frame
+        else:
+            # Вперёд блоки GOP не нужны — освобождаем память
+            self._stop_reverse_decoder()
+            if self.decoder:
+                frame = self.decoder.get_frame(frame_index)
+                if frame is not None:
+                    return frame
+
+        # Seek к ближайшему ключевому кадру и ограниченное декодирование вперёд.
+        # Прокси с коротким GOP индекса не требует.
+        if self.use_proxy:
+            ret, frame = seek_and_read(self.proxy_cap, frame_index)
+        else:
+            ret, frame = seek_and_read(self.cap, frame_index, self.keyframe_index)
+        if not ret:
+            return None
+        # Переносим декодер на новую позицию (при обратном воспроизведении чтение вперёд бесполезно)
+        if self.decoder and not (self.playing and self.speed < 0):
+            self.decoder.reposition(frame_index, frame)
+        if not self.use_proxy and not self.playing:
+            # В кэше только кадры оригинала, уменьшенные до области отображения
+            self.frame_cache.put(frame_index, downscale_for_display(frame))
+        return frame
+
     def cleanup(self):
+        if self.decoder:
+            self.decoder.stop()
+        self.decoder = None
+        self._stop_reverse_decoder()
+        self._stop_prewarmer()
+        self.frame_cache.clear()
+        self._stop_thumbnail_builder()
+        self._release_proxy()
         if self.cap:
             self.cap.release()
         self.cap = None
@@ -155,7 +569,7 @@ class VideoPlayerWidget(QWidget):
     positionChanged = pyqtSignal(float)
     playbackStateChanged = pyqtSignal(bool)
     speedChanged = pyqtSignal(float)
-    videoLoaded = pyqtSignal(str, float, float)
+    videoLoaded = pyqtSignal(str, float, float) # Имя источника (файл или 'файл (+N файлов)'), длительность, fps
     pointHotkeyPressed = pyqtSignal() # <-- Новый сигнал Клавиша '1'
     # --- НОВОЕ: Сигналы для "прилипания" ---
     snapToPreviousRequested = pyqtSignal() # Клавиша '8'
@@ -168,6 +582,7 @@ class VideoPlayerWidget(QWidget):
         self.controller = VideoPlaybackController()
         self.display_mode = "high"
         self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.playback_step)
 
         self.init_ui()
@@ -177,12 +592,10 @@ class VideoPlayerWidget(QWidget):
         layout.setContentsMargins(20, 20, 20, 20)
         layout.setSpacing(10)
 
-        self.video_label = QLabel("Загрузите видео")
-        self.video_label.setAlignment(Qt.AlignCenter)
-        self.video_label.setStyleSheet("background-color: black; color: white;")
-        self.video_label.setFixedSize(1440, 810)
-        self.video_label.setCursor(Qt.PointingHandCursor)
-        layout.addWidget(self.video_label, alignment=Qt.AlignCenter)
+        self.video_view = VideoFrameView("Загрузите видео")
+        self.video_view.setFixedSize(1440, 810)
+        self.video_view.setCursor(Qt.PointingHandCursor)
+        layout.addWidget(self.video_view, alignment=Qt.AlignCenter)
 
         self.time_label = QLabel("00:00:00 / 00:00:00")
         self.time_label.setFont(QFont("Arial", 10))
@@ -193,7 +606,10 @@ class VideoPlayerWidget(QWidget):
         self.slider.setMinimum(0)
         self.slider.setMaximum(1000)
         self.slider.sliderReleased.connect(self.on_slider_released)
+        self.slider.hoverValueChanged.connect(self.on_slider_hover)
+        self.slider.hoverLeft.connect(self.hide_thumbnail_preview)
         layout.addWidget(self.slider)
+        self.thumbnail_preview = ThumbnailPreview(self)
 
         ctrl_layout = QHBoxLayout()
         ctrl_layout.setSpacing(10)
@@ -243,17 +659,29 @@ class VideoPlayerWidget(QWidget):
     def on_quality_changed(self, index):
         modes = ["low", "medium", "high"]
         self.display_mode = modes[index]
+        # В режимах "low"/"medium" играем прокси (если уже готов), в "high" — оригинал
+        self.controller.set_prefer_proxy(self.display_mode != "high")
         self.show_current_frame()
 
-    def load_video(self, path):
+    def load_video(self, path, keyframe_index_path: Optional[str] = None,
+                   thumbnail_atlas_paths: Optional[Tuple[str, str]] = None):
         try:
-            self.controller.load_video(path)
-            self.videoLoaded.emit(path, self.controller.total_duration_sec, self.controller.fps)
+            self.controller.load_video(path, keyframe_index_path, thumbnail_atlas_paths)
+            # path может быть списком VideoSegment — сигнал передаёт строку с именем источника
+            self.videoLoaded.emit(source_label(path), self.controller.total_duration_sec, self.controller.fps)
             self.update_ui()
             self.show_current_frame()
         except IOError as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось открыть видео:\n{str(e)}")
 
+    def set_hotspot_times(self, times: List[float]):
+        """Передаёт контроллеру времена меток и границ диапазонов для прогрева кэша кадров."""
+        self.controller.set_hotspot_times(times)
+
+    def prefetch_ranges(self, ranges: List[Tuple[float, float]]):
+        """Фоновая предвыборка начала диапазонов в кэш кадров (см. VideoPlaybackController.prefetch_ranges)."""
+        self.controller.prefetch_ranges(ranges)
+
     def set_navigation_bounds(self, start_sec: float, end_sec: float):
         """Устанавливает границы навигации через контроллер."""
         self.controller.set_navigation_bounds(start_sec, end_sec)
@@ -264,24 +692,36 @@ class VideoPlayerWidget(QWidget):
         self.play_btn.setText("⏸ Pause" if self.controller.playing else "▶ Play")
         self.playbackStateChanged.emit(self.controller.playing)
         if self.controller.playing:
-            self.timer.start(20)
+            self._restart_playback_timer()
         else:
-            self.timer.stop()
+            self._stop_playback_timer()
         self.update_ui()
 
+    def _restart_playback_timer(self):
+        """Интервал таймера выводится из fps видео и скорости (см. playback_interval_ms)."""
+        self.timer.start(self.controller.playback_interval_ms())
+
+    def _stop_playback_timer(self):
+        self.timer.stop()
+        stats = self.controller.get_playback_stats()
+        if stats["dropped"] or stats["late"]:
+            print(f"[PLAYBACK] Показано: {stats['presented']}, пропущено кадров: {stats['dropped']}, "
+                  f"опоздавших тиков: {stats['late']}, тиков без смены кадра: {stats['idle']}")
+
     def toggle_reverse(self):
         # --- Изменение: умножаем текущую скорость на -1 ---
         new_speed = -self.controller.speed
         self.controller.set_speed(new_speed) # set_speed уже обновляет self.controller.speed
         # --- Новое: обновляем last_frame_time ---
-        self.controller.last_frame_time = time.time()
+        self.controller.reset_clock()
         # ---
         self.update_speed_ui()
+        if not self.controller.playing:
+            self.controller.reset_playback_stats()
         self.controller.playing = True
         self.play_btn.setText("⏸ Pause")
         self.playbackStateChanged.emit(True)
-        if not self.timer.isActive():
-            self.timer.start(20)
+        self._restart_playback_timer()
 
     # --- Новое: выносим обновление UI скорости в отдельный метод ---
     def update_speed_ui(self):
@@ -295,44 +735,34 @@ class VideoPlayerWidget(QWidget):
         self.update_speed_ui()
         # ---
         if self.controller.playing:
-            self.controller.last_frame_time = time.time() # Обновить таймер при смене скорости
+            self.controller.reset_clock() # Обновить таймер при смене скорости
+            self._restart_playback_timer() # Интервал тика зависит от скорости
         self.update_ui()
 
     def playback_step(self):
-        self.controller.playback_step()
-        self.show_current_frame()
-        self.update_ui()
-        self.positionChanged.emit(self.controller.current_time_sec)
+        if self.controller.playback_step():
+            self.show_current_frame()
+            self.update_ui()
+            self.positionChanged.emit(self.controller.current_time_sec)
+        if not self.controller.playing:
+            # Достигнута граница области навигации
+            self._stop_playback_timer()
+            self.play_btn.setText("▶ Play")
+            self.playbackStateChanged.emit(False)
 
     def show_current_frame(self):
         if not self.controller.cap:
             return
-        self.controller.cap.set(cv2.CAP_PROP_POS_FRAMES, self.controller.current_frame)
-        ret, frame = self.controller.cap.read()
-        if not ret:
+        frame = self.controller.read_frame(self.controller.current_frame)
+        if frame is None:
             return
-        h_orig, w_orig = frame.shape[:2]
         if self.display_mode == "low":
-            render_w, render_h = 480, 270
+            render_size = (480, 270)
         elif self.display_mode == "medium":
-            render_w, render_h = 960, 540
+            render_size = (960, 540)
         else:
-            if w_orig > 1440 or h_orig > 810:
-                scale = min(1440 / w_orig, 810 / h_orig)
-                render_w = int(w_orig * scale)
-                render_h = int(h_orig * scale)
-            else:
-                render_w, render_h = w_orig, h_orig
-
-        if (w_orig, h_orig) != (render_w, render_h):
-            frame = cv2.resize(frame, (render_w, render_h), interpolation=cv2.INTER_AREA)
-
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb.shape
-        qt_img = QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(qt_img)
-        scaled_pixmap = pixmap.scaled(1440, 810, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        self.video_label.setPixmap(scaled_pixmap)
+            render_size = None  # Сразу до размера области отображения
+        self.video_view.set_frame(frame, render_size)
 
     def update_ui(self):
         # Отображаем локальное время для текущей области "схлопывания"
@@ -356,7 +786,25 @@ class VideoPlayerWidget(QWidget):
         self.slider.setValue(slider_val)
         self.slider.blockSignals(False)
 
+    def thumbnail_at(self, global_time: float):
+        """Миниатюра из атласа для глобального времени (для предпросмотра в TimelineWidget)."""
+        return self.controller.thumbnail_at(global_time)
+
+    def on_slider_hover(self, value: int, x: int):
+        """Предпросмотр кадра под курсором слайдера (наведение и перетаскивание) из атласа миниатюр."""
+        local_time = max(0.0, min(self.controller.nav_duration, value / 10.0))
+        thumb = self.controller.thumbnail_at(self.controller.nav_start_local + local_time)
+        if thumb is None:
+            self.hide_thumbnail_preview()
+            return
+        anchor = self.slider.mapToGlobal(QPoint(x, 0))
+        self.thumbnail_preview.show_thumbnail(thumb, format_hms(local_time), anchor)
+
+    def hide_thumbnail_preview(self):
+        self.thumbnail_preview.hide()
+
     def on_slider_released(self):
+        self.hide_thumbnail_preview()
         # Получаем значение слайдера в локальных координатах
         local_time = self.slider.value() / 10.0
         # Преобразуем в глобальное время
@@ -467,7 +915,7 @@ class VideoPlayerWidget(QWidget):
 
     def mousePressEvent(self, event: QMouseEvent):
         if event.button() == Qt.LeftButton:
-            if self.video_label.geometry().contains(event.pos()):
+            if self.video_view.geometry().contains(event.pos()):
                 self.toggle_play()
         super().mousePressEvent(event)
 
@@ -0,0 +1,110 @@
+# utils/batch_journal.py
+"""
+Журнал (checkpoint) автоматической разметки одного проекта для возобновляемой пакетной обработки.
+Лежит рядом с .hkt ('матч.hkt' -> 'матч.autodraft.json') и хранит результаты детекторов
+по каждому завершённому диапазону поиска (Сегменту). Повторный запуск с теми же параметрами
+пропускает готовые диапазоны и готовые файлы целиком, поэтому падение на 9-м файле из 12
+не заставляет пересчитывать первые восемь и уже пройденные периоды девятого.
+"""
+
+import os
+import json
+import hashlib
+from typing import List, Tuple, Optional, Dict, Any
+
+JOURNAL_SUFFIX = ".autodraft.json"
+# Параметры, не влияющие на результат детекции (не входят в подпись журнала)
+_SIGNATURE_IGNORED_KEYS = ("parallel_workers", "batch_workers", "skip_strategy")
+
+
+def journal_path_for_project(hkt_file_path: str) -> str:
+    return os.path.splitext(hkt_file_path)[0] + JOURNAL_SUFFIX
+
+
+def params_signature(template_png_path: Any, osg_params: Dict[str, Any], analysis_params: Dict[str, Any]) -> str:
+    """Подпись параметров анализа: журнал с другой подписью не используется."""
+    params = {k: v for k, v in analysis_params.items() if k not in _SIGNATURE_IGNORED_KEYS}
+    payload = json.dumps([template_png_path, osg_params, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _range_key(search_range: Tuple[float, float]) -> str:
+    return f"{search_range[0]:.3f}-{search_range[1]:.3f}"
+
+
+class ProjectJournal:
+    """
+    Результаты детекции по диапазонам {"start-end": {"osg": [...], "footage": [...]}} и отметка о завершении.
+    done_mtime — mtime .hkt после сохранения меток: если проект потом изменился, файл считается незавершённым
+    (готовые диапазоны при этом переиспользуются).
+    """
+    def __init__(self, path: str, signature: str):
+        self.path: str = path
+        self.signature: str = signature
+        self.ranges: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self.done_mtime: Optional[float] = None
+
+    @classmethod
+    def load(cls, hkt_file_path: str, signature: str) -> 'ProjectJournal':
+        """Загружает журнал проекта; если его нет или параметры изменились — пустой журнал."""
+        journal = cls(journal_path_for_project(hkt_file_path), signature)
+        if not os.path.exists(journal.path):
+            return journal
+        try:
+            with open(journal.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[JOURNAL] Не удалось прочитать журнал {journal.path}: {e}")
+            return journal
+        if data.get("signature") != signature:
+            print(f"[JOURNAL] Параметры анализа изменились — журнал {os.path.basename(journal.path)} не используется.")
+            return journal
+        journal.ranges = data.get("ranges", {})
+        journal.done_mtime = data.get("done_mtime")
+        return journal
+
+    def save(self) -> None:
+        data = {"signature": self.signature, "ranges": self.ranges, "done_mtime": self.done_mtime}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[JOURNAL] Не удалось сохранить журнал {self.path}: {e}")
+
+    def is_done(self, hkt_file_path: str) -> bool:
+        """Файл уже размечен с этими параметрами и с тех пор не менялся."""
+        try:
+            mtime = os.path.getmtime(hkt_file_path)
+        except OSError:
+            return False
+        return self.done_mtime is not None and abs(mtime - self.done_mtime) < 1e-3
+
+    def has_range(self, search_range: Tuple[float, float]) -> bool:
+        return _range_key(search_range) in self.ranges
+
+    def record_range(self, search_range: Tuple[float, float], osg_results: List[Dict[str, Any]],
+                     footage_results: List[Dict[str, Any]]) -> None:
+        """Запоминает результаты диапазона и сразу сохраняет журнал."""
+        self.ranges[_range_key(search_range)] = {"osg": osg_results, "footage": footage_results}
+        self.done_mtime = None
+        self.save()
+
+    def results_for(self, search_ranges: List[Tuple[float, float]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Результаты OSD и футажей по диапазонам из журнала (в порядке search_ranges)."""
+        osg_results: List[Dict[str, Any]] = []
+        footage_results: List[Dict[str, Any]] = []
+        for search_range in search_ranges:
+            entry = self.ranges.get(_range_key(search_range))
+            if entry is not None:
+                osg_results.extend(entry["osg"])
+                footage_results.extend(entry["footage"])
+        return osg_results, footage_results
+
+    def mark_done(self, hkt_file_path: str) -> None:
+        try:
+            self.done_mtime = os.path.getmtime(hkt_file_path)
+        except OSError:
+            self.done_mtime = None
+        self.save()
@@ -0,0 +1,217 @@
+# utils/fingerprint_index.py
+"""
+Индекс "отпечатков" кадров видео для повторного поиска футажей без декодирования.
+Для каждого FINGERPRINT_STEP-го кадра хранится уменьшенный серый кадр 32x32 (uint8)
+в memory-mapped .npy рядом с видео; метаданные (пути, размер, mtime, fps, шаг) — в JSON.
+Индекс строится один раз за проход по видео; после этого поиск шаблонов с любым порогом,
+размером сравнения или новым PNG — это векторное сравнение NumPy по всему массиву (секунды).
+"""
+
+import os
+import json
+from typing import List, Tuple, Optional, Callable, Dict, Any
+
+import cv2
+import numpy as np
+
+from utils.virtual_video import open_video_capture, source_files, source_label, source_stat, VideoSource
+
+FINGERPRINT_SIZE = (32, 32)  # (ширина, высота) хранимого отпечатка
+FINGERPRINT_STEP = 5         # Отпечаток каждого n-го кадра (5 при 25 fps = 0.2 с)
+INDEX_SUFFIX = ".fingerprints.npy"
+INDEX_META_SUFFIX = ".fingerprints.json"
+# Как часто (в отпечатках) сбрасывать индекс на диск и обновлять метаданные
+FLUSH_EVERY = 2000
+# Сколько отпечатков сравнивать за один векторный шаг (ограничивает временную память int16)
+COMPARE_CHUNK = 4000
+
+
+def fingerprint_paths_for_source(source: VideoSource) -> Tuple[str, str]:
+    """Пути к индексу и его метаданным рядом с (первым) видеофайлом: 'матч.mp4' -> 'матч.fingerprints.npy'."""
+    files = source_files(source)
+    base = os.path.splitext(files[0])[0]
+    if len(files) > 1:
+        base += f".{len(files)}files"
+    return base + INDEX_SUFFIX, base + INDEX_META_SUFFIX
+
+
+def _compute_fingerprint(frame: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def _downscale_fingerprints(prints: np.ndarray, resize: Tuple[int, int]) -> np.ndarray:
+    """Приводит отпечатки (n, 32, 32) к размеру сравнения resize (ширина, высота)."""
+    width, height = resize
+    src_width, src_height = FINGERPRINT_SIZE
+    if (width, height) == FINGERPRINT_SIZE:
+        return prints
+    if src_width % width == 0 and src_height % height == 0:
+        # INTER_AREA при целом коэффициенте — среднее по блокам, считаем сразу для всего блока кадров
+        fy, fx = src_height // height, src_width // width
+        blocks = prints.reshape(len(prints), height, fy, width, fx).astype(np.float32)
+        return np.rint(blocks.mean(axis=(2, 4))).astype(np.uint8)
+    return np.stack([cv2.resize(p, resize, interpolation=cv2.INTER_AREA) for p in prints])
+
+
+class FingerprintIndex:
+    """
+    Массив отпечатков (count, 32, 32) uint8; отпечаток i — кадр i * step.
+    Заполняется по порядку; built_count — сколько первых отпечатков уже готово.
+    """
+    def __init__(self, index_path: str, meta_path: str, meta: Dict[str, Any], prints: np.ndarray):
+        self.index_path: str = index_path
+        self.meta_path: str = meta_path
+        self.meta: Dict[str, Any] = meta
+        self.prints: np.ndarray = prints
+        self.fps: float = meta["fps"]
+        self.step: int = meta["step"]
+        self.count: int = meta["count"]
+        self.built_count: int = meta.get("built_count", 0)
+
+    @classmethod
+    def open_or_create(cls, source: VideoSource, index_path: str, meta_path: str, fps: float, total_frames: int,
+                       step: int = FINGERPRINT_STEP) -> 'FingerprintIndex':
+        """
+        Открывает существующий индекс, если он построен для этого же видео (пути, размер, mtime) с теми же
+        параметрами, иначе создаёт пустой .npy нужного размера.
+        """
+        video_size, video_mtime = source_stat(source)
+        meta = {
+            "video_path": source_files(source),
+            "video_size": video_size,
+            "video_mtime": video_mtime,
+            "fps": fps,
+            "step": step,
+            "width": FINGERPRINT_SIZE[0],
+            "height": FINGERPRINT_SIZE[1],
+            "count": max(1, (total_frames + step - 1) // step),
+            "built_count": 0,
+        }
+
+        if os.path.exists(index_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                same = all(saved.get(k) == meta[k] for k in ("video_path", "video_size", "step", "width", "height", "count"))
+                same = same and abs(saved.get("video_mtime", 0.0) - meta["video_mtime"]) < 1e-3
+                if same:
+                    prints = np.load(index_path, mmap_mode='r+')
+                    if prints.shape == (meta["count"], FINGERPRINT_SIZE[1], FINGERPRINT_SIZE[0]):
+                        meta["built_count"] = min(saved.get("built_count", 0), meta["count"])
+                        return cls(index_path, meta_path, meta, prints)
+                print("[FINGERPRINTS] Индекс устарел (видео или параметры изменились), строим заново.")
+            except (OSError, ValueError) as e:
+                print(f"[FINGERPRINTS] Не удалось открыть индекс {index_path}: {e}")
+
+        prints = np.lib.format.open_memmap(
+            index_path, mode='w+', dtype=np.uint8,
+            shape=(meta["count"], FINGERPRINT_SIZE[1], FINGERPRINT_SIZE[0])
+        )
+        index = cls(index_path, meta_path, meta, prints)
+        index.save_meta()
+        return index
+
+    @property
+    def is_complete(self) -> bool:
+        return self.built_count >= self.count
+
+    def save_meta(self) -> None:
+        self.meta["built_count"] = self.built_count
+        try:
+            with open(self.meta_path, 'w', encoding='utf-8') as f:
+                json.dump(self.meta, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"[FINGERPRINTS] Не удалось сохранить метаданные индекса {self.meta_path}: {e}")
+
+    def flush(self) -> None:
+        """Сбрасывает отпечатки на диск, затем обновляет счётчик готовых (в таком порядке — для докачки)."""
+        if isinstance(self.prints, np.memmap):
+            self.prints.flush()
+        self.save_meta()
+
+    def build(self, source: VideoSource, progress_callback: Optional[Callable[[int, int], None]] = None) -> None:
+        """
+        Досчитывает отпечатки с built_count до конца видео одним последовательным проходом:
+        кадры между отпечатками пропускаются через grab() без retrieve().
+        """
+        if self.is_complete:
+            return
+        cap = open_video_capture(source)
+        if not cap.isOpened():
+            raise ValueError(f"Не удалось открыть видео: {source}")
+        print(f"[FINGERPRINTS] Построение индекса отпечатков: {self.count - self.built_count} шт. ({source_label(source)})")
+        try:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.built_count * self.step)
+            for idx in range(self.built_count, self.count):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self.prints[idx] = _compute_fingerprint(frame)
+                self.built_count = idx + 1
+                if self.built_count % FLUSH_EVERY == 0:
+                    self.flush()
+                if progress_callback and (self.built_count % 100 == 0 or self.is_complete):
+                    progress_callback(self.built_count, self.count)
+                if idx + 1 < self.count and not all(cap.grab() for _ in range(self.step - 1)):
+                    break
+        finally:
+            cap.release()
+            self.flush()
+        if not self.is_complete:
+            # Обычно видео короче заявленного FRAME_COUNT; поиск работает по построенной части
+            print(f"[FINGERPRINTS] Построено {self.built_count} из {self.count} отпечатков.")
+
+    def match_bank(
+        self,
+        bank: np.ndarray,
+        resize: Tuple[int, int],
+        frame_ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Векторное сравнение построенных отпечатков с банком шаблонов (шаблоны, h, w) размера resize.
+        Схожесть та же, что у покадрового поиска: 1 - mean|кадр - шаблон| / 255.
+        Кадры выборки — каждый step-й кадр видео внутри frame_ranges.
+
+        Returns:
+            (индексы кадров (n,), схожесть (n, шаблоны) float32) — в порядке времени.
+        """
+        frame_indices = np.arange(self.built_count, dtype=np.int64) * self.step
+        in_ranges = np.ones(self.built_count, dtype=bool)
+        if frame_ranges is not None:
+            in_ranges[:] = False
+            for start_frame, end_frame in frame_ranges:
+                in_ranges |= (frame_indices >= start_frame) & (frame_indices < end_frame)
+
+        bank = bank.astype(np.int16)
+        similarity = np.empty((self.built_count, len(bank)), dtype=np.float32)
+        for start in range(0, self.built_count, COMPARE_CHUNK):
+            chunk = _downscale_fingerprints(np.asarray(self.prints[start:start + COMPARE_CHUNK]), resize)
+            diff = np.abs(chunk[:, None].astype(np.int16) - bank[None])
+            similarity[start:start + len(chunk)] = 1.0 - diff.mean(axis=(2, 3)) / 255.0
+        return frame_indices[in_ranges], similarity[in_ranges]
+
+
+def load_or_build_fingerprint_index(
+    source: VideoSource,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    step: int = FINGERPRINT_STEP
+) -> Optional[FingerprintIndex]:
+    """
+    Открывает индекс отпечатков рядом с видео и достраивает его при необходимости.
+
+    Returns:
+        FingerprintIndex или None, если видео не открывается.
+    """
+    cap = open_video_capture(source)
+    if not cap.isOpened():
+        print(f"[FINGERPRINTS] Не удалось открыть видео: {source}")
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    index_path, meta_path = fingerprint_paths_for_source(source)
+    index = FingerprintIndex.open_or_create(source, index_path, meta_path, fps, total_frames, step)
+    index.build(source, progress_callback)
+    return index
@@ -0,0 +1,176 @@
+# utils/frame_cache.py
+"""
+Кэш декодированных и уменьшенных кадров для мгновенных переходов плеера.
+LRU с ограничением по памяти (в МБ), ключ — индекс кадра.
+Прогрев кэша выполняется в фоне вокруг "горячих точек" навигации:
+времён меток GenericLabel и границ CalculatedRange рядом с текущей позицией.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import List, Optional, Iterable
+
+import cv2
+
+from utils.keyframe_index import KeyframeIndex, seek_and_read
+from utils.virtual_video import open_video_capture
+
+DEFAULT_CACHE_BUDGET_MB = 512
+# Размер, до которого уменьшаются кадры в кэше (область отображения плеера)
+DISPLAY_MAX_SIZE = (1440, 810)
+
+
+def downscale_for_display(frame, max_size=DISPLAY_MAX_SIZE):
+    """Уменьшает кадр, чтобы он вписывался в max_size (ширина, высота). Меньшие кадры не трогает."""
+    h, w = frame.shape[:2]
+    max_w, max_h = max_size
+    if w <= max_w and h <= max_h:
+        return frame
+    scale = min(max_w / w, max_h / h)
+    return cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+class FrameLRUCache:
+    """
+    Потокобезопасный LRU-кэш кадров с бюджетом памяти.
+    При превышении бюджета вытесняются давно не использованные кадры.
+    """
+    def __init__(self, budget_mb: float = DEFAULT_CACHE_BUDGET_MB):
+        self.budget_bytes: int = int(budget_mb * 1024 * 1024)
+        self.used_bytes: int = 0
+        self._frames: "OrderedDict[int, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        # --- Счётчики для отладки ---
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, frame_index: int):
+        """Возвращает кадр или None; найденный кадр становится самым свежим."""
+        with self._lock:
+            frame = self._frames.get(frame_index)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(frame_index)
+            self.hits += 1
+            return frame
+
+    def put(self, frame_index: int, frame) -> None:
+        """Добавляет кадр и вытесняет старые до укладывания в бюджет."""
+        size = frame.nbytes
+        if size > self.budget_bytes:
+            return
+        with self._lock:
+            old = self._frames.pop(frame_index, None)
+            if old is not None:
+                self.used_bytes -= old.nbytes
+            self._frames[frame_index] = frame
+            self.used_bytes += size
+            while self.used_bytes > self.budget_bytes and self._frames:
+                _, evicted = self._frames.popitem(last=False)
+                self.used_bytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self.used_bytes = 0
+
+    def __contains__(self, frame_index: int) -> bool:
+        with self._lock:
+            return frame_index in self._frames
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._frames)
+
+
+def nearest_hotspots(sorted_times: List[float], current_time: float, count: int) -> List[float]:
+    """
+    Возвращает до count времён из отсортированного списка, ближайших к current_time
+    (поочерёдно слева и справа, ближайшие первыми).
+    """
+    result = []
+    right = bisect_left(sorted_times, current_time)
+    left = right - 1
+    while len(result) < count and (left >= 0 or right < len(sorted_times)):
+        take_left = right >= len(sorted_times) or (
+            left >= 0 and current_time - sorted_times[left] <= sorted_times[right] - current_time
+        )
+        if take_left:
+            result.append(sorted_times[left])
+            left -= 1
+        else:
+            result.append(sorted_times[right])
+            right += 1
+    return result
+
+
+class FramePrewarmer:
+    """
+    Фоновый поток, декодирующий заданные кадры в FrameLRUCache.
+    Две очереди: "горячие точки" рядом с текущей позицией (request) и фоновая предвыборка
+    начала диапазонов (request_background), которая обрабатывается, когда первая пуста.
+    Каждый новый запрос заменяет ещё не обработанную очередь своего вида.
+    """
+    def __init__(self, video_path: str, cache: FrameLRUCache, keyframe_index: Optional[KeyframeIndex] = None):
+        self.video_path: str = video_path
+        self.cache: FrameLRUCache = cache
+        self.keyframe_index: Optional[KeyframeIndex] = keyframe_index
+        self._pending: List[int] = []
+        self._background_pending: List[int] = []
+        self._cond = threading.Condition()
+        self._stopped: bool = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="FramePrewarmer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._pending = []
+            self._background_pending = []
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def request(self, frame_indices: Iterable[int]) -> None:
+        """Ставит кадры в очередь прогрева (уже закэшированные пропускаются)."""
+        with self._cond:
+            self._pending = [idx for idx in frame_indices if idx not in self.cache]
+            self._cond.notify_all()
+
+    def request_background(self, frame_indices: Iterable[int]) -> None:
+        """Ставит кадры в фоновую очередь (обрабатывается после очереди горячих точек)."""
+        with self._cond:
+            self._background_pending = [idx for idx in frame_indices if idx not in self.cache]
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        cap = open_video_capture(self.video_path)
+        if not cap.isOpened():
+            print(f"[FRAME_CACHE] Не удалось открыть видео: {self.video_path}")
+            return
+        last_index = None  # Последний прочитанный кадр: соседние кадры читаются без seek
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopped or bool(self._pending) or bool(self._background_pending))
+                    if self._stopped:
+                        break
+                    queue = self._pending if self._pending else self._background_pending
+                    frame_index = queue.pop(0)
+                if frame_index in self.cache:
+                    continue
+                if last_index is not None and frame_index == last_index + 1:
+                    ret, frame = cap.read()
+                else:
+                    ret, frame = seek_and_read(cap, frame_index, self.keyframe_index)
+                last_index = frame_index if ret else None
+                if ret:
+                    self.cache.put(frame_index, downscale_for_display(frame))
+        finally:
+            cap.release()
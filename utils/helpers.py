@@ -1,6 +1,11 @@
 # utils/helpers.py
 import json
-from typing import Dict, Any, List, Tuple, Optional
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple, Optional, Sequence, Union
+
+import numpy as np
+
 from model.project import Project, CalculatedRange
 
 def load_project_from_file(file_path: str) -> Project:
@@ -152,9 +157,172 @@ def map_global_time_to_official(global_time: float, official_timeline_map: List[
     # Время не попадает в ЧИИ
     return None
 
+class OfficialTimeMap:
+    """
+    Неизменяемая карта "глобальное -> официальное время", построенная один раз по calculated_ranges
+    (через create_official_time_map). Хранит отсортированные кортежи начал/концов ЧИИ, их официальных
+    начал и коэффициентов; перевод времени — двоичный поиск (bisect) за O(log n) вместо линейного прохода.
+    Результат совпадает с map_global_time_to_official, в том числе при перекрывающихся ЧИИ
+    (берётся первый по началу ЧИИ, содержащий время).
+    Обратный перевод (официальное/протокольное время -> глобальное) — to_global, тоже bisect:
+    официальная шкала непрерывна и уже учитывает коэффициенты периодов, овертайм идёт за третьим периодом.
+    Пакетные методы to_official_array / to_global_array переводят массивы NumPy через np.searchsorted.
+    """
+    __slots__ = ("global_starts", "global_ends", "official_starts", "official_ends", "coefficients",
+                 "period_names", "period_info", "_max_ends", "_arrays")
+
+    def __init__(self, official_timeline_map: List[Dict[str, float]], period_info: Dict[str, Dict[str, float]]):
+        self.global_starts: Tuple[float, ...] = tuple(seg['global_start'] for seg in official_timeline_map)
+        self.global_ends: Tuple[float, ...] = tuple(seg['global_end'] for seg in official_timeline_map)
+        self.official_starts: Tuple[float, ...] = tuple(seg['official_start'] for seg in official_timeline_map)
+        self.coefficients: Tuple[float, ...] = tuple(seg['coefficient'] for seg in official_timeline_map)
+        self.official_ends: Tuple[float, ...] = tuple(
+            seg['official_start'] + (seg['global_end'] - seg['global_start']) / seg['coefficient']
+            for seg in official_timeline_map
+        )
+        self.period_info: Dict[str, Dict[str, float]] = period_info
+        # Период (имя Сегмента) каждого ЧИИ — тем же правилом, что в create_official_time_map
+        self.period_names: Tuple[Optional[str], ...] = tuple(
+            next((name for name, info in period_info.items()
+                  if info["start_sec"] <= seg['global_start'] <= info["end_sec"]), None)
+            for seg in official_timeline_map
+        )
+        # Максимум концов ЧИИ с начала карты (неубывающий): первый ЧИИ, закончившийся не раньше времени
+        max_ends = []
+        running = -float('inf')
+        for end in self.global_ends:
+            running = max(running, end)
+            max_ends.append(running)
+        self._max_ends: Tuple[float, ...] = tuple(max_ends)
+        self._arrays: Optional[Dict[str, np.ndarray]] = None
+
+    @classmethod
+    def from_ranges(cls, calculated_ranges: List[CalculatedRange]) -> 'OfficialTimeMap':
+        return cls(*create_official_time_map(calculated_ranges))
+
+    def __len__(self) -> int:
+        return len(self.global_starts)
+
+    def segment_index(self, global_time: float) -> Optional[int]:
+        """Индекс ЧИИ в карте, содержащего global_time, или None."""
+        last_started = bisect_right(self.global_starts, global_time) - 1
+        if last_started < 0:
+            return None
+        # Первый ЧИИ (по началу), чей конец >= global_time; среди уже начавшихся он и содержит время
+        first_not_ended = bisect_left(self._max_ends, global_time)
+        return first_not_ended if first_not_ended <= last_started else None
+
+    def to_official(self, global_time: float) -> Optional[float]:
+        """Официальное время (округлено до 0.1) или None, если время не попадает в ЧИИ."""
+        idx = self.segment_index(global_time)
+        if idx is None:
+            return None
+        offset_official = (global_time - self.global_starts[idx]) / self.coefficients[idx]
+        return round(self.official_starts[idx] + offset_official, 1)
+
+    def official_segment_index(self, official_time: float) -> Optional[int]:
+        """
+        Индекс ЧИИ, содержащего официальное время, или None (до начала или после конца шкалы).
+        Время на стыке двух ЧИИ (в том числе 20:00 между периодами) относится к концу первого.
+        """
+        if official_time < 0.0:
+            return None
+        idx = bisect_left(self.official_ends, official_time)
+        return idx if idx < len(self) else None
+
+    def to_global(self, official_time: float) -> Optional[float]:
+        """Глобальное время для официального (протокольного) или None, если оно вне шкалы."""
+        idx = self.official_segment_index(official_time)
+        if idx is None:
+            return None
+        return self.global_starts[idx] + (official_time - self.official_starts[idx]) * self.coefficients[idx]
+
+    def period_name(self, idx: int) -> Optional[str]:
+        """Имя периода (Сегмента), к которому относится ЧИИ с индексом idx."""
+        return self.period_names[idx]
+
+    def _np(self) -> Dict[str, np.ndarray]:
+        """Границы карты как массивы float64 (создаются при первом пакетном запросе)."""
+        if self._arrays is None:
+            self._arrays = {
+                "starts": np.asarray(self.global_starts, dtype=np.float64),
+                "coefficients": np.asarray(self.coefficients, dtype=np.float64),
+                "official_starts": np.asarray(self.official_starts, dtype=np.float64),
+                "official_ends": np.asarray(self.official_ends, dtype=np.float64),
+                "max_ends": np.asarray(self._max_ends, dtype=np.float64),
+            }
+        return self._arrays
+
+    def to_official_array(self, global_times: Union[Sequence[float], np.ndarray]) -> np.ndarray:
+        """
+        Пакетный to_official: массив глобальных времён -> официальные (округлены до 0.1),
+        NaN там, где время не попадает в ЧИИ.
+        """
+        times = np.asarray(global_times, dtype=np.float64)
+        result = np.full(times.shape, np.nan)
+        if not len(self):
+            return result
+        arrays = self._np()
+        last_started = np.searchsorted(arrays["starts"], times, side='right') - 1
+        first_not_ended = np.searchsorted(arrays["max_ends"], times, side='left')
+        inside = (last_started >= 0) & (first_not_ended <= last_started)
+        idx = first_not_ended[inside]
+        official = arrays["official_starts"][idx] + (times[inside] - arrays["starts"][idx]) / arrays["coefficients"][idx]
+        result[inside] = np.round(official, 1)
+        return result
+
+    def to_global_array(self, official_times: Union[Sequence[float], np.ndarray]) -> np.ndarray:
+        """
+        Пакетный to_global: официальные времена -> глобальные, NaN вне шкалы официального времени.
+        """
+        times = np.asarray(official_times, dtype=np.float64)
+        result = np.full(times.shape, np.nan)
+        if not len(self):
+            return result
+        arrays = self._np()
+        idx = np.searchsorted(arrays["official_ends"], times, side='left')
+        inside = (times >= 0.0) & (idx < len(self))
+        idx = idx[inside]
+        result[inside] = arrays["starts"][idx] + (times[inside] - arrays["official_starts"][idx]) * arrays["coefficients"][idx]
+        return result
+
+
+# Карты по id списка calculated_ranges; версия (содержимое Сегментов и ЧИИ) защищает
+# от изменений списка на месте и от повторного использования id после удаления списка
+_OFFICIAL_TIME_MAP_CACHE: "OrderedDict[int, Tuple[Tuple, OfficialTimeMap]]" = OrderedDict()
+_OFFICIAL_TIME_MAP_CACHE_SIZE = 32
+
+
+def _official_ranges_version(calculated_ranges: List[CalculatedRange]) -> Tuple:
+    return tuple(
+        (cr.id, cr.label_type, cr.name, cr.start_time, cr.end_time)
+        for cr in calculated_ranges if cr.label_type in ("Сегмент", "ЧИИ")
+    )
+
+
+def get_official_time_map(calculated_ranges: List[CalculatedRange]) -> OfficialTimeMap:
+    """
+    Карта официального времени для calculated_ranges: строится один раз и переиспользуется,
+    пока список и его Сегменты/ЧИИ не изменились.
+    """
+    key = id(calculated_ranges)
+    version = _official_ranges_version(calculated_ranges)
+    cached = _OFFICIAL_TIME_MAP_CACHE.get(key)
+    if cached is not None and cached[0] == version:
+        _OFFICIAL_TIME_MAP_CACHE.move_to_end(key)
+        return cached[1]
+    time_map = OfficialTimeMap.from_ranges(calculated_ranges)
+    _OFFICIAL_TIME_MAP_CACHE[key] = (version, time_map)
+    _OFFICIAL_TIME_MAP_CACHE.move_to_end(key)
+    while len(_OFFICIAL_TIME_MAP_CACHE) > _OFFICIAL_TIME_MAP_CACHE_SIZE:
+        _OFFICIAL_TIME_MAP_CACHE.popitem(last=False)
+    return time_map
+
+
 def convert_global_to_official_time(global_time: float, calculated_ranges: List[CalculatedRange]) -> Optional[float]:
     """
     Удобная функция для перевода глобального времени в официальное.
+    Карта строится один раз на calculated_ranges (get_official_time_map), поиск — bisect.
 
     Args:
         global_time: Время в глобальной шкале.
@@ -164,8 +332,28 @@ def convert_global_to_official_time(global_time: float, calculated_ranges: List[
         Официальное время на шкале "чистого игрового времени".
         Возвращает None, если время не попадает в ЧИИ.
     """
-    official_timeline_map, period_info = create_official_time_map(calculated_ranges)
-    return map_global_time_to_official(global_time, official_timeline_map, period_info)
+    return get_official_time_map(calculated_ranges).to_official(global_time)
+
+def convert_official_to_global_time(official_time: float, calculated_ranges: List[CalculatedRange]) -> Optional[float]:
+    """
+    Обратный перевод: официальное (протокольное) время -> глобальное время видео.
+    Учитывает коэффициенты периодов и овертайм; None, если время вне шкалы официального времени.
+    """
+    return get_official_time_map(calculated_ranges).to_global(official_time)
+
+def convert_global_to_official_times(global_times: Union[Sequence[float], np.ndarray],
+                                     calculated_ranges: List[CalculatedRange]) -> np.ndarray:
+    """
+    Пакетный перевод глобальных времён в официальные (NaN — время не попадает в ЧИИ).
+    Для тысяч смен/событий — одна векторная операция вместо вызова на каждое время.
+    """
+    return get_official_time_map(calculated_ranges).to_official_array(global_times)
+
+
+def convert_official_to_global_times(official_times: Union[Sequence[float], np.ndarray],
+                                     calculated_ranges: List[CalculatedRange]) -> np.ndarray:
+    """Пакетный обратный перевод официальных времён в глобальные (NaN — вне официальной шкалы)."""
+    return get_official_time_map(calculated_ranges).to_global_array(official_times)
 
 # --- КОНЕЦ НОВЫХ ФУНКЦИЙ ---
 
@@ -0,0 +1,196 @@
+# utils/keyframe_index.py
+"""
+Индекс ключевых кадров (keyframe/PTS) видеофайла для быстрых произвольных переходов.
+Строится один раз сканированием пакетов через ffprobe (без декодирования) и сохраняется
+рядом с .hkt в небольшом JSON-файле, чтобы переиспользоваться между сессиями.
+"""
+
+import os
+import json
+import subprocess
+from bisect import bisect_right
+from typing import List, Optional, Dict, Any
+
+import cv2
+
+SIDECAR_SUFFIX = ".keyframes.json"
+# Максимум кадров, которые допустимо декодировать вперёд от ключевого кадра (через grab())
+MAX_FORWARD_DECODE_FRAMES = 300
+
+
+class KeyframeIndex:
+    """
+    Отсортированный список индексов ключевых кадров видео.
+    Поля video_size и video_mtime позволяют проверить, что индекс относится к тому же файлу.
+    """
+    def __init__(self, video_path: str, fps: float, keyframes: List[int], video_size: int = 0, video_mtime: float = 0.0):
+        self.video_path: str = video_path
+        self.fps: float = fps
+        self.keyframes: List[int] = sorted(set(keyframes))
+        self.video_size: int = video_size
+        self.video_mtime: float = video_mtime
+
+    def nearest_keyframe(self, frame_index: int) -> Optional[int]:
+        """Возвращает ближайший ключевой кадр <= frame_index или None."""
+        pos = bisect_right(self.keyframes, frame_index)
+        if pos == 0:
+            return None
+        return self.keyframes[pos - 1]
+
+    def next_keyframe(self, frame_index: int) -> Optional[int]:
+        """Возвращает первый ключевой кадр > frame_index или None."""
+        pos = bisect_right(self.keyframes, frame_index)
+        if pos >= len(self.keyframes):
+            return None
+        return self.keyframes[pos]
+
+    def is_valid_for(self, video_path: str) -> bool:
+        """Проверяет, что файл видео не менялся с момента построения индекса."""
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return False
+        return stat.st_size == self.video_size and abs(stat.st_mtime - self.video_mtime) < 1e-3
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Преобразует объект в словарь для сериализации в JSON."""
+        return {
+            "video_path": self.video_path,
+            "fps": self.fps,
+            "video_size": self.video_size,
+            "video_mtime": self.video_mtime,
+            "keyframes": self.keyframes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'KeyframeIndex':
+        """Создаёт объект из словаря."""
+        return cls(
+            video_path=data.get("video_path", ""),
+            fps=data.get("fps", 25.0),
+            keyframes=data.get("keyframes", []),
+            video_size=data.get("video_size", 0),
+            video_mtime=data.get("video_mtime", 0.0),
+        )
+
+    def save_to_file(self, file_path: str):
+        """Сохраняет индекс в JSON-файл."""
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load_from_file(cls, file_path: str) -> 'KeyframeIndex':
+        """Загружает индекс из JSON-файла."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls.from_dict(data)
+
+
+def sidecar_path_for_project(project_file_path: str) -> str:
+    """Путь к файлу индекса рядом с .hkt: 'матч.hkt' -> 'матч.keyframes.json'."""
+    return os.path.splitext(project_file_path)[0] + SIDECAR_SUFFIX
+
+
+def build_keyframe_index(video_path: str, fps: Optional[float] = None) -> Optional[KeyframeIndex]:
+    """
+    Сканирует пакеты видеопотока через ffprobe и собирает индексы ключевых кадров.
+    Декодирование не выполняется, поэтому 2-часовой файл сканируется за секунды.
+
+    Returns:
+        KeyframeIndex или None, если ffprobe недоступен или завершился с ошибкой.
+    """
+    if fps is None:
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0.0
+        cap.release()
+    if not fps or fps <= 0:
+        fps = 25.0
+
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        video_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[KEYFRAMES] ffprobe недоступен или завершился с ошибкой ({e}). Индекс не построен.")
+        return None
+
+    all_pts: List[float] = []
+    key_pts: List[float] = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2 or parts[0] in ("", "N/A"):
+            continue
+        try:
+            pts = float(parts[0])
+        except ValueError:
+            continue
+        all_pts.append(pts)
+        if "K" in parts[1]:
+            key_pts.append(pts)
+
+    if not key_pts:
+        print(f"[KEYFRAMES] В видео не найдено ключевых кадров: {video_path}")
+        return None
+
+    # Нумерация кадров OpenCV начинается от первого PTS потока
+    start_pts = min(all_pts)
+    keyframes = [int(round((pts - start_pts) * fps)) for pts in key_pts]
+
+    stat = os.stat(video_path)
+    index = KeyframeIndex(video_path, fps, keyframes, video_size=stat.st_size, video_mtime=stat.st_mtime)
+    print(f"[KEYFRAMES] Индекс построен: {len(index.keyframes)} ключевых кадров ({os.path.basename(video_path)}).")
+    return index
+
+
+def load_or_build_keyframe_index(video_path: str, sidecar_path: Optional[str], fps: Optional[float] = None) -> Optional[KeyframeIndex]:
+    """
+    Загружает индекс из sidecar-файла, если он соответствует видео, иначе строит заново
+    и сохраняет (если указан sidecar_path).
+    """
+    if sidecar_path and os.path.exists(sidecar_path):
+        try:
+            index = KeyframeIndex.load_from_file(sidecar_path)
+            if index.is_valid_for(video_path):
+                return index
+            print("[KEYFRAMES] Индекс устарел (видео изменилось), строим заново.")
+        except Exception as e:
+            print(f"[KEYFRAMES] Не удалось прочитать индекс {sidecar_path}: {e}")
+
+    index = build_keyframe_index(video_path, fps)
+    if index is not None and sidecar_path:
+        try:
+            index.save_to_file(sidecar_path)
+        except OSError as e:
+            print(f"[KEYFRAMES] Не удалось сохранить индекс {sidecar_path}: {e}")
+    return index
+
+
+def seek_and_read(cap, frame_index: int, keyframe_index: Optional[KeyframeIndex] = None, max_forward: int = MAX_FORWARD_DECODE_FRAMES):
+    """
+    Читает кадр frame_index из cap с использованием индекса ключевых кадров.
+    Если текущая позиция cap уже между ближайшим ключевым кадром и целью — декодирует вперёд без seek.
+    Иначе делает seek точно на ключевой кадр и догоняет цель через grab() (без retrieve()).
+    Без индекса (или при слишком длинном GOP) — обычный cap.set().
+
+    Returns:
+        (ret, frame) как у cap.read().
+    """
+    keyframe = keyframe_index.nearest_keyframe(frame_index) if keyframe_index else None
+    if keyframe is None or frame_index - keyframe > max_forward:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        return cap.read()
+
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    if not (keyframe <= position <= frame_index):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+        position = keyframe
+    while position < frame_index:
+        if not cap.grab():
+            return False, None
+        position += 1
+    return cap.read()
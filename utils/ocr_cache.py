@@ -0,0 +1,132 @@
+# utils/ocr_cache.py
+"""
+Постоянный кэш результатов OCR по перцептивному хешу предобработанного ROI.
+Одна и та же графика ("ГОЛ", "2 МИН", спонсорские плашки) появляется много раз за матч и за сезон,
+поэтому текст и уверенность Tesseract запоминаются по dHash ROI и переиспользуются между кадрами,
+матчами и запусками. Кэш общий для detect_osg_events, run_combined_detection и batch_process
+(get_shared_ocr_cache), ограничен по числу записей (LRU) и хранится в JSON-файле.
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict
+
+import cv2
+import numpy as np
+
+DEFAULT_OCR_CACHE_PATH = os.path.join('Data', 'ocr_cache.json')
+DEFAULT_OCR_CACHE_MAX_ENTRIES = 50000
+HASH_SIZE = (48, 16)  # (ширина, высота) dHash: 768 бит — различает отдельные цифры в ROI табло
+
+
+def roi_perceptual_hash(processed_img: np.ndarray) -> str:
+    """
+    dHash предобработанного ROI: знаки горизонтальных градиентов уменьшенного изображения.
+    Устойчив к шуму сжатия и небольшим сдвигам яркости, в отличие от хеша байтов.
+    """
+    width, height = HASH_SIZE
+    small = cv2.resize(processed_img, (width + 1, height), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+class OcrMemoCache:
+    """
+    LRU-словарь "ключ ROI -> (текст, уверенность)" с сохранением на диск.
+    Ключ включает движок OCR: уверенности tesserocr и pytesseract не взаимозаменяемы.
+    """
+    def __init__(self, path: Optional[str] = DEFAULT_OCR_CACHE_PATH, max_entries: int = DEFAULT_OCR_CACHE_MAX_ENTRIES):
+        self.path: Optional[str] = path
+        self.max_entries: int = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._new_entries: Dict[str, Tuple[str, float]] = {}  # Добавленные с момента загрузки (для слияния из процессов)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+
+    @staticmethod
+    def make_key(engine: str, processed_img: np.ndarray) -> str:
+        return f"{engine}:{roi_perceptual_hash(processed_img)}"
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Tuple[str, float]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._new_entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def take_new_entries(self) -> Dict[str, Tuple[str, float]]:
+        """Забирает записи, добавленные с прошлого вызова (рабочие процессы передают их в основной)."""
+        with self._lock:
+            entries, self._new_entries = self._new_entries, {}
+            return entries
+
+    def merge(self, entries: Dict[str, Tuple[str, float]]) -> None:
+        for key, value in entries.items():
+            self.put(key, tuple(value))
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[OCR_CACHE] Не удалось прочитать кэш {self.path}: {e}")
+            return
+        with self._lock:
+            # В файле записи от старых к новым — порядок LRU восстанавливается
+            for key, (text, confidence) in data.get("entries", []):
+                self._entries[key] = (text, confidence)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            data = {"entries": [[key, list(value)] for key, value in self._entries.items()]}
+            self._dirty = False
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"  # Кэш может сохраняться из нескольких процессов пакета
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[OCR_CACHE] Не удалось сохранить кэш {self.path}: {e}")
+
+    def summary(self) -> str:
+        return f"кэш OCR: попаданий {self.hits}, промахов {self.misses}, записей {len(self._entries)}"
+
+
+_shared_cache: Optional[OcrMemoCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_ocr_cache(path: str = DEFAULT_OCR_CACHE_PATH) -> OcrMemoCache:
+    """Общий для процесса кэш OCR (загружается с диска при первом обращении)."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None or _shared_cache.path != path:
+            _shared_cache = OcrMemoCache(path)
+        return _shared_cache
@@ -0,0 +1,126 @@
+# utils/roi_decoder.py
+"""
+Декодирование только нужных областей кадра через ffmpeg.
+Детекторам не нужен полный кадр 1920x1080: OCR смотрит на ROI табло (~91x34), поиск футажей —
+на миниатюру 16x16. ffmpeg сам выбирает нужные кадры (select), вырезает ROI (crop) и уменьшает
+кадр (scale), склеивает области по вертикали (vstack) и отдаёт их сырыми байтами BGR в pipe,
+откуда они читаются прямо в NumPy. Объём данных на кадр меньше в сотни раз.
+"""
+
+import shutil
+import subprocess
+from typing import List, Tuple, Optional, Iterator
+
+import numpy as np
+
+FFMPEG_BINARY = "ffmpeg"
+
+# Область кадра: ("crop", x, y, w, h) — вырезать ROI; ("scale", 0, 0, w, h) — весь кадр, уменьшенный до w x h
+Region = Tuple[str, int, int, int, int]
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_BINARY) is not None
+
+
+def clamp_region(region: Region, frame_width: int, frame_height: int) -> Optional[Region]:
+    """Обрезает ROI по границам кадра (как срез NumPy). None — область пуста."""
+    kind, x, y, w, h = region
+    if kind == "crop":
+        x, y = max(0, x), max(0, y)
+        w, h = min(w, frame_width - x), min(h, frame_height - y)
+    if w <= 0 or h <= 0:
+        return None
+    return kind, x, y, w, h
+
+
+def _select_expression(strides: List[int], rel_offset: int) -> str:
+    """Выражение select: кадр n (от начала чтения) нужен, если (n + rel_offset) кратен шагу одного из этапов."""
+    terms = [f"not(mod(n+{rel_offset}\\,{stride}))" for stride in sorted(set(strides))]
+    return "select='" + "+".join(terms) + "'"
+
+
+def build_filtergraph(regions: List[Region], strides: List[int], rel_offset: int) -> Tuple[str, int, int]:
+    """
+    Граф фильтров ffmpeg: выборка кадров, затем по ветке на область; ветки дополняются справа
+    до общей ширины и складываются по вертикали.
+
+    Returns:
+        (filtergraph, ширина выходного кадра, высота выходного кадра)
+    """
+    out_width = max(w for _, _, _, w, _ in regions)
+    out_height = sum(h for _, _, _, _, h in regions)
+    select = _select_expression(strides, rel_offset) if any(stride > 1 for stride in strides) else "null"
+
+    branches = []
+    for kind, x, y, w, h in regions:
+        if kind == "crop":
+            branch = f"crop={w}:{h}:{x}:{y}"
+        else:
+            # flags=area ближе всего к cv2.INTER_AREA, которым миниатюры считаются при чтении через OpenCV
+            branch = f"scale={w}:{h}:flags=area"
+        if w < out_width:
+            branch += f",pad={out_width}:{h}"
+        branches.append(branch)
+
+    if len(regions) == 1:
+        graph = f"[0:v]{select},{branches[0]},format=bgr24[out]"
+    else:
+        labels = [f"[r{i}]" for i in range(len(regions))]
+        graph = f"[0:v]{select},split={len(regions)}{''.join(labels)};"
+        graph += "".join(f"{labels[i]}{branch}[v{i}];" for i, branch in enumerate(branches))
+        graph += "".join(f"[v{i}]" for i in range(len(regions)))
+        graph += f"vstack=inputs={len(regions)},format=bgr24[out]"
+    return graph, out_width, out_height
+
+
+class RoiStreamReader:
+    """
+    Процесс ffmpeg, читающий кадры [start_frame, start_frame + frame_span) одного видеофайла
+    и отдающий для каждого выбранного кадра список областей (массивы BGR h x w x 3).
+    Порядок кадров — как у последовательного чтения; какой это кадр, вызывающий определяет сам
+    (по тем же шагам strides, что переданы в select).
+    """
+    def __init__(self, video_path: str, regions: List[Region], fps: float, start_frame: int,
+                 output_frames: int, strides: List[int], rel_offset: int = 0):
+        self.regions = regions
+        self.output_frames = output_frames
+        graph, self.out_width, self.out_height = build_filtergraph(regions, strides, rel_offset)
+        # Полкадра назад: точный seek ffmpeg отбрасывает кадры с pts < позиции, а pts нужного кадра
+        # может оказаться чуть меньше start_frame / fps из-за округления временной базы
+        start_sec = max(0.0, (start_frame - 0.5) / fps)
+        cmd = [
+            FFMPEG_BINARY, "-v", "error", "-nostdin",
+            "-ss", f"{start_sec:.6f}", "-i", video_path,
+            "-filter_complex", graph, "-map", "[out]",
+            "-vsync", "0", "-frames:v", str(output_frames),
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1",
+        ]
+        self._frame_bytes = self.out_width * self.out_height * 3
+        self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         bufsize=self._frame_bytes * 8)
+
+    def __iter__(self) -> Iterator[List[np.ndarray]]:
+        for _ in range(self.output_frames):
+            data = self._process.stdout.read(self._frame_bytes)
+            if len(data) < self._frame_bytes:
+                return
+            stacked = np.frombuffer(data, dtype=np.uint8).reshape((self.out_height, self.out_width, 3))
+            views = []
+            row = 0
+            for _, _, _, w, h in self.regions:
+                views.append(stacked[row:row + h, :w])
+                row += h
+            yield views
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.stdout.close()
+        self._process.wait()
+
+    def __enter__(self) -> 'RoiStreamReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
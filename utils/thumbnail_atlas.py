@@ -0,0 +1,169 @@
+# utils/thumbnail_atlas.py
+"""
+Атлас миниатюр (filmstrip) для предпросмотра при наведении/перемотке слайдера и таймлайна.
+Одна миниатюра 160x90 каждые THUMB_INTERVAL_SEC секунд видео хранится в одном
+memory-mapped файле рядом с .hkt; метаданные (размер/mtime видео, число готовых миниатюр) —
+в небольшом JSON. Атлас строится в фоне по порядку и пригоден к использованию во время построения;
+после перезапуска построение продолжается с места остановки.
+"""
+
+import os
+import json
+import math
+import threading
+from typing import Optional, Tuple, Dict, Any
+
+import cv2
+import numpy as np
+
+from utils.keyframe_index import seek_and_read
+from utils.virtual_video import open_video_capture, source_files, source_label, source_stat
+
+THUMB_WIDTH = 160
+THUMB_HEIGHT = 90
+THUMB_INTERVAL_SEC = 5.0
+ATLAS_SUFFIX = ".thumbs.bin"
+ATLAS_META_SUFFIX = ".thumbs.json"
+# Как часто (в миниатюрах) сбрасывать атлас на диск и обновлять метаданные
+FLUSH_EVERY = 50
+
+
+def atlas_paths_for_project(project_file_path: str) -> Tuple[str, str]:
+    """Пути к атласу и его метаданным рядом с .hkt: 'матч.hkt' -> 'матч.thumbs.bin', 'матч.thumbs.json'."""
+    base = os.path.splitext(project_file_path)[0]
+    return base + ATLAS_SUFFIX, base + ATLAS_META_SUFFIX
+
+
+class ThumbnailAtlas:
+    """
+    Массив миниатюр (count, THUMB_HEIGHT, THUMB_WIDTH, 3) в формате BGR, отображённый в память.
+    Миниатюры заполняются по порядку; built_count — сколько первых из них уже готово.
+    """
+    def __init__(self, atlas_path: str, meta_path: str, meta: Dict[str, Any], frames: np.memmap):
+        self.atlas_path: str = atlas_path
+        self.meta_path: str = meta_path
+        self.meta: Dict[str, Any] = meta
+        self.frames: np.memmap = frames
+        self.interval_sec: float = meta["interval_sec"]
+        self.count: int = meta["count"]
+        self.built_count: int = meta.get("built_count", 0)
+
+    @classmethod
+    def open_or_create(cls, video_path: str, atlas_path: str, meta_path: str, duration_sec: float,
+                       interval_sec: float = THUMB_INTERVAL_SEC) -> 'ThumbnailAtlas':
+        """
+        Открывает существующий атлас, если он построен для этого же видео с теми же параметрами,
+        иначе создаёт пустой файл нужного размера.
+        """
+        video_size, video_mtime = source_stat(video_path)
+        meta = {
+            "video_path": source_files(video_path),
+            "video_size": video_size,
+            "video_mtime": video_mtime,
+            "interval_sec": interval_sec,
+            "width": THUMB_WIDTH,
+            "height": THUMB_HEIGHT,
+            "count": max(1, int(math.ceil(duration_sec / interval_sec))),
+            "built_count": 0,
+        }
+        shape = (meta["count"], THUMB_HEIGHT, THUMB_WIDTH, 3)
+
+        if os.path.exists(atlas_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                same = all(saved.get(k) == meta[k] for k in ("video_size", "interval_sec", "width", "height", "count"))
+                same = same and abs(saved.get("video_mtime", 0.0) - meta["video_mtime"]) < 1e-3
+                if same and os.path.getsize(atlas_path) == int(np.prod(shape)):
+                    meta["built_count"] = min(saved.get("built_count", 0), meta["count"])
+                    frames = np.memmap(atlas_path, dtype=np.uint8, mode='r+', shape=shape)
+                    return cls(atlas_path, meta_path, meta, frames)
+                print("[THUMBS] Атлас устарел (видео или параметры изменились), строим заново.")
+            except (OSError, ValueError) as e:
+                print(f"[THUMBS] Не удалось открыть атлас {atlas_path}: {e}")
+
+        frames = np.memmap(atlas_path, dtype=np.uint8, mode='w+', shape=shape)
+        atlas = cls(atlas_path, meta_path, meta, frames)
+        atlas.save_meta()
+        return atlas
+
+    @property
+    def is_complete(self) -> bool:
+        return self.built_count >= self.count
+
+    def index_for_time(self, global_time: float) -> int:
+        return max(0, min(self.count - 1, int(global_time // self.interval_sec)))
+
+    def thumbnail_at(self, global_time: float) -> Optional[np.ndarray]:
+        """
+        Возвращает миниатюру (BGR, 160x90) для глобального времени или None, если она ещё не построена.
+        Возвращается представление memmap без копирования.
+        """
+        idx = self.index_for_time(global_time)
+        if idx >= self.built_count:
+            return None
+        return self.frames[idx]
+
+    def save_meta(self) -> None:
+        self.meta["built_count"] = self.built_count
+        try:
+            with open(self.meta_path, 'w', encoding='utf-8') as f:
+                json.dump(self.meta, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"[THUMBS] Не удалось сохранить метаданные атласа {self.meta_path}: {e}")
+
+    def flush(self) -> None:
+        """Сбрасывает миниатюры на диск, затем обновляет счётчик готовых (в таком порядке — для докачки)."""
+        self.frames.flush()
+        self.save_meta()
+
+
+class ThumbnailAtlasBuilder:
+    """
+    Фоновое заполнение атласа миниатюр. Собственный VideoCapture, декодер плеера не затрагивается.
+    """
+    def __init__(self, video_path: str, atlas: ThumbnailAtlas, fps: float):
+        self.video_path: str = video_path
+        self.atlas: ThumbnailAtlas = atlas
+        self.fps: float = fps
+        self.keyframe_index = None  # Подставляется, когда индекс ключевых кадров готов
+        self._stopped: bool = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.atlas.is_complete:
+            return
+        self._thread = threading.Thread(target=self._run, name="ThumbnailAtlasBuilder", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped = True
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        cap = open_video_capture(self.video_path)
+        if not cap.isOpened():
+            print(f"[THUMBS] Не удалось открыть видео: {self.video_path}")
+            return
+        atlas = self.atlas
+        if atlas.built_count == 0:
+            print(f"[THUMBS] Построение атласа миниатюр: {atlas.count} шт. ({source_label(self.video_path)})")
+        try:
+            for idx in range(atlas.built_count, atlas.count):
+                if self._stopped:
+                    break
+                frame_index = int(round(idx * atlas.interval_sec * self.fps))
+                ret, frame = seek_and_read(cap, frame_index, self.keyframe_index)
+                if not ret:
+                    break
+                atlas.frames[idx] = cv2.resize(frame, (THUMB_WIDTH, THUMB_HEIGHT), interpolation=cv2.INTER_AREA)
+                atlas.built_count = idx + 1
+                if atlas.built_count % FLUSH_EVERY == 0:
+                    atlas.flush()
+        finally:
+            cap.release()
+            atlas.flush()
+        if atlas.is_complete:
+            print(f"[THUMBS] Атлас миниатюр готов: {os.path.basename(atlas.atlas_path)}")
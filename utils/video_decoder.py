@@ -0,0 +1,376 @@
+# utils/video_decoder.py
+"""
+Фоновое последовательное декодирование видео для плеера.
+Поток читает кадры по порядку собственным cv2.VideoCapture и складывает их
+в ограниченный кольцевой буфер (ключ — индекс кадра). Плеер забирает кадры из буфера
+и делает настоящий seek только тогда, когда нужный кадр вне окна буфера.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from utils.keyframe_index import KeyframeIndex, seek_and_read
+from utils.virtual_video import open_video_capture
+
+
+class FrameRingBuffer:
+    """
+    Ограниченный буфер декодированных кадров, упорядоченный по индексу кадра.
+    При переполнении вытесняются кадры с наименьшими индексами.
+    Потокобезопасность обеспечивает владелец буфера (SequentialFrameDecoder).
+    """
+    def __init__(self, capacity: int = 24):
+        self.capacity: int = max(2, capacity)
+        self._frames: "OrderedDict[int, object]" = OrderedDict()
+
+    def put(self, frame_index: int, frame) -> None:
+        """Добавляет кадр. Индексы должны поступать по возрастанию."""
+        self._frames[frame_index] = frame
+        while len(self._frames) > self.capacity:
+            self._frames.popitem(last=False)
+
+    def get(self, frame_index: int):
+        """Возвращает кадр по индексу или None."""
+        return self._frames.get(frame_index)
+
+    def get_latest_before(self, frame_index: int):
+        """Возвращает ближайший кадр с индексом <= frame_index или None."""
+        best = None
+        for idx, frame in self._frames.items():
+            if idx > frame_index:
+                break
+            best = frame
+        return best
+
+    def discard_before(self, frame_index: int) -> None:
+        """Удаляет все кадры с индексом меньше frame_index."""
+        while self._frames and next(iter(self._frames)) < frame_index:
+            self._frames.popitem(last=False)
+
+    def window(self) -> Optional[Tuple[int, int]]:
+        """Возвращает (первый, последний) индекс в буфере или None, если буфер пуст."""
+        if not self._frames:
+            return None
+        return next(iter(self._frames)), next(reversed(self._frames))
+
+    def clear(self) -> None:
+        self._frames.clear()
+
+    def __contains__(self, frame_index: int) -> bool:
+        return frame_index in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class SequentialFrameDecoder:
+    """
+    Фоновый декодер для воспроизведения вперёд.
+    Читает кадры последовательно, опережая позицию потребителя не более чем на ёмкость буфера.
+    Если потребитель отстал от декодера или ушёл вперёд в пределах окна, кадры
+    догоняются через grab() без retrieve(), без seek.
+    """
+    def __init__(self, video_path: str, capacity: int = 24, keep_behind: int = 4, max_wait_sec: float = 0.04):
+        self.video_path: str = video_path
+        self.buffer = FrameRingBuffer(capacity)
+        self.keep_behind: int = keep_behind      # Сколько уже показанных кадров держать позади позиции
+        self.max_wait_sec: float = max_wait_sec  # Сколько GUI-поток готов ждать кадр из окна
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._next_index: int = 0      # Следующий кадр, который прочитает поток
+        self._play_index: int = 0      # Последний кадр, запрошенный потребителем
+        self._seek_to: Optional[int] = None
+        self._stopped: bool = False
+        self._eof: bool = False
+        # Индекс ключевых кадров (появляется после фонового сканирования, может отсутствовать)
+        self.keyframe_index: Optional[KeyframeIndex] = None
+        # --- Счётчики для отладки ---
+        self.hits: int = 0
+        self.misses: int = 0
+
+    # --- Управление потоком ---
+    def start(self, start_index: int = 0) -> None:
+        """Запускает поток декодирования с указанного кадра."""
+        with self._cond:
+            self._stopped = False
+            self._seek_to = max(0, start_index)
+            self._play_index = max(0, start_index)
+        self._thread = threading.Thread(target=self._run, name="SequentialFrameDecoder", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает поток и освобождает буфер."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        with self._cond:
+            self.buffer.clear()
+
+    def reposition(self, frame_index: int, seed_frame=None) -> None:
+        """
+        Асинхронно переносит чтение на frame_index (после настоящего seek в плеере).
+        seed_frame — уже прочитанный кадр frame_index, кладётся в буфер сразу.
+        """
+        with self._cond:
+            self.buffer.clear()
+            self._play_index = frame_index
+            if seed_frame is not None:
+                self.buffer.put(frame_index, seed_frame)
+                self._seek_to = frame_index + 1
+            else:
+                self._seek_to = frame_index
+            self._cond.notify_all()
+
+    def follow(self, frame_index: int) -> None:
+        """
+        Сообщает позицию потребителя, когда кадр взят из другого источника (кэша кадров):
+        в пределах окна декодер догоняет её через grab(), иначе переносится на неё.
+        """
+        with self._cond:
+            if self._in_window_locked(frame_index):
+                self._advance_play_index_locked(frame_index)
+                return
+        self.reposition(frame_index)
+
+    # --- Потребитель ---
+    def _in_window_locked(self, frame_index: int) -> bool:
+        window = self.buffer.window()
+        lower = window[0] if window else (self._seek_to if self._seek_to is not None else self._next_index)
+        upper = (self._seek_to if self._seek_to is not None else self._next_index) + self.buffer.capacity
+        return lower <= frame_index <= upper
+
+    def is_in_window(self, frame_index: int) -> bool:
+        """True, если кадр уже в буфере или будет прочитан без seek в ближайшее время."""
+        with self._cond:
+            return self._in_window_locked(frame_index)
+
+    def get_frame(self, frame_index: int):
+        """
+        Возвращает кадр frame_index из буфера.
+        Если кадр в окне, но ещё не декодирован, ждёт не дольше max_wait_sec и
+        при таймауте отдаёт ближайший предыдущий кадр (повтор кадра дешевле seek).
+        Возвращает None, если кадр вне окна — тогда нужен настоящий seek.
+        """
+        with self._cond:
+            frame = self.buffer.get(frame_index)
+            if frame is not None:
+                self._advance_play_index_locked(frame_index)
+                self.hits += 1
+                return frame
+
+            if not self._in_window_locked(frame_index):
+                self.misses += 1
+                return None
+
+            self._advance_play_index_locked(frame_index)
+            self._cond.wait_for(
+                lambda: frame_index in self.buffer or self._eof or self._stopped,
+                timeout=self.max_wait_sec
+            )
+            frame = self.buffer.get(frame_index)
+            if frame is None:
+                frame = self.buffer.get_latest_before(frame_index)
+            if frame is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return frame
+
+    def _advance_play_index_locked(self, frame_index: int) -> None:
+        self._play_index = frame_index
+        self.buffer.discard_before(frame_index - self.keep_behind)
+        self._cond.notify_all()
+
+    # --- Поток декодирования ---
+    def _run(self) -> None:
+        cap = open_video_capture(self.video_path)
+        if not cap.isOpened():
+            print(f"[DECODER] Не удалось открыть видео: {self.video_path}")
+            return
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._stopped
+                        or self._seek_to is not None
+                        or (not self._eof and self._next_index - self._play_index < self.buffer.capacity - self.keep_behind)
+                    )
+                    if self._stopped:
+                        break
+                    need_seek = self._seek_to is not None
+                    if need_seek:
+                        self._next_index = self._seek_to
+                        self._seek_to = None
+                        self._eof = False
+                    index = self._next_index
+                    # Потребитель ушёл вперёд — догоняем без seek
+                    skip = max(0, self._play_index - index)
+
+                if need_seek:
+                    index += skip
+                    ret, frame = seek_and_read(cap, index, self.keyframe_index)
+                else:
+                    for _ in range(skip):
+                        if not cap.grab():
+                            break
+                        index += 1
+                    ret, frame = cap.read()
+
+                with self._cond:
+                    if self._seek_to is not None or self._stopped:
+                        # За время чтения позицию сменили — кадр больше не нужен
+                        continue
+                    if not ret:
+                        self._eof = True
+                        self._cond.notify_all()
+                        continue
+                    self.buffer.put(index, frame)
+                    self._next_index = index + 1
+                    self._cond.notify_all()
+        finally:
+            cap.release()
+
+
+class ReverseGopDecoder:
+    """
+    Декодер для обратного воспроизведения.
+    Видео делится на блоки по GOP (по индексу ключевых кадров; длинные GOP режутся на
+    подблоки не длиннее chunk_frames, без индекса — блоки фиксированной длины).
+    Блок декодируется целиком вперёд в память и отдаётся потребителю в обратном порядке,
+    а предыдущий блок заранее декодируется в фоне, пока показывается текущий. Если предыдущий
+    подблок того же GOP ещё не готов, он сохраняется в том же проходе от ключевого кадра,
+    что и текущий (кадры до текущего подблока всё равно декодируются при seek).
+    """
+    def __init__(self, video_path: str, keyframe_index: Optional[KeyframeIndex] = None,
+                 chunk_frames: int = 32, max_wait_sec: float = 0.1):
+        self.video_path: str = video_path
+        self.keyframe_index: Optional[KeyframeIndex] = keyframe_index
+        self.chunk_frames: int = max(2, chunk_frames)
+        self.max_wait_sec: float = max_wait_sec
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped: bool = False
+        # Декодированные блоки: начало блока -> {индекс кадра: кадр}
+        self._chunks: Dict[int, Dict[int, object]] = {}
+        self._current_chunk: Optional[Tuple[int, int]] = None
+        self._prefetch_chunk: Optional[Tuple[int, int]] = None
+        # --- Счётчики для отладки ---
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def start(self) -> None:
+        with self._cond:
+            self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="ReverseGopDecoder", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        with self._cond:
+            self._chunks.clear()
+
+    def chunk_bounds(self, frame_index: int) -> Tuple[int, int]:
+        """Возвращает блок [start, end) для кадра: GOP (или его часть) либо блок фиксированной длины."""
+        frame_index = max(0, frame_index)
+        if self.keyframe_index is not None:
+            gop_start = self.keyframe_index.nearest_keyframe(frame_index)
+            if gop_start is not None:
+                gop_end = self.keyframe_index.next_keyframe(frame_index)
+                start = gop_start + ((frame_index - gop_start) // self.chunk_frames) * self.chunk_frames
+                end = start + self.chunk_frames
+                if gop_end is not None:
+                    end = min(end, gop_end)
+                return start, end
+        start = (frame_index // self.chunk_frames) * self.chunk_frames
+        return start, start + self.chunk_frames
+
+    def get_frame(self, frame_index: int):
+        """
+        Возвращает кадр из декодированного блока. Если блок ещё не готов — ждёт
+        не дольше max_wait_sec. Возвращает None, если кадр так и не появился (нужен seek).
+        """
+        with self._cond:
+            current = self.chunk_bounds(frame_index)
+            previous = self.chunk_bounds(current[0] - 1) if current[0] > 0 else None
+            if current != self._current_chunk or previous != self._prefetch_chunk:
+                self._current_chunk = current
+                self._prefetch_chunk = previous
+                self._cond.notify_all()
+
+            self._cond.wait_for(
+                lambda: current[0] in self._chunks or self._stopped,
+                timeout=self.max_wait_sec
+            )
+            frame = self._chunks.get(current[0], {}).get(frame_index)
+            if frame is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return frame
+
+    def _run(self) -> None:
+        cap = open_video_capture(self.video_path)
+        if not cap.isOpened():
+            print(f"[DECODER] Не удалось открыть видео: {self.video_path}")
+            return
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopped or self._next_chunk_locked() is not None)
+                    if self._stopped:
+                        break
+                    chunk = self._next_chunk_locked()
+                    # Держим в памяти только текущий и предыдущий блоки
+                    wanted = {c[0] for c in (self._current_chunk, self._prefetch_chunk) if c is not None}
+                    for start in list(self._chunks.keys()):
+                        if start not in wanted:
+                            del self._chunks[start]
+                    chunks = [chunk]
+                    # Предыдущий подблок того же GOP лежит на пути от ключевого кадра к текущему:
+                    # декодируем оба одним проходом вместо второго seek от ключевого кадра
+                    prefetch = self._prefetch_chunk
+                    if chunk == self._current_chunk and prefetch is not None and prefetch[0] not in self._chunks \
+                            and prefetch[1] == chunk[0] and self._same_gop(prefetch[0], chunk[0]):
+                        chunks = [prefetch, chunk]
+
+                decoded: Dict[int, Dict[int, object]] = {c[0]: {} for c in chunks}
+                start, end = chunks[0][0], chunks[-1][1]
+                ret, frame = seek_and_read(cap, start, self.keyframe_index)
+                index = start
+                target = 0
+                while ret and index < end:
+                    while index >= chunks[target][1]:
+                        target += 1
+                    decoded[chunks[target][0]][index] = frame
+                    index += 1
+                    if index < end:
+                        ret, frame = cap.read()
+
+                with self._cond:
+                    # Пустой блок (конец видео) тоже сохраняем, чтобы не декодировать его повторно
+                    self._chunks.update(decoded)
+                    self._cond.notify_all()
+        finally:
+            cap.release()
+
+    def _same_gop(self, first_frame: int, second_frame: int) -> bool:
+        """Кадры в одном GOP (без индекса ключевых кадров соседние блоки считаются одним GOP)."""
+        if self.keyframe_index is None:
+            return True
+        return self.keyframe_index.nearest_keyframe(first_frame) == self.keyframe_index.nearest_keyframe(second_frame)
+
+    def _next_chunk_locked(self) -> Optional[Tuple[int, int]]:
+        """Текущий блок важнее предфетча предыдущего."""
+        for chunk in (self._current_chunk, self._prefetch_chunk):
+            if chunk is not None and chunk[0] not in self._chunks:
+                return chunk
+        return None
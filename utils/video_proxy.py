@@ -0,0 +1,173 @@
+# utils/video_proxy.py
+"""
+Прокси-видео низкого разрешения для разметки.
+Каждый матч один раз в фоне перекодируется через ffmpeg в 540p с коротким GOP,
+с сохранением всех кадров и их временных меток (одинаковая нумерация кадров с оригиналом),
+поэтому плеер может прозрачно переключаться между прокси и оригиналом без пересчёта времени.
+"""
+
+import os
+import subprocess
+import threading
+import uuid
+from typing import Optional, Callable
+
+import cv2
+
+PROXY_HEIGHT = 540
+PROXY_GOP = 10  # Короткий GOP: seek в прокси почти бесплатен
+
+
+def proxy_path_for_video(video_path: str, height: int = PROXY_HEIGHT) -> str:
+    """Путь к прокси рядом с видео: 'матч.mp4' -> 'матч.proxy540.mp4'."""
+    return f"{os.path.splitext(video_path)[0]}.proxy{height}.mp4"
+
+
+def is_proxy_valid(video_path: str, proxy_path: str) -> bool:
+    """
+    Проверяет, что прокси существует, не старше оригинала и совпадает с ним по числу кадров.
+    """
+    if not os.path.exists(proxy_path):
+        return False
+    try:
+        if os.path.getmtime(proxy_path) < os.path.getmtime(video_path):
+            return False
+    except OSError:
+        return False
+
+    original = cv2.VideoCapture(video_path)
+    proxy = cv2.VideoCapture(proxy_path)
+    try:
+        if not original.isOpened() or not proxy.isOpened():
+            return False
+        original_frames = int(original.get(cv2.CAP_PROP_FRAME_COUNT))
+        proxy_frames = int(proxy.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Допускаем расхождение в пару кадров из-за округления длительности контейнером
+        return abs(original_frames - proxy_frames) <= 2
+    finally:
+        original.release()
+        proxy.release()
+
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def build_proxy(video_path: str, proxy_path: str, height: int = PROXY_HEIGHT, gop: int = PROXY_GOP,
+                stop_event: Optional[threading.Event] = None,
+                on_start: Optional[Callable[[subprocess.Popen, str], None]] = None) -> bool:
+    """
+    Перекодирует видео в прокси через ffmpeg. Пишет во временный файл (уникальный для каждой сборки,
+    чтобы параллельные сборки одного прокси не писали в один файл) и атомарно переименовывает
+    по завершении, чтобы недописанный прокси никогда не использовался.
+
+    Args:
+        stop_event: Если установлен к моменту завершения ffmpeg — прокси не сохраняется.
+        on_start: Вызывается с процессом ffmpeg и путём временного файла сразу после запуска
+                  (чтобы сборку можно было прервать, см. ProxyBuilder.stop).
+
+    Returns:
+        True при успехе, False если ffmpeg недоступен, завершился с ошибкой или сборка прервана.
+    """
+    tmp_path = f"{proxy_path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.part.mp4"
+    cmd = [
+        "ffmpeg", "-v", "error", "-y", "-nostdin",
+        "-i", video_path,
+        "-map", "0:v:0", "-an", "-sn",
+        "-vf", f"scale=-2:{height}",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "26",
+        "-g", str(gop), "-bf", "0",
+        "-vsync", "0",  # Без дублирования/выбрасывания кадров: нумерация совпадает с оригиналом
+        "-pix_fmt", "yuv420p",
+        tmp_path,
+    ]
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        print(f"[PROXY] Не удалось создать прокси для {os.path.basename(video_path)}: {e}")
+        return False
+    if on_start:
+        on_start(process, tmp_path)
+    _, stderr = process.communicate()
+    try:
+        if stop_event is not None and stop_event.is_set():
+            return False
+        if process.returncode != 0:
+            message = stderr.decode('utf-8', errors='replace').strip()
+            print(f"[PROXY] Не удалось создать прокси для {os.path.basename(video_path)}: "
+                  f"ffmpeg завершился с кодом {process.returncode} {message}")
+            return False
+        os.replace(tmp_path, proxy_path)
+        return True
+    except OSError as e:
+        print(f"[PROXY] Не удалось создать прокси для {os.path.basename(video_path)}: {e}")
+        return False
+    finally:
+        _remove_file(tmp_path)
+
+
+class ProxyBuilder:
+    """
+    Фоновое создание прокси для одного видео.
+    По готовности вызывает on_ready(proxy_path) из фонового потока.
+    stop() прерывает перекодирование (при смене видео и выходе из программы).
+    """
+    def __init__(self, video_path: str, height: int = PROXY_HEIGHT, on_ready: Optional[Callable[[str], None]] = None):
+        self.video_path: str = video_path
+        self.proxy_path: str = proxy_path_for_video(video_path, height)
+        self.height: int = height
+        self.on_ready = on_ready
+        self.ready: bool = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._tmp_path: Optional[str] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="ProxyBuilder", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает ffmpeg (если запущен) и удаляет недописанный прокси."""
+        with self._lock:
+            self._stop_event.set()
+            process, tmp_path = self._process, self._tmp_path
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        if tmp_path:
+            _remove_file(tmp_path)
+
+    def _on_process_started(self, process: subprocess.Popen, tmp_path: str) -> None:
+        with self._lock:
+            self._process, self._tmp_path = process, tmp_path
+            stopped = self._stop_event.is_set()
+        if stopped:
+            # stop() вызван до запуска ffmpeg
+            process.terminate()
+
+    def _run(self) -> None:
+        if is_proxy_valid(self.video_path, self.proxy_path):
+            print(f"[PROXY] Используется готовый прокси: {os.path.basename(self.proxy_path)}")
+        else:
+            if self._stop_event.is_set():
+                return
+            print(f"[PROXY] Создание прокси {self.height}p: {os.path.basename(self.video_path)}")
+            if not build_proxy(self.video_path, self.proxy_path, self.height,
+                               stop_event=self._stop_event, on_start=self._on_process_started):
+                return
+            print(f"[PROXY] Прокси готов: {os.path.basename(self.proxy_path)}")
+        if self._stop_event.is_set():
+            return
+        self.ready = True
+        if self.on_ready:
+            self.on_ready(self.proxy_path)
@@ -0,0 +1,250 @@
+# utils/virtual_video.py
+"""
+"Виртуальный" матч из нескольких видеофайлов (по периодам, после перезапуска камеры).
+VirtualVideoCapture повторяет интерфейс cv2.VideoCapture, который используют плеер и детекторы
+(get/set/read/grab/isOpened/release), и отображает глобальный индекс кадра на (файл, локальный кадр).
+Поэтому весь остальной код продолжает работать на одной глобальной шкале времени без склейки через ffmpeg.
+"""
+
+import os
+import threading
+from bisect import bisect_right
+from typing import List, Optional, Tuple, Union, Dict
+
+import cv2
+import numpy as np
+
+from model.project import VideoSegment
+
+VideoSource = Union[str, List[VideoSegment]]
+
+
+def is_multi_segment(source: VideoSource) -> bool:
+    return isinstance(source, list)
+
+
+def source_files(source: VideoSource) -> List[str]:
+    """Список файлов источника (для проверки существования, вывода)."""
+    if is_multi_segment(source):
+        return [segment.path for segment in source]
+    return [source] if source else []
+
+
+def source_label(source: VideoSource) -> str:
+    """Короткое имя источника для сообщений."""
+    files = source_files(source)
+    if len(files) == 1:
+        return os.path.basename(files[0])
+    return f"{os.path.basename(files[0])} (+{len(files) - 1} файлов)"
+
+
+def source_stat(source: VideoSource) -> Tuple[int, float]:
+    """Суммарный размер и самое позднее время изменения файлов источника (для проверки sidecar-файлов)."""
+    total_size = 0
+    latest_mtime = 0.0
+    for path in source_files(source):
+        stat = os.stat(path)
+        total_size += stat.st_size
+        latest_mtime = max(latest_mtime, stat.st_mtime)
+    return total_size, latest_mtime
+
+
+def build_segments_from_files(paths: List[str]) -> List[VideoSegment]:
+    """Сегменты из файлов, идущих подряд: offset каждого — суммарная длительность предыдущих."""
+    segments = []
+    offset = 0.0
+    for path in paths:
+        segments.append(VideoSegment(path=path, offset=offset))
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"Не удалось открыть видео: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        offset += int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) / fps
+        cap.release()
+    return segments
+
+
+def open_video_capture(source: VideoSource):
+    """Открывает источник: cv2.VideoCapture для одного файла, VirtualVideoCapture для списка сегментов."""
+    if is_multi_segment(source):
+        return VirtualVideoCapture(source)
+    return cv2.VideoCapture(source)
+
+
+class VirtualVideoCapture:
+    """
+    Последовательность видеофайлов как один поток кадров с глобальной нумерацией.
+    Глобальный кадр файла = round(offset * fps) + локальный кадр; fps берётся из первого файла.
+    В промежутках между файлами (если offset оставляет разрыв) отдаются чёрные кадры,
+    чтобы время на шкале шло равномерно. Соседние с текущим файлы открываются заранее в фоне.
+    """
+    def __init__(self, segments: List[VideoSegment]):
+        self.segments: List[VideoSegment] = sorted(segments, key=lambda seg: seg.offset)
+        self._caps: Dict[int, cv2.VideoCapture] = {}
+        self._cap_positions: Dict[int, int] = {}  # Локальная позиция каждого открытого файла
+        self._lock = threading.Lock()
+        self._warming: set = set()  # Сегменты, которые сейчас открываются в фоне
+        self._opened = False
+        self.fps = 30.0
+        self.width = 0
+        self.height = 0
+        self._starts: List[int] = []
+        self._counts: List[int] = []
+        self.total_frames = 0
+        self._pos = 0  # Глобальный индекс следующего кадра
+        self._probe()
+
+    def _probe(self):
+        for idx, segment in enumerate(self.segments):
+            cap = cv2.VideoCapture(segment.path)
+            if not cap.isOpened():
+                print(f"[VIRTUAL] Не удалось открыть сегмент: {segment.path}")
+                self.release()
+                return
+            if idx == 0:
+                self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                self._caps[0] = cap
+                self._cap_positions[0] = 0
+            else:
+                seg_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                if abs(seg_fps - self.fps) > 0.01:
+                    print(f"[VIRTUAL] FPS сегмента {os.path.basename(segment.path)} ({seg_fps}) отличается от первого ({self.fps}).")
+            self._starts.append(int(round(segment.offset * self.fps)))
+            self._counts.append(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+            if idx != 0:
+                cap.release()
+        self.total_frames = max(start + count for start, count in zip(self._starts, self._counts))
+        self._opened = True
+
+    # --- Интерфейс cv2.VideoCapture ---
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def get(self, prop_id) -> float:
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.total_frames)
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._pos)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            return self._pos / self.fps * 1000.0
+        return 0.0
+
+    def set(self, prop_id, value) -> bool:
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            self._pos = max(0, int(value))
+            return True
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            self._pos = max(0, int(round(value / 1000.0 * self.fps)))
+            return True
+        return False
+
+    def grab(self) -> bool:
+        ret, _ = self._next(decode=False)
+        return ret
+
+    def read(self):
+        return self._next(decode=True)
+
+    def release(self) -> None:
+        with self._lock:
+            for cap in self._caps.values():
+                cap.release()
+            self._caps.clear()
+            self._cap_positions.clear()
+        self._opened = False
+
+    @property
+    def segment_start_frames(self) -> List[int]:
+        """Глобальные индексы первых кадров файлов (естественные точки разреза для шардов детекции)."""
+        return list(self._starts)
+
+    # --- Внутреннее ---
+    def locate(self, frame_index: int) -> Tuple[Optional[int], int]:
+        """(индекс сегмента, локальный кадр) для глобального кадра; (None, 0) — промежуток или за концом."""
+        idx = bisect_right(self._starts, frame_index) - 1
+        if idx < 0:
+            return None, 0
+        local = frame_index - self._starts[idx]
+        if local >= self._counts[idx]:
+            return None, 0
+        return idx, local
+
+    def _next(self, decode: bool):
+        if not self._opened or self._pos >= self.total_frames:
+            return False, None
+        seg_idx, local = self.locate(self._pos)
+        if seg_idx is None:
+            # Промежуток между файлами
+            self._pos += 1
+            return True, (np.zeros((self.height, self.width, 3), dtype=np.uint8) if decode else None)
+
+        cap = self._cap_for(seg_idx)
+        if cap is None:
+            return False, None
+        if self._cap_positions.get(seg_idx) != local:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, local)
+        if decode:
+            ret, frame = cap.read()
+        else:
+            ret, frame = cap.grab(), None
+        if not ret:
+            self._cap_positions.pop(seg_idx, None)
+            return False, None
+        self._cap_positions[seg_idx] = local + 1
+        self._pos += 1
+        return True, frame
+
+    def _cap_for(self, seg_idx: int):
+        with self._lock:
+            cap = self._caps.get(seg_idx)
+        if cap is None:
+            cap = cv2.VideoCapture(self.segments[seg_idx].path)
+            if not cap.isOpened():
+                print(f"[VIRTUAL] Не удалось открыть сегмент: {self.segments[seg_idx].path}")
+                return None
+            with self._lock:
+                if seg_idx in self._caps:
+                    # Успел открыться фоновым прогревом
+                    cap.release()
+                    cap = self._caps[seg_idx]
+                else:
+                    self._caps[seg_idx] = cap
+                    self._cap_positions[seg_idx] = 0
+        self._warm_neighbours(seg_idx)
+        return cap
+
+    def _warm_neighbours(self, seg_idx: int):
+        """Держит открытыми текущий и соседние файлы; соседние открываются в фоне, остальные закрываются."""
+        keep = {seg_idx - 1, seg_idx, seg_idx + 1}
+        with self._lock:
+            for idx in [i for i in self._caps if i not in keep]:
+                self._caps.pop(idx).release()
+                self._cap_positions.pop(idx, None)
+            to_open = [i for i in (seg_idx + 1, seg_idx - 1)
+                       if 0 <= i < len(self.segments) and i not in self._caps and i not in self._warming]
+            self._warming.update(to_open)
+        if to_open:
+            threading.Thread(target=self._open_in_background, args=(to_open,),
+                             name="VirtualSegmentWarmup", daemon=True).start()
+
+    def _open_in_background(self, indices: List[int]):
+        for idx in indices:
+            cap = cv2.VideoCapture(self.segments[idx].path)
+            opened = cap.isOpened()
+            with self._lock:
+                if opened and idx not in self._caps and self._opened:
+                    self._caps[idx] = cap
+                    self._cap_positions[idx] = 0
+                else:
+                    cap.release()
+                # Неудачный прогрев не повторяется; сегмент откроется синхронно при обращении
+                if opened:
+                    self._warming.discard(idx)